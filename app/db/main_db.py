@@ -1,10 +1,13 @@
 import os
 import threading
+from contextlib import contextmanager
+
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
 
 from app.db.models import Base
+from app.db.sqlite_profile import set_sqlite_profile
 from app.utils import ExceptionUtils, PathUtils
 from config import Config
 
@@ -18,10 +21,13 @@ _Engine = create_engine(
     pool_recycle=60 * 10,
     max_overflow=0
 )
+set_sqlite_profile(_Engine)
 _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autoflush=True,
                                        autocommit=False,
                                        expire_on_commit=False))
+# 当前线程的批量写入状态
+_batch = threading.local()
 
 
 class MainDb:
@@ -109,6 +115,47 @@ class MainDb:
         """
         self.session.rollback()
 
+    @staticmethod
+    def in_batch():
+        """
+        当前线程是否处于批量写入中
+        """
+        return getattr(_batch, "depth", 0) > 0
+
+    @staticmethod
+    def fail_batch():
+        """
+        标记当前线程的批量写入失败，退出时整体回滚
+        """
+        _batch.failed = True
+
+    @contextmanager
+    def batch(self):
+        """
+        批量写入，上下文内DbPersist装饰的写操作不再单独提交，退出时统一提交一次；
+        其中任一写操作失败或上下文内抛出异常时整体回滚，可嵌套，以最外层为准
+        """
+        depth = getattr(_batch, "depth", 0)
+        if not depth:
+            _batch.failed = False
+        _batch.depth = depth + 1
+        try:
+            yield self
+        except Exception:
+            _batch.failed = True
+            raise
+        finally:
+            _batch.depth = depth
+            if not depth:
+                if _batch.failed:
+                    self.rollback()
+                else:
+                    try:
+                        self.commit()
+                    except Exception as e:
+                        ExceptionUtils.exception_traceback(e)
+                        self.rollback()
+
 
 class DbPersist(object):
     """
@@ -120,6 +167,16 @@ class DbPersist(object):
 
     def __call__(self, f):
         def persist(*args, **kwargs):
+            if self.db.in_batch():
+                # 批量写入中只刷写，由批量写入统一提交
+                try:
+                    ret = f(*args, **kwargs)
+                    self.db.flush()
+                    return True if ret is None else ret
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    self.db.fail_batch()
+                    return False
             try:
                 ret = f(*args, **kwargs)
                 self.db.commit()
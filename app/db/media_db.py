@@ -9,6 +9,7 @@ from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
 
 from app.db.models import BaseMedia, MEDIASYNCITEMS, MEDIASYNCSTATISTIC
+from app.db.sqlite_profile import set_sqlite_profile
 from app.utils import ExceptionUtils
 from config import Config
 
@@ -22,6 +23,7 @@ _Engine = create_engine(
     pool_recycle=60 * 10,
     max_overflow=0
 )
+set_sqlite_profile(_Engine)
 _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autoflush=True,
                                        autocommit=False))
@@ -45,19 +47,93 @@ class MediaDb:
             self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
                                                       MEDIASYNCITEMS.ITEM_ID == iteminfo.get("id")).delete()
             self.session.flush()
-            self.session.add(MEDIASYNCITEMS(
-                SERVER=server_type,
-                LIBRARY=iteminfo.get("library"),
-                ITEM_ID=iteminfo.get("id"),
-                ITEM_TYPE=iteminfo.get("type"),
-                TITLE=iteminfo.get("title"),
-                ORGIN_TITLE=iteminfo.get("originalTitle"),
-                YEAR=iteminfo.get("year"),
-                TMDBID=iteminfo.get("tmdbid"),
-                IMDBID=iteminfo.get("imdbid"),
-                PATH=iteminfo.get("path"),
-                JSON=json.dumps(seasoninfo)
-            ))
+            self.session.add(self.__get_item(server_type, iteminfo, seasoninfo))
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
+    @staticmethod
+    def __get_item(server_type, iteminfo, seasoninfo):
+        return MEDIASYNCITEMS(
+            SERVER=server_type,
+            LIBRARY=iteminfo.get("library"),
+            ITEM_ID=iteminfo.get("id"),
+            ITEM_TYPE=iteminfo.get("type"),
+            TITLE=iteminfo.get("title"),
+            ORGIN_TITLE=iteminfo.get("originalTitle"),
+            YEAR=iteminfo.get("year"),
+            TMDBID=iteminfo.get("tmdbid"),
+            IMDBID=iteminfo.get("imdbid"),
+            PATH=iteminfo.get("path"),
+            NOTE=iteminfo.get("modified"),
+            JSON=json.dumps(seasoninfo)
+        )
+
+    def get_modified_marks(self, server_type):
+        """
+        查询已同步媒体的变更标识，变更标识保存在NOTE字段中
+        :return: {ITEM_ID: 变更标识}
+        """
+        if not server_type:
+            return {}
+        return {str(item_id): note for item_id, note in
+                self.session.query(MEDIASYNCITEMS.ITEM_ID, MEDIASYNCITEMS.NOTE).filter(
+                    MEDIASYNCITEMS.SERVER == server_type).all()}
+
+    def get_item_libraries(self, server_type):
+        """
+        查询已同步媒体所属的媒体库
+        :return: {ITEM_ID: LIBRARY}
+        """
+        if not server_type:
+            return {}
+        return {str(item_id): str(library) for item_id, library in
+                self.session.query(MEDIASYNCITEMS.ITEM_ID, MEDIASYNCITEMS.LIBRARY).filter(
+                    MEDIASYNCITEMS.SERVER == server_type).all()}
+
+    def get_items(self, server_type):
+        """
+        查询已同步的所有媒体
+        """
+        if not server_type:
+            return []
+        return self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type).all()
+
+    def upsert(self, server_type, items):
+        """
+        批量新增或更新媒体，一批只提交一次
+        :param server_type: 媒体服务器类型
+        :param items: [(iteminfo, seasoninfo)]
+        """
+        if not server_type or not items:
+            return False
+        try:
+            item_ids = [str(iteminfo.get("id")) for iteminfo, _ in items]
+            self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
+                                                      MEDIASYNCITEMS.ITEM_ID.in_(item_ids)
+                                                      ).delete(synchronize_session=False)
+            self.session.add_all([self.__get_item(server_type, iteminfo, seasoninfo)
+                                  for iteminfo, seasoninfo in items])
+            self.session.commit()
+            return True
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self.session.rollback()
+        return False
+
+    def delete_items(self, server_type, item_ids):
+        """
+        批量删除媒体
+        """
+        if not server_type or not item_ids:
+            return False
+        try:
+            self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
+                                                      MEDIASYNCITEMS.ITEM_ID.in_([str(item_id) for item_id in item_ids])
+                                                      ).delete(synchronize_session=False)
             self.session.commit()
             return True
         except Exception as e:
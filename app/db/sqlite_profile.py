@@ -0,0 +1,37 @@
+from sqlalchemy import event
+
+import log
+from config import Config, DB_SQLITE_PROFILES
+
+
+def get_sqlite_pragmas():
+    """
+    读取配置的SQLite性能模式，返回连接时需执行的PRAGMA
+    """
+    laboratory = Config().get_config('laboratory') or {}
+    profile = laboratory.get("db_profile") or "wal"
+    if profile not in DB_SQLITE_PROFILES:
+        log.warn(f"【Db】数据库性能模式 {profile} 不存在，使用默认模式")
+        profile = "default"
+    return DB_SQLITE_PROFILES.get(profile)
+
+
+def set_sqlite_profile(engine, pragmas=None):
+    """
+    为引擎的每个新连接设置SQLite参数：日志模式、同步级别、缓存大小、内存映射大小、锁等待时间
+    :param engine: SQLAlchemy引擎
+    :param pragmas: {PRAGMA名称: 值}，为空时读取配置
+    """
+    if pragmas is None:
+        pragmas = get_sqlite_pragmas()
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def __set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
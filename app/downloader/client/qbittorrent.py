@@ -2,6 +2,7 @@ import os
 import re
 import time
 from datetime import datetime
+from threading import Lock
 
 import log
 import qbittorrentapi
@@ -21,6 +22,16 @@ class Qbittorrent(_IDownloadClient):
     # 私有属性
     _client_config = {}
     _torrent_management = False
+    # 增量同步的种子状态 {hash: 种子属性}
+    _torrents = {}
+    _rid = 0
+    _sync_lock = None
+    # 可在本地按种子状态模拟的过滤条件
+    _status_states = {
+        "downloading": {"downloading", "metaDL", "forcedMetaDL", "stalledDL", "checkingDL",
+                        "pausedDL", "stoppedDL", "queuedDL", "forcedDL"},
+        "completed": {"uploading", "stalledUP", "checkingUP", "pausedUP", "stoppedUP", "queuedUP", "forcedUP"}
+    }
 
     qbc = None
     ver = None
@@ -33,6 +44,7 @@ class Qbittorrent(_IDownloadClient):
 
     def __init__(self, config):
         self._client_config = config
+        self._sync_lock = Lock()
         self.init_config()
         self.connect()
         # 种子自动管理模式，根据下载路径设置为下载器设置分类
@@ -63,6 +75,7 @@ class Qbittorrent(_IDownloadClient):
     def connect(self):
         if self.host and self.port:
             self.qbc = self.__login_qbittorrent()
+            self.__reset_torrents()
 
     def __login_qbittorrent(self):
         """
@@ -176,16 +189,73 @@ class Qbittorrent(_IDownloadClient):
                 return category_name
         return None
 
+    def __reset_torrents(self):
+        """
+        清空增量同步的种子状态，下次同步时全量获取
+        """
+        with self._sync_lock:
+            self._torrents = {}
+            self._rid = 0
+
+    def __sync_torrents(self):
+        """
+        通过sync/maindata增量同步种子状态，只传输上次同步后变化的种子及属性
+        :return: 全部种子的属性列表
+        """
+        with self._sync_lock:
+            try:
+                maindata = self.qbc.sync_maindata(rid=self._rid) or {}
+            except Exception:
+                self._torrents = {}
+                self._rid = 0
+                raise
+            if maindata.get("full_update"):
+                self._torrents = {}
+            for torrent_hash, changed in (maindata.get("torrents") or {}).items():
+                torrent = self._torrents.get(torrent_hash)
+                if torrent is None:
+                    torrent = {"hash": torrent_hash}
+                    self._torrents[torrent_hash] = torrent
+                torrent.update(changed)
+            for torrent_hash in maindata.get("torrents_removed") or []:
+                self._torrents.pop(torrent_hash, None)
+            self._rid = maindata.get("rid") or 0
+            return [dict(torrent) for torrent in self._torrents.values()]
+
+    def __filter_torrents(self, torrents, ids=None, status=None):
+        """
+        按种子Hash及状态过滤同步的种子
+        """
+        if ids:
+            if not isinstance(ids, list):
+                ids = str(ids).split("|")
+            ids = set(ids)
+            torrents = [torrent for torrent in torrents if torrent.get("hash") in ids]
+        if status:
+            states = set()
+            for item in status if isinstance(status, list) else [status]:
+                states |= self._status_states.get(item)
+            torrents = [torrent for torrent in torrents if torrent.get("state") in states]
+        return qbittorrentapi.TorrentInfoList(torrents, client=self.qbc)
+
     def get_torrents(self, ids=None, status=None, tag=None):
         """
-        获取种子列表
+        获取种子列表，优先从增量同步的种子状态中过滤
         return: 种子列表, 是否发生异常
         """
         if not self.qbc:
             return [], True
         try:
-            torrents = self.qbc.torrents_info(torrent_hashes=ids,
-                                              status_filter=status)
+            torrents = None
+            status_list = status if isinstance(status, list) else [status] if status else []
+            if all(item in self._status_states for item in status_list):
+                try:
+                    torrents = self.__filter_torrents(self.__sync_torrents(), ids=ids, status=status)
+                except Exception as err:
+                    log.debug(f"【{self.client_name}】{self.name} 增量同步种子状态出错：{str(err)}")
+            if torrents is None:
+                torrents = self.qbc.torrents_info(torrent_hashes=ids,
+                                                  status_filter=status)
             if tag:
                 results = []
                 if not isinstance(tag, list):
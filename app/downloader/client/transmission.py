@@ -2,6 +2,7 @@ import os.path
 import re
 import time
 from datetime import datetime
+from threading import Lock
 
 import transmission_rpc
 
@@ -25,8 +26,18 @@ class Transmission(_IDownloadClient):
               "peersGettingFromUs", "peersSendingToUs", "uploadRatio", "uploadedEver", "downloadedEver", "downloadDir",
               "error", "errorString", "doneDate", "queuePosition", "activityDate", "trackers"]
 
+    # 判断种子是否有变化的简要参数，有变化的种子才查询完整参数
+    _trarg_brief = ["id", "status", "labels", "percentDone", "activityDate", "doneDate", "downloadDir",
+                    "error", "queuePosition", "totalSize"]
+
     # 私有属性
     _client_config = {}
+    # 增量同步的种子状态 {id: 种子}
+    _torrents = {}
+    _synced_at = 0
+    _sync_lock = None
+    # recently-active只返回最近60秒内有变化及删除的种子，留出余量
+    _recently_active_window = 50
 
     trc = None
     host = None
@@ -38,6 +49,7 @@ class Transmission(_IDownloadClient):
 
     def __init__(self, config):
         self._client_config = config
+        self._sync_lock = Lock()
         self.init_config()
         self.connect()
         # 设置未完成种子添加!part后缀
@@ -62,6 +74,7 @@ class Transmission(_IDownloadClient):
     def connect(self):
         if self.host and self.port:
             self.trc = self.__login_transmission()
+            self.__reset_torrents()
 
     def __login_transmission(self):
         """
@@ -95,6 +108,57 @@ class Transmission(_IDownloadClient):
             ids = int(ids)
         return ids
 
+    def __reset_torrents(self):
+        """
+        清空增量同步的种子状态，下次同步时全量获取
+        """
+        with self._sync_lock:
+            self._torrents = {}
+            self._synced_at = 0
+
+    def __is_torrent_changed(self, brief):
+        """
+        比较种子的简要参数与已同步的状态是否一致
+        """
+        torrent = self._torrents.get(brief.id)
+        if not torrent:
+            return True
+        return any(torrent.fields.get(key) != brief.fields.get(key) for key in self._trarg_brief)
+
+    def __sync_torrents(self):
+        """
+        同步种子状态：
+        距上次同步未超出recently-active的时间范围时只查询最近有变化及删除的种子；
+        超出时（定时任务的间隔通常远大于该范围）查询所有种子的简要参数，只查询新增或有变化的种子的完整参数
+        :return: 全部种子列表
+        """
+        with self._sync_lock:
+            now = time.time()
+            try:
+                if self._synced_at and now - self._synced_at < self._recently_active_window:
+                    active_torrents, removed_ids = self.trc.get_recently_active_torrents(arguments=self._trarg)
+                    for torrent_id in removed_ids or []:
+                        self._torrents.pop(torrent_id, None)
+                elif self._synced_at:
+                    briefs = self.trc.get_torrents(arguments=self._trarg_brief)
+                    changed_ids = [brief.id for brief in briefs if self.__is_torrent_changed(brief)]
+                    # 已删除的种子不在简要列表中
+                    self._torrents = {brief.id: self._torrents.get(brief.id) for brief in briefs
+                                      if brief.id not in changed_ids}
+                    active_torrents = self.trc.get_torrents(ids=changed_ids,
+                                                            arguments=self._trarg) if changed_ids else []
+                else:
+                    active_torrents = self.trc.get_torrents(arguments=self._trarg)
+                    self._torrents = {}
+            except Exception:
+                self._torrents = {}
+                self._synced_at = 0
+                raise
+            for torrent in active_torrents:
+                self._torrents[torrent.id] = torrent
+            self._synced_at = now
+            return list(self._torrents.values())
+
     def get_torrents(self, ids=None, status=None, tag=None):
         """
         获取种子列表
@@ -104,7 +168,10 @@ class Transmission(_IDownloadClient):
             return [], True
         ids = self.__parse_ids(ids)
         try:
-            torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
+            if ids is None:
+                torrents = self.__sync_torrents()
+            else:
+                torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return [], True
@@ -1,9 +1,11 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 from enum import Enum
 import json
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from cachetools import TTLCache
 
 import log
 import re
@@ -20,10 +22,17 @@ from app.sites import Sites, SiteSubtitle
 from app.utils import Torrent, StringUtils, SystemUtils, ExceptionUtils, NumberUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaType, DownloaderType, SearchType, RmtMode, EventType, SystemConfigKey
-from config import Config, PT_TAG, RMT_MEDIAEXT, PT_TRANSFER_INTERVAL
+from config import Config, PT_TAG, RMT_MEDIAEXT, PT_TRANSFER_INTERVAL, RMT_TRANSFER_THREADS, \
+    DOWNLOADING_IDENTIFY_THREADS, DOWNLOADING_MEDIA_CACHE_SIZE, DOWNLOADING_MEDIA_CACHE_EXPIRE
 
 lock = Lock()
 client_lock = Lock()
+# 每个下载器的转移锁，不同下载器之间的转移互不阻塞
+transfer_locks = {}
+media_info_lock = Lock()
+# 后台识别下载中种子的线程池
+identify_executor = ThreadPoolExecutor(max_workers=DOWNLOADING_IDENTIFY_THREADS,
+                                       thread_name_prefix="DownloadingIdentify")
 
 
 @singleton
@@ -39,6 +48,10 @@ class Downloader:
     # 下载器ID-名称枚举类
     _DownloaderEnum = None
     _scheduler = None
+    # 种子的媒体信息缓存：{下载器ID: {种子ID: {"title": 标题, "year": 年份, "se": 季集, "image": 海报}}}，未识别的种子缓存为空字典
+    _torrent_media_infos = {}
+    # 后台识别中的种子：(下载器ID, 种子ID)
+    _identifying_torrents = set()
 
     message = None
     mediaserver = None
@@ -529,6 +542,8 @@ class Downloader:
             else self._monitor_downloader_ids
         for downloader_id in downloader_ids:
             with lock:
+                transfer_lock = transfer_locks.setdefault(str(downloader_id), Lock())
+            with transfer_lock:
                 # 获取下载器配置
                 downloader_conf = self.get_downloader_conf(downloader_id)
                 name = downloader_conf.get("name")
@@ -544,24 +559,40 @@ class Downloader:
                     log.info(f"【Downloader】下载器 {name} 开始转移下载文件...")
                 else:
                     continue
-                for task in trans_tasks:
-                    done_flag, done_msg = self.filetransfer.transfer_media(
-                        in_from=self._DownloaderEnum[str(downloader_id)],
-                        in_path=task.get("path"),
-                        rmt_mode=rmt_mode)
-                    if not done_flag:
-                        log.warn(f"【Downloader】下载器 {name} 任务%s 转移失败：%s" % (task.get("path"), done_msg))
-                        _client.set_torrents_status(ids=task.get("id"),
-                                                    tags=task.get("tags"))
-                    else:
-                        if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
-                            log.warn(f"【Downloader】下载器 {name} 移动模式下删除种子文件：%s" % task.get("id"))
-                            _client.delete_torrents(delete_file=True, ids=task.get("id"))
-                        else:
-                            _client.set_torrents_status(ids=task.get("id"),
-                                                        tags=task.get("tags"))
+                # 多个任务同时转移，同一目的设备上的复制、移动由FileTransfer排队
+                with ThreadPoolExecutor(max_workers=min(len(trans_tasks), RMT_TRANSFER_THREADS)) as executor:
+                    for task in trans_tasks:
+                        executor.submit(self.__transfer_task,
+                                        downloader_id=downloader_id,
+                                        _client=_client,
+                                        task=task,
+                                        rmt_mode=rmt_mode)
                 log.info(f"【Downloader】下载器 {name} 下载文件转移结束")
 
+    def __transfer_task(self, downloader_id, _client, task, rmt_mode):
+        """
+        转移单个下载完成的任务，并按结果设置种子状态
+        """
+        name = self.get_downloader_conf(downloader_id).get("name")
+        try:
+            done_flag, done_msg = self.filetransfer.transfer_media(
+                in_from=self._DownloaderEnum[str(downloader_id)],
+                in_path=task.get("path"),
+                rmt_mode=rmt_mode)
+            if not done_flag:
+                log.warn(f"【Downloader】下载器 {name} 任务%s 转移失败：%s" % (task.get("path"), done_msg))
+                _client.set_torrents_status(ids=task.get("id"),
+                                            tags=task.get("tags"))
+            else:
+                if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
+                    log.warn(f"【Downloader】下载器 {name} 移动模式下删除种子文件：%s" % task.get("id"))
+                    _client.delete_torrents(delete_file=True, ids=task.get("id"))
+                else:
+                    _client.set_torrents_status(ids=task.get("id"),
+                                                tags=task.get("tags"))
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+
     def get_torrents(self, downloader_id=None, ids=None, tag=None):
         """
         获取种子信息
@@ -1380,6 +1411,83 @@ class Downloader:
         return self.dbhelper.get_download_history_by_downloader(downloader=downloader,
                                                                 download_id=download_id)
 
+    def get_torrents_media_info(self, torrents, downloader_id=None):
+        """
+        查询种子对应的媒体信息：先取缓存，未缓存的种子批量查询下载记录，仍没有的提交后台识别，下次查询时返回
+        :param torrents: 种子信息列表，包含id、name
+        :param downloader_id: 下载器ID
+        :return: {种子ID: {"title": 标题, "year": 年份, "se": 季集, "image": 海报}}，识别中或未识别的种子不返回
+        """
+        if not downloader_id:
+            downloader_id = self.default_downloader_id
+        media_infos = {}
+        missing = {}
+        with media_info_lock:
+            cache = self.__get_media_info_cache(downloader_id)
+            for torrent in torrents:
+                tid = torrent.get("id")
+                if not tid:
+                    continue
+                media_info = cache.get(tid)
+                if media_info is not None:
+                    if media_info:
+                        media_infos[tid] = media_info
+                elif (downloader_id, tid) not in self._identifying_torrents:
+                    missing[tid] = torrent.get("name")
+        if not missing:
+            return media_infos
+        # 批量查询下载记录
+        historys = self.dbhelper.get_download_history_by_downloader_ids(downloader=downloader_id,
+                                                                        download_ids=missing.keys())
+        with media_info_lock:
+            cache = self.__get_media_info_cache(downloader_id)
+            for tid, history in historys.items():
+                media_infos[tid] = cache[tid] = {
+                    "title": history.TITLE,
+                    "year": history.YEAR,
+                    "se": history.SE,
+                    "image": history.POSTER
+                }
+                missing.pop(tid, None)
+            for tid in missing:
+                self._identifying_torrents.add((downloader_id, tid))
+        for tid, name in missing.items():
+            identify_executor.submit(self.__identify_torrent, downloader_id, tid, name)
+        return media_infos
+
+    def __get_media_info_cache(self, downloader_id):
+        """
+        获取下载器的种子媒体信息缓存，需在锁内调用
+        """
+        cache = self._torrent_media_infos.get(downloader_id)
+        if cache is None:
+            cache = TTLCache(maxsize=DOWNLOADING_MEDIA_CACHE_SIZE, ttl=DOWNLOADING_MEDIA_CACHE_EXPIRE)
+            self._torrent_media_infos[downloader_id] = cache
+        return cache
+
+    def __identify_torrent(self, downloader_id, tid, name):
+        """
+        后台识别种子名称并缓存结果
+        """
+        media_info = None
+        try:
+            meta_info = self.media.get_media_info(title=name)
+            if meta_info:
+                media_info = {
+                    "title": meta_info.title or meta_info.get_name(),
+                    "year": meta_info.year,
+                    "se": meta_info.get_season_episode_string(),
+                    "image": meta_info.get_poster_image()
+                }
+            else:
+                media_info = {}
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        with media_info_lock:
+            self._identifying_torrents.discard((downloader_id, tid))
+            if media_info is not None:
+                self.__get_media_info_cache(downloader_id)[tid] = media_info
+
     def update_downloader(self,
                           did,
                           name,
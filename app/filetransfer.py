@@ -5,13 +5,13 @@ import re
 import shutil
 import traceback
 from enum import Enum
-from threading import Lock
 from time import sleep
 
 import log
 from app.conf import ModuleConf
-from app.helper import DbHelper, ProgressHelper
+from app.helper import DbHelper, ProgressHelper, TransferHelper
 from app.helper import ThreadHelper
+from app.helper.library_index_helper import LibraryIndexHelper
 from app.media import Media, Category, Scraper
 from app.media.meta import MetaInfo
 from app.message import Message
@@ -22,8 +22,6 @@ from app.utils.types import MediaType, SyncType, RmtMode, EventType, ProgressKey
 from config import RMT_AUDIO_TRACK_EXT, RMT_SUBEXT, RMT_MEDIAEXT, RMT_FAVTYPE, RMT_MIN_FILESIZE, DEFAULT_MOVIE_FORMAT, \
     DEFAULT_TV_FORMAT, Config
 
-lock = Lock()
-
 
 @singleton
 class FileTransfer:
@@ -36,6 +34,7 @@ class FileTransfer:
     dbhelper = None
     progress = None
     eventmanager = None
+    libraryindex = None
 
     _default_rmt_mode = None
     _movie_path = None
@@ -67,6 +66,7 @@ class FileTransfer:
         self.dbhelper = DbHelper()
         self.progress = ProgressHelper()
         self.eventmanager = EventManager()
+        self.libraryindex = LibraryIndexHelper()
 
         media = Config().get_config('media')
         if media:
@@ -157,7 +157,7 @@ class FileTransfer:
         :param target_file: 目标文件路径
         :param rmt_mode: RmtMode转移方式
         """
-        with lock:
+        def __command():
             if rmt_mode == RmtMode.LINK:
                 # 更链接
                 retcode, retmsg = SystemUtils.link(file_item, target_file)
@@ -186,6 +186,12 @@ class FileTransfer:
             else:
                 # 复制
                 retcode, retmsg = SystemUtils.copy(file_item, target_file)
+            return retcode, retmsg
+
+        retcode, retmsg = TransferHelper().execute(file_item=file_item,
+                                                   target_file=target_file,
+                                                   rmt_mode=rmt_mode,
+                                                   command=__command)
         if retcode != 0:
             log.error("【Rmt】%s" % retmsg)
         return retcode
@@ -478,6 +484,7 @@ class FileTransfer:
         if over_flag and old_file and os.path.isfile(old_file):
             log.info("【Rmt】正在删除已存在的文件：%s" % old_file)
             os.remove(old_file)
+            self.libraryindex.remove_file(old_file)
         log.info("【Rmt】正在转移文件：%s 到 %s" % (file_name, new_file))
         retcode = self.__transfer_command(file_item=file_item,
                                           target_file=new_file,
@@ -817,7 +824,7 @@ class FileTransfer:
                     elif rmt_mode not in ModuleConf.REMOTE_RMT_MODES:
                         # 创建目录
                         log.debug("【Rmt】正在创建目录：%s" % ret_dir_path)
-                        os.makedirs(ret_dir_path)
+                        os.makedirs(ret_dir_path, exist_ok=True)
                 # 转移蓝光原盘
                 if bluray_disk_dir:
                     ret = self.__transfer_bluray_dir(
@@ -877,6 +884,9 @@ class FileTransfer:
                                                              append_to_response="all"))
                 # 输出路径
                 out_path = new_file if not bluray_disk_dir else ret_dir_path
+                # 登记到媒体库索引
+                if not bluray_disk_dir and rmt_mode not in ModuleConf.REMOTE_RMT_MODES:
+                    self.libraryindex.add_file(new_file, tmdbid=media.tmdb_id)
                 # 转移历史记录
                 self.dbhelper.insert_transfer_history(
                     in_from=in_from,
@@ -972,8 +982,8 @@ class FileTransfer:
                     and os.path.exists(in_path) \
                     and os.path.isdir(in_path) \
                     and not root_path \
-                    and not PathUtils.get_dir_files(in_path=in_path, exts=RMT_MEDIAEXT) \
-                    and not PathUtils.get_dir_files(in_path=in_path, exts=['.!qb', '.part']):
+                    and not PathUtils.has_dir_files(in_path=in_path, exts=RMT_MEDIAEXT) \
+                    and not PathUtils.has_dir_files(in_path=in_path, exts=['.!qb', '.part']):
                 log.info("【Rmt】目录下已无媒体文件及正在下载的文件，移动模式下删除目录：%s" % in_path)
                 shutil.rmtree(in_path)
         return __finish_transfer(success_flag, error_message)
@@ -1125,14 +1135,14 @@ class FileTransfer:
             for dest_path in self._movie_path:
                 # 判断精选
                 fav_path = os.path.join(dest_path, RMT_FAVTYPE, dir_name)
-                fav_files = PathUtils.get_dir_files(fav_path, RMT_MEDIAEXT)
+                fav_files = self.__get_library_files(fav_path)
                 # 其它分类
                 if self._movie_category_flag:
                     dest_path = os.path.join(
                         dest_path, meta_info.category, dir_name)
                 else:
                     dest_path = os.path.join(dest_path, dir_name)
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
+                files = self.__get_library_files(dest_path)
                 if len(files) > 0 or len(fav_files) > 0:
                     return [{'title': meta_info.title, 'year': meta_info.year}]
             return []
@@ -1160,19 +1170,28 @@ class FileTransfer:
                 # 目录不存在
                 if not os.path.exists(dest_path):
                     continue
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
-                for file in files:
-                    file_meta_info = MetaInfo(os.path.basename(file))
-                    if not file_meta_info.get_season_list() or not file_meta_info.get_episode_list():
+                # 从媒体库索引中读取已识别的文件
+                for _, file_info in self.__get_library_files(dest_path):
+                    if not file_info.get("seasons") or not file_info.get("episodes"):
                         continue
-                    if file_meta_info.get_name() != meta_info.title:
+                    if file_info.get("name") != meta_info.title:
                         continue
-                    if not file_meta_info.is_in_season(season):
+                    if int(season) not in file_info.get("seasons"):
                         continue
                     exists_episodes = list(set(exists_episodes).union(
-                        set(file_meta_info.get_episode_list())))
+                        set(file_info.get("episodes"))))
             return list(set(total_episodes).difference(set(exists_episodes)))
 
+    def __get_library_files(self, path):
+        """
+        从媒体库索引中获取目录下的媒体文件及识别结果
+        :return: [(文件路径, 识别结果)]
+        """
+        if os.path.isdir(path):
+            return self.libraryindex.get_media_files(path, RMT_MEDIAEXT)
+        return [(file, self.libraryindex.parse_file(file))
+                for file in PathUtils.get_dir_files(path, RMT_MEDIAEXT)]
+
     def get_best_target_path(self, mtype, in_path=None, size=0):
         """
         查询一个最好的目录返回，有in_path时找与in_path同路径的，没有in_path时，顺序查找1个符合大小要求的，没有in_path和size时，返回第1个
@@ -1402,6 +1421,7 @@ class FileTransfer:
                 shutil.rmtree(file)
                 return True, f"{file} 删除成功"
             os.remove(file)
+            self.libraryindex.remove_file(file)
             nfoname = f"{os.path.splitext(filename)[0]}.nfo"
             nfofile = os.path.join(filedir, nfoname)
             if os.path.exists(nfofile):
@@ -1410,7 +1430,7 @@ class FileTransfer:
             if re.findall(r"^S\d{2}|^Season", os.path.basename(filedir), re.I):
                 # 当前是季文件夹，判断并删除
                 seaon_dir = filedir
-                if seaon_dir.count('/') > 1 and not PathUtils.get_dir_files(seaon_dir, exts=RMT_MEDIAEXT):
+                if seaon_dir.count('/') > 1 and not PathUtils.has_dir_files(seaon_dir, exts=RMT_MEDIAEXT):
                     shutil.rmtree(seaon_dir)
                 # 媒体文件夹
                 media_dir = os.path.dirname(seaon_dir)
@@ -1420,7 +1440,7 @@ class FileTransfer:
             if media_dir != '/' \
                     and media_dir.count('/') > 1 \
                     and not re.search(r'[a-zA-Z]:/$', media_dir) \
-                    and not PathUtils.get_dir_files(media_dir, exts=RMT_MEDIAEXT):
+                    and not PathUtils.has_dir_files(media_dir, exts=RMT_MEDIAEXT):
                 shutil.rmtree(media_dir)
             return True, f"{file} 删除成功"
         except Exception as e:
@@ -15,6 +15,10 @@ class Filter:
     dbhelper = None
     _groups = []
     _rules = []
+    # 编译后的过滤规则 {规则组ID: [规则]}，规则变化时重建
+    _rule_plans = {}
+    # 过滤规则版本，每次重新加载规则时递增
+    rule_version = 0
 
     def __init__(self):
         self.init_config()
@@ -24,6 +28,8 @@ class Filter:
         self.rg_matcher = ReleaseGroupsMatcher()
         self._groups = self.get_filter_group()
         self._rules = self.get_filter_rule()
+        self._rule_plans = self.__build_rule_plans()
+        self.rule_version += 1
 
     def get_rule_groups(self, groupid=None, default=False):
         """
@@ -93,111 +99,144 @@ class Filter:
         first_order = min([int(rule_info.get("pri")) for rule_info in self.get_rules(groupid=rulegroup)] or [0])
         return 100 - first_order
 
-    def check_rules(self, meta_info, rulegroup=None):
+    def __build_rule_plans(self):
         """
-        检查种子是否匹配站点过滤规则：排除规则、包含规则，优先规则
-        :param meta_info: 识别的信息
-        :param rulegroup: 规则组ID
-        :return: 是否匹配，匹配的优先值，规则名称，值越大越优先
+        将各规则组的过滤规则编译为匹配计划：正则预编译、大小范围和促销因子预先解析
+        :return: {规则组ID: [编译后的规则]}
+        """
+        rule_plans = {}
+        for group in self._groups:
+            plans = []
+            for filter_info in self.get_rules(groupid=group.ID):
+                try:
+                    plans.append(self.__compile_rule(filter_info))
+                except Exception as err:
+                    log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{filter_info}")
+            rule_plans[str(group.ID)] = plans
+        return rule_plans
+
+    @staticmethod
+    def __compile_rule(filter_info):
+        """
+        编译单条过滤规则
+        """
+        # 大小范围，单位字节
+        size_range = None
+        sizes = filter_info.get('size')
+        if sizes:
+            if sizes.find(',') != -1:
+                sizes = sizes.split(',')
+                begin_size = int(sizes[0].strip()) if sizes[0].isdigit() else 0
+                end_size = int(sizes[1].strip()) if sizes[1].isdigit() else 0
+            else:
+                begin_size = 0
+                end_size = int(sizes.strip()) if sizes.isdigit() else 0
+            size_range = (begin_size * 1024 ** 3, end_size * 1024 ** 3)
+        # 促销因子
+        free_factor = None
+        free = filter_info.get("free")
+        if free:
+            ul_factor, dl_factor = free.split()
+            free_factor = (float(ul_factor), float(dl_factor))
+        return {
+            "info": filter_info,
+            # 命中规则的序号
+            "order": 100 - int(filter_info.get('pri')),
+            "include": [re.compile(r'%s' % include.strip(), re.IGNORECASE)
+                        for include in filter_info.get('include') if include],
+            "exclude": [re.compile(r'%s' % exclude.strip(), re.IGNORECASE)
+                        for exclude in filter_info.get('exclude') if exclude],
+            "size": size_range,
+            "free": free_factor
+        }
+
+    def __get_group_plan(self, rulegroup=None):
+        """
+        获取规则组的匹配计划
+        :param rulegroup: 规则组ID，为空时使用默认规则组，为-1时不过滤
+        :return: 规则组名称，编译后的规则列表，不需要过滤时为None
         """
-        if not meta_info:
-            return False, 0, ""
         # 为-1时不使用过滤规则
         if rulegroup and int(rulegroup) == -1:
-            return True, 0, "不过滤"
-        # 过滤使用的文本
-        title = meta_info.rev_string
-        if meta_info.subtitle:
-            title = f"{title} {meta_info.subtitle}"
-        # 过滤规则组
+            return "不过滤", None
         if not rulegroup:
             rulegroup = self.get_rule_groups(default=True)
             if not rulegroup:
-                return True, 0, "未配置过滤规则"
+                return "未配置过滤规则", None
         else:
             rulegroup = self.get_rule_groups(groupid=rulegroup)
-        filters = self.get_rules(groupid=rulegroup.get("id"))
+        return rulegroup.get("name"), self._rule_plans.get(str(rulegroup.get("id")), [])
+
+    @staticmethod
+    def __match_rule(plan, title, meta_info):
+        """
+        检查种子是否命中单条过滤规则
+        """
+        # 必须包括的项
+        for include in plan.get("include"):
+            if not include.search(title):
+                return False
+        # 不能包含的项，全部包含时不匹配
+        excludes = plan.get("exclude")
+        if excludes and all(exclude.search(title) for exclude in excludes):
+            return False
+        # 大小
+        size_range = plan.get("size")
+        if size_range and meta_info.size:
+            meta_info.size = StringUtils.num_filesize(meta_info.size)
+            begin_size, end_size = size_range
+            if meta_info.type == MediaType.MOVIE:
+                if not begin_size <= int(meta_info.size) <= end_size:
+                    return False
+            else:
+                if meta_info.total_episodes \
+                        and not begin_size <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size:
+                    return False
+        # 促销
+        free_factor = plan.get("free")
+        if free_factor and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
+            if free_factor[0] > meta_info.upload_volume_factor \
+                    or free_factor[1] < meta_info.download_volume_factor:
+                return False
+        return True
+
+    def __match_rules(self, meta_info, group_name, plans):
+        """
+        按规则组的匹配计划检查种子，返回值同check_rules
+        """
+        if plans is None:
+            return True, 0, group_name
+        # 过滤使用的文本
+        title = meta_info.rev_string
+        if meta_info.subtitle:
+            title = f"{title} {meta_info.subtitle}"
         # 命中优先级
         order_seq = 0
         # 当前规则组是否命中
         group_match = True
-        for filter_info in filters:
+        for plan in plans:
             try:
-                # 当前规则是否命中
-                rule_match = True
-                # 命中规则的序号
-                order_seq = 100 - int(filter_info.get('pri'))
-                # 必须包括的项
-                includes = filter_info.get('include')
-                if includes and rule_match:
-                    include_flag = True
-                    for include in includes:
-                        if not include:
-                            continue
-                        if not re.search(r'%s' % include.strip(), title, re.IGNORECASE):
-                            include_flag = False
-                            break
-                    if not include_flag:
-                        rule_match = False
-
-                # 不能包含的项
-                excludes = filter_info.get('exclude')
-                if excludes and rule_match:
-                    exclude_flag = False
-                    exclude_count = 0
-                    for exclude in excludes:
-                        if not exclude:
-                            continue
-                        exclude_count += 1
-                        if not re.search(r'%s' % exclude.strip(), title, re.IGNORECASE):
-                            exclude_flag = True
-                    if exclude_count > 0 and not exclude_flag:
-                        rule_match = False
-                # 大小
-                sizes = filter_info.get('size')
-                if sizes and rule_match and meta_info.size:
-                    meta_info.size = StringUtils.num_filesize(meta_info.size)
-                    if sizes.find(',') != -1:
-                        sizes = sizes.split(',')
-                        if sizes[0].isdigit():
-                            begin_size = int(sizes[0].strip())
-                        else:
-                            begin_size = 0
-                        if sizes[1].isdigit():
-                            end_size = int(sizes[1].strip())
-                        else:
-                            end_size = 0
-                    else:
-                        begin_size = 0
-                        if sizes.isdigit():
-                            end_size = int(sizes.strip())
-                        else:
-                            end_size = 0
-                    if meta_info.type == MediaType.MOVIE:
-                        if not begin_size * 1024 ** 3 <= int(meta_info.size) <= end_size * 1024 ** 3:
-                            rule_match = False
-                    else:
-                        if meta_info.total_episodes \
-                                and not begin_size * 1024 ** 3 <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size * 1024 ** 3:
-                            rule_match = False
-
-                # 促销
-                free = filter_info.get("free")
-                if free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
-                    ul_factor, dl_factor = free.split()
-                    if float(ul_factor) > meta_info.upload_volume_factor \
-                            or float(dl_factor) < meta_info.download_volume_factor:
-                        rule_match = False
-
-                if rule_match:
-                    return True, order_seq, rulegroup.get("name")
-                else:
-                    group_match = False
+                order_seq = plan.get("order")
+                if self.__match_rule(plan, title, meta_info):
+                    return True, order_seq, group_name
+                group_match = False
             except Exception as err:
-                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{filter_info}")
+                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{plan.get('info')}")
         if not group_match:
-            return False, 0, rulegroup.get("name")
-        return True, order_seq, rulegroup.get("name")
+            return False, 0, group_name
+        return True, order_seq, group_name
+
+    def check_rules(self, meta_info, rulegroup=None):
+        """
+        检查种子是否匹配站点过滤规则：排除规则、包含规则，优先规则
+        :param meta_info: 识别的信息
+        :param rulegroup: 规则组ID
+        :return: 是否匹配，匹配的优先值，规则名称，值越大越优先
+        """
+        if not meta_info:
+            return False, 0, ""
+        group_name, plans = self.__get_group_plan(rulegroup)
+        return self.__match_rules(meta_info, group_name, plans)
 
     def is_rule_free(self, rulegroup=None):
         """
@@ -242,6 +281,25 @@ class Filter:
                 return False
         return True
 
+    @staticmethod
+    def __compile_filter_args(filter_args):
+        """
+        预编译过滤条件中的正则
+        """
+        def compile_re(pattern):
+            return re.compile(r"%s" % pattern, re.I) if pattern else None
+
+        restype = filter_args.get("restype")
+        pix = filter_args.get("pix")
+        return {
+            "restype": compile_re(ModuleConf.TORRENT_SEARCH_PARAMS["restype"].get(restype)) if restype else None,
+            "pix": compile_re(ModuleConf.TORRENT_SEARCH_PARAMS["pix"].get(pix)) if pix else None,
+            "team": compile_re(filter_args.get("team")),
+            "include": compile_re(filter_args.get("include")),
+            "exclude": compile_re(filter_args.get("exclude")),
+            "key": compile_re(filter_args.get("key"))
+        }
+
     def check_torrent_filter(self,
                              meta_info,
                              filter_args,
@@ -255,23 +313,59 @@ class Filter:
         :param downloadvolumefactor: 种子的下载因子 传空不过滤
         :return: 是否匹配，匹配的优先值，匹配信息，值越大越优先
         """
+        return self.check_torrent_filter_batch(
+            torrents=[(meta_info, uploadvolumefactor, downloadvolumefactor)],
+            filter_args=filter_args)[0]
+
+    def check_torrent_filter_batch(self, torrents, filter_args):
+        """
+        批量对种子进行过滤，过滤条件和规则组只编译、查找一次
+        :param torrents: 种子列表 [(名称识别后的MetaBase对象, 上传因子, 下载因子)]，因子传空不过滤
+        :param filter_args: 过滤条件的字典
+        :return: 与种子列表一一对应的 [(是否匹配，匹配的优先值，匹配信息)]，值越大越优先
+        """
+        if not torrents:
+            return []
+        args_plan = self.__compile_filter_args(filter_args)
+        # 过滤规则，-1表示不使用过滤规则，空则使用默认过滤规则
+        group_name, plans = self.__get_group_plan(filter_args.get("rule"))
+        return [self.__check_torrent_filter(meta_info=meta_info,
+                                            filter_args=filter_args,
+                                            args_plan=args_plan,
+                                            group_name=group_name,
+                                            plans=plans,
+                                            uploadvolumefactor=uploadvolumefactor,
+                                            downloadvolumefactor=downloadvolumefactor)
+                for meta_info, uploadvolumefactor, downloadvolumefactor in torrents]
+
+    def __check_torrent_filter(self,
+                               meta_info,
+                               filter_args,
+                               args_plan,
+                               group_name,
+                               plans,
+                               uploadvolumefactor=None,
+                               downloadvolumefactor=None):
+        """
+        按预编译的过滤条件和规则组对单个种子进行过滤
+        """
         # 过滤包含，排除，关键字使用的文本
         text = meta_info.rev_string
         if meta_info.subtitle:
             text = f"{text} {meta_info.subtitle}"
         # 过滤质量
         if filter_args.get("restype"):
-            restype_re = ModuleConf.TORRENT_SEARCH_PARAMS["restype"].get(filter_args.get("restype"))
+            restype_re = args_plan.get("restype")
             if not meta_info.get_edtion_string():
                 return False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"
-            if restype_re and not re.search(r"%s" % restype_re, meta_info.get_edtion_string(), re.I):
+            if restype_re and not restype_re.search(meta_info.get_edtion_string()):
                 return False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"
         # 过滤分辨率
         if filter_args.get("pix"):
-            pix_re = ModuleConf.TORRENT_SEARCH_PARAMS["pix"].get(filter_args.get("pix"))
+            pix_re = args_plan.get("pix")
             if not meta_info.resource_pix:
                 return False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"
-            if pix_re and not re.search(r"%s" % pix_re, meta_info.resource_pix, re.I):
+            if pix_re and not pix_re.search(meta_info.resource_pix):
                 return False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"
         # 过滤制作组/字幕组
         if filter_args.get("team"):
@@ -284,7 +378,7 @@ class Filter:
                     return False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"
                 else:
                     meta_info.resource_team = resource_team
-            elif not re.search(r"%s" % team, meta_info.resource_team, re.I):
+            elif not args_plan.get("team").search(meta_info.resource_team):
                 return False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"
         # 过滤促销
         if filter_args.get("sp_state"):
@@ -295,40 +389,26 @@ class Filter:
                 return False, 0, f"{meta_info.org_string} 不符合促销要求"
         # 过滤包含
         if filter_args.get("include"):
-            include = filter_args.get("include")
-            if not re.search(r"%s" % include, text, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合包含 {include} 要求"
+            if not args_plan.get("include").search(text):
+                return False, 0, f"{meta_info.org_string} 不符合包含 {filter_args.get('include')} 要求"
         # 过滤排除
         if filter_args.get("exclude"):
-            exclude = filter_args.get("exclude")
-            if re.search(r"%s" % exclude, text, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合排除 {exclude} 要求"
+            if args_plan.get("exclude").search(text):
+                return False, 0, f"{meta_info.org_string} 不符合排除 {filter_args.get('exclude')} 要求"
         # 过滤关键字
         if filter_args.get("key"):
-            key = filter_args.get("key")
-            if not re.search(r"%s" % key, text, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合 {key} 要求"
-        # 过滤过滤规则，-1表示不使用过滤规则，空则使用默认过滤规则
-        if filter_args.get("rule"):
-            # 已设置默认规则
-            match_flag, order_seq, rule_name = self.check_rules(meta_info, filter_args.get("rule"))
-            match_msg = "%s 大小：%s 促销：%s 不符合订阅/站点过滤规则 %s 要求" % (
-                meta_info.org_string,
-                StringUtils.str_filesize(meta_info.size),
-                meta_info.get_volume_factor_string(),
-                rule_name
-            )
-            return match_flag, order_seq, match_msg
-        else:
-            # 默认过滤规则
-            match_flag, order_seq, rule_name = self.check_rules(meta_info)
-            match_msg = "%s 大小：%s 促销：%s 不符合默认过滤规则 %s 要求" % (
-                meta_info.org_string,
-                StringUtils.str_filesize(meta_info.size),
-                meta_info.get_volume_factor_string(),
-                rule_name
-            )
-            return match_flag, order_seq, match_msg
+            if not args_plan.get("key").search(text):
+                return False, 0, f"{meta_info.org_string} 不符合 {filter_args.get('key')} 要求"
+        # 过滤过滤规则
+        match_flag, order_seq, rule_name = self.__match_rules(meta_info, group_name, plans)
+        match_msg = "%s 大小：%s 促销：%s 不符合%s过滤规则 %s 要求" % (
+            meta_info.org_string,
+            StringUtils.str_filesize(meta_info.size),
+            meta_info.get_volume_factor_string(),
+            "订阅/站点" if filter_args.get("rule") else "默认",
+            rule_name
+        )
+        return match_flag, order_seq, match_msg
 
     def add_group(self, name, default='N'):
         """
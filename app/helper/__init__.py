@@ -1,7 +1,9 @@
 from .chrome_helper import ChromeHelper, init_chrome
 from .indexer_helper import IndexerHelper, IndexerConf
 from .meta_helper import MetaHelper
+from .tmdb_cache_helper import TmdbCacheHelper
 from .progress_helper import ProgressHelper
+from .transfer_helper import TransferHelper
 from .security_helper import SecurityHelper
 from .thread_helper import ThreadHelper
 from .db_helper import DbHelper
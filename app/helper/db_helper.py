@@ -14,6 +14,12 @@ from app.utils.types import MediaType, RmtMode
 class DbHelper:
     _db = MainDb()
 
+    def batch(self):
+        """
+        批量写入，上下文内的写操作统一提交一次，任一失败整体回滚
+        """
+        return self._db.batch()
+
     @DbPersist(_db)
     def insert_search_results(self, media_items: list, title=None, ident_flag=True):
         """
@@ -1609,6 +1615,22 @@ class DbHelper:
             DOWNLOADHISTORY.DOWNLOAD_ID == download_id
         ).order_by(DOWNLOADHISTORY.DATE.desc()).first()
 
+    def get_download_history_by_downloader_ids(self, downloader, download_ids):
+        """
+        根据下载器批量查找下载历史，同一下载ID有多条记录时取最新的
+        :return: {下载ID: 下载历史}
+        """
+        historys = {}
+        download_ids = list(download_ids or [])
+        # 分批查询，避免超出SQLite的参数个数限制
+        for i in range(0, len(download_ids), 500):
+            for history in self._db.query(DOWNLOADHISTORY).filter(
+                    DOWNLOADHISTORY.DOWNLOADER == downloader,
+                    DOWNLOADHISTORY.DOWNLOAD_ID.in_(download_ids[i:i + 500])
+            ).order_by(DOWNLOADHISTORY.DATE.desc()):
+                historys.setdefault(history.DOWNLOAD_ID, history)
+        return historys
+
     @DbPersist(_db)
     def update_brushtask(self, brush_id, item):
         """
@@ -0,0 +1,265 @@
+import os
+import pickle
+import sqlite3
+import time
+from threading import RLock
+
+from app.helper.words_helper import WordsHelper
+from app.media.meta import MetaInfo
+from app.utils import ExceptionUtils, PathUtils, StringUtils
+from app.utils.commons import singleton
+from config import Config, RMT_MEDIAEXT, LIBRARY_INDEX_MTIME_SLACK
+
+lock = RLock()
+
+
+@singleton
+class LibraryIndexHelper(object):
+    """
+    媒体库文件索引，按目录记录媒体文件及其识别结果，判断媒体是否存在时不再遍历目录和识别文件名：
+    {
+        目录: {
+            "mtime": 目录修改时间,
+            "scanned": 扫描时间,
+            "dirs": [子目录名],
+            "files": {文件名: {"size": 大小, "name": 名称, "seasons": [季], "episodes": [集], "tmdbid": TMDBID}}
+        }
+    }
+    目录修改时间变化时重新列出该目录，只识别新增或大小变化的文件；转移、删除文件时增量更新；
+    索引中的目录数据只替换不修改，遍历目录时不持有锁
+    """
+    _dirs = {}
+    _conn = None
+    _path = None
+    # 识别结果对应的识别词
+    _words_version = None
+
+    def __init__(self):
+        self.init_config()
+
+    def init_config(self):
+        with lock:
+            if self._conn:
+                self._conn.close()
+            self._path = os.path.join(Config().get_config_path(), 'library_index.db')
+            self._conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS LIBRARY_DIRS ("
+                               "PATH TEXT PRIMARY KEY, "
+                               "DATA BLOB)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS LIBRARY_META ("
+                               "KEY TEXT PRIMARY KEY, "
+                               "VALUE TEXT)")
+            self._conn.commit()
+            self._dirs = {}
+            self._words_version = None
+
+    def __check_words(self):
+        """
+        识别词变化后识别结果失效，清空索引，需在锁内调用
+        """
+        words_helper = WordsHelper()
+        if self._words_version == words_helper.words_version:
+            return
+        self._words_version = words_helper.words_version
+        signature = StringUtils.md5_hash(str([(word.REPLACED, word.REPLACE, word.FRONT, word.BACK, word.OFFSET,
+                                               word.TYPE, word.SEASON, word.REGEX)
+                                              for word in words_helper.words_info]))
+        row = self._conn.execute("SELECT VALUE FROM LIBRARY_META WHERE KEY = 'words'").fetchone()
+        if row and row[0] == signature:
+            return
+        self._dirs = {}
+        self._conn.execute("DELETE FROM LIBRARY_DIRS")
+        self._conn.execute("INSERT OR REPLACE INTO LIBRARY_META (KEY, VALUE) VALUES ('words', ?)", (signature,))
+        self._conn.commit()
+
+    def __load_dir(self, path):
+        """
+        读取目录索引，内存中没有时从存储中加载，需在锁内调用
+        """
+        entry = self._dirs.get(path)
+        if entry is None:
+            row = self._conn.execute("SELECT DATA FROM LIBRARY_DIRS WHERE PATH = ?", (path,)).fetchone()
+            if row:
+                try:
+                    entry = pickle.loads(row[0])
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    entry = None
+            if entry:
+                self._dirs[path] = entry
+        return entry
+
+    def __save_dir(self, path, entry):
+        """
+        保存目录索引，entry为空时删除，需在锁内调用
+        """
+        try:
+            if entry:
+                self._dirs[path] = entry
+                self._conn.execute("INSERT OR REPLACE INTO LIBRARY_DIRS (PATH, DATA) VALUES (?, ?)",
+                                   (path, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)))
+            else:
+                self._dirs.pop(path, None)
+                self._conn.execute("DELETE FROM LIBRARY_DIRS WHERE PATH = ?", (path,))
+            self._conn.commit()
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self._conn.rollback()
+
+    @staticmethod
+    def parse_file(file_name, size=0, tmdbid=None):
+        """
+        识别媒体文件名，返回索引中记录的识别结果
+        """
+        meta_info = MetaInfo(os.path.basename(file_name))
+        return {
+            "size": size,
+            "name": meta_info.get_name(),
+            "seasons": meta_info.get_season_list(),
+            "episodes": meta_info.get_episode_list(),
+            "tmdbid": tmdbid
+        }
+
+    def __remove_dir(self, path):
+        """
+        删除目录及其下所有子目录的索引，需在锁内调用
+        """
+        entry = self.__load_dir(path)
+        if not entry:
+            return
+        self.__save_dir(path, None)
+        for dir_name in entry.get("dirs"):
+            self.__remove_dir(os.path.join(path, dir_name))
+
+    def __scan_dir(self, path, mtime, entry):
+        """
+        列出目录下的子目录及媒体文件，已识别过且大小未变的文件沿用原识别结果，已不存在的子目录删除其索引
+        """
+        scanned = time.time()
+        old_files = entry.get("files") if entry else {}
+        dirs = []
+        files = {}
+        with os.scandir(path) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    dirs.append(item.name)
+                    continue
+                if os.path.splitext(item.name)[-1].lower() not in RMT_MEDIAEXT:
+                    continue
+                try:
+                    size = item.stat().st_size
+                except OSError:
+                    size = 0
+                info = old_files.get(item.name)
+                if not info or info.get("size") != size:
+                    info = self.parse_file(item.name, size, tmdbid=info.get("tmdbid") if info else None)
+                files[item.name] = info
+        new_entry = {"mtime": mtime, "scanned": scanned, "dirs": dirs, "files": files}
+        with lock:
+            if entry:
+                for dir_name in set(entry.get("dirs")) - set(dirs):
+                    self.__remove_dir(os.path.join(path, dir_name))
+            self.__save_dir(path, new_entry)
+        return new_entry
+
+    def __get_dir(self, path):
+        """
+        获取目录索引，目录修改时间变化时重新扫描；
+        修改时间精度较低的文件系统上，与目录修改同一时刻的扫描可能漏掉之后新增的文件，
+        修改时间距扫描时间过近的索引视为未确认，也重新扫描
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            with lock:
+                self.__remove_dir(path)
+            return None
+        with lock:
+            entry = self.__load_dir(path)
+        if entry and entry.get("mtime") == mtime \
+                and entry.get("scanned", 0) - mtime / 1e9 > LIBRARY_INDEX_MTIME_SLACK:
+            return entry
+        return self.__scan_dir(path, mtime, entry)
+
+    def __walk(self, path, exts, ret):
+        entry = self.__get_dir(path)
+        if not entry:
+            return
+        for file_name, info in entry.get("files").items():
+            file_path = os.path.join(path, file_name)
+            if PathUtils.is_invalid_path(file_path):
+                continue
+            if exts and os.path.splitext(file_name)[-1].lower() not in exts:
+                continue
+            ret.append((file_path, info))
+        for dir_name in entry.get("dirs"):
+            self.__walk(os.path.join(path, dir_name), exts, ret)
+
+    def get_media_files(self, path, exts=None):
+        """
+        获取目录下（含子目录）的媒体文件及识别结果
+        :param path: 目录
+        :param exts: 后缀过滤，为空时返回全部媒体文件
+        :return: [(文件路径, {"size", "name", "seasons", "episodes", "tmdbid"})]
+        """
+        if not path or not os.path.isdir(path):
+            return []
+        ret = []
+        try:
+            with lock:
+                self.__check_words()
+            self.__walk(os.path.normpath(path), exts, ret)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+        return ret
+
+    def add_file(self, file_path, tmdbid=None):
+        """
+        登记新转移到媒体库的文件，只更新已建立索引的目录，下次访问时目录会重新列出但不再识别该文件
+        """
+        if not file_path or os.path.splitext(file_path)[-1].lower() not in RMT_MEDIAEXT:
+            return
+        file_path = os.path.normpath(file_path)
+        path, file_name = os.path.split(file_path)
+        try:
+            with lock:
+                self.__check_words()
+                entry = self.__load_dir(path)
+                if not entry:
+                    return
+                size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+                files = dict(entry.get("files"))
+                files[file_name] = self.parse_file(file_name, size, tmdbid=tmdbid)
+                self.__save_dir(path, dict(entry, mtime=None, files=files))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+
+    def remove_file(self, file_path):
+        """
+        从索引中移除已删除的文件
+        """
+        if not file_path:
+            return
+        file_path = os.path.normpath(file_path)
+        path, file_name = os.path.split(file_path)
+        try:
+            with lock:
+                entry = self.__load_dir(path)
+                if not entry or file_name not in entry.get("files"):
+                    return
+                files = dict(entry.get("files"))
+                files.pop(file_name, None)
+                self.__save_dir(path, dict(entry, mtime=None, files=files))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+
+    def clear(self):
+        """
+        清空索引
+        """
+        with lock:
+            self._dirs = {}
+            self._conn.execute("DELETE FROM LIBRARY_DIRS")
+            self._conn.commit()
@@ -1,18 +1,19 @@
 import os
-import pickle
-import random
 import time
+from collections import deque
 from enum import Enum
 from threading import RLock
 
+from app.helper.meta_store import MetaPickleStore, MetaSqliteStore, CACHE_EXPIRE_TIMESTAMP_STR
 from app.utils import ExceptionUtils
 from app.utils.commons import singleton
-from config import Config
+from config import Config, META_CACHE_MAXSIZE, META_MISS_CACHE_MAXSIZE
 
 lock = RLock()
 
-CACHE_EXPIRE_TIMESTAMP_STR = "cache_expire_timestamp"
 EXPIRE_TIMESTAMP = 7 * 24 * 3600
+# 访问时刷新过期时间的最小间隔，间隔内重复访问不再刷新
+EXPIRE_REFRESH_INTERVAL = 24 * 3600
 
 
 @singleton
@@ -24,8 +25,29 @@ class MetaHelper(object):
         "year": '',
         "type": MediaType
     }
+    读操作不加锁：内存中命中的缓存直接返回，过期时间的刷新记录到队列中，保存时批量写入；
+    存储中不存在的KEY记录在内存中，再次读取时不再查询存储；
+    写操作加锁，从存储中读取时不持有锁，读取完成后加锁放入内存
     """
+    # 已加载到内存中的缓存，按加载顺序排列，超出上限时释放最早加载且已保存的条目
     _meta_data = {}
+    # 存储中不存在的KEY，按记录顺序排列，新增缓存时移除
+    _missing_keys = {}
+    # 存储版本，清空、删除或写入存储时递增，用于丢弃读取期间已过时的结果
+    _store_version = 0
+    # 待写入存储的KEY
+    _dirty_keys = set()
+    # 待从存储删除的KEY
+    _deleted_keys = set()
+    # 读取时刷新了过期时间的KEY，deque的append/popleft是线程安全的
+    _touched_keys = deque()
+    # 已识别缓存的检索索引 {key: 小写key}，首次检索时构建
+    _search_index = None
+    # 最近一次检索的结果 (检索词, 索引版本, [key])
+    _search_result = None
+    _search_version = 0
+    # 持久化存储
+    _meta_store = None
 
     _meta_path = None
     _tmdb_cache_expire = False
@@ -35,10 +57,32 @@ class MetaHelper(object):
 
     def init_config(self):
         laboratory = Config().get_config('laboratory')
+        store_type = "sqlite"
         if laboratory:
             self._tmdb_cache_expire = laboratory.get("tmdb_cache_expire")
-        self._meta_path = os.path.join(Config().get_config_path(), 'tmdb.dat')
-        self._meta_data = self.__load_meta_data(self._meta_path)
+            store_type = laboratory.get("tmdb_cache_store") or "sqlite"
+        legacy_path = os.path.join(Config().get_config_path(), 'tmdb.dat')
+        with lock:
+            if self._meta_store:
+                # 重载前先保存未写入的缓存，并关闭原有的存储
+                self.save_meta_data()
+                try:
+                    self._meta_store.close()
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+            if store_type == "pickle":
+                self._meta_store = MetaPickleStore(legacy_path)
+            else:
+                self._meta_store = MetaSqliteStore(os.path.join(Config().get_config_path(), 'tmdb.db'),
+                                                   legacy_path=legacy_path)
+            self._meta_path = self._meta_store.get_path()
+            self._meta_data = {}
+            self._missing_keys = {}
+            self._store_version += 1
+            self._dirty_keys = set()
+            self._deleted_keys = set()
+            self._touched_keys = deque()
+            self.__reset_search_index()
 
     def clear_meta_data(self):
         """
@@ -46,6 +90,13 @@ class MetaHelper(object):
         """
         with lock:
             self._meta_data = {}
+            self._missing_keys = {}
+            self._store_version += 1
+            self._dirty_keys = set()
+            self._deleted_keys = set()
+            self._touched_keys = deque()
+            self._meta_store.clear()
+            self.__reset_search_index()
 
     def get_meta_data_path(self):
         """
@@ -53,20 +104,134 @@ class MetaHelper(object):
         """
         return self._meta_path
 
+    def __get_meta_item(self, key):
+        """
+        从内存中读取缓存，内存中没有时从存储中加载，需在锁内调用
+        """
+        info = self._meta_data.get(key)
+        if info is None and key not in self._deleted_keys and key not in self._missing_keys:
+            try:
+                info = self._meta_store.get(key)
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+                return None
+            self.__cache_item(key, info)
+        return info
+
+    def __load_meta_item(self, key):
+        """
+        从存储中加载缓存，查询存储时不持有锁，避免未命中时阻塞其它读写
+        """
+        with lock:
+            if key in self._meta_data or key in self._deleted_keys or key in self._missing_keys:
+                return self._meta_data.get(key)
+            version = self._store_version
+            meta_store = self._meta_store
+        try:
+            info = meta_store.get(key)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return None
+        with lock:
+            if version != self._store_version \
+                    or key in self._meta_data \
+                    or key in self._deleted_keys:
+                # 读取期间存储或内存已变化，以内存中的为准
+                return self._meta_data.get(key)
+            self.__cache_item(key, info)
+            return info
+
+    def __cache_item(self, key, info):
+        """
+        将从存储中读取的结果放入内存，未命中时记录KEY，需在锁内调用
+        """
+        if info is None:
+            self._missing_keys[key] = True
+            if len(self._missing_keys) > META_MISS_CACHE_MAXSIZE:
+                for expired in list(self._missing_keys)[:len(self._missing_keys) - META_MISS_CACHE_MAXSIZE]:
+                    self._missing_keys.pop(expired, None)
+        else:
+            self._meta_data[key] = info
+            self.__evict()
+
+    def __evict(self):
+        """
+        内存中的缓存超出上限时，按加载顺序释放已保存的条目至上限的90%，未保存的条目保留，需在锁内调用
+        """
+        if len(self._meta_data) <= META_CACHE_MAXSIZE:
+            return
+        # 已刷新过期时间的条目转为待写入，避免释放后丢失
+        while self._touched_keys:
+            self._dirty_keys.add(self._touched_keys.popleft())
+        count = len(self._meta_data) - int(META_CACHE_MAXSIZE * 0.9)
+        for key in list(self._meta_data):
+            if count <= 0:
+                break
+            if key in self._dirty_keys:
+                continue
+            self._meta_data.pop(key, None)
+            count -= 1
+
     def get_meta_data_by_key(self, key):
         """
         根据KEY值获取缓存值
         """
-        with lock:
-            info: dict = self._meta_data.get(key)
-            if info:
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire or int(time.time()) < expire:
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                    self.update_meta_data({key: info})
-                elif expire and self._tmdb_cache_expire:
-                    self.delete_meta_data(key)
-            return info or {}
+        info: dict = self._meta_data.get(key)
+        if info is None and key not in self._missing_keys:
+            info = self.__load_meta_item(key)
+        if info:
+            now = int(time.time())
+            expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
+            if not expire or now < expire:
+                if not expire or expire - now < EXPIRE_TIMESTAMP - EXPIRE_REFRESH_INTERVAL:
+                    info[CACHE_EXPIRE_TIMESTAMP_STR] = now + EXPIRE_TIMESTAMP
+                    self._touched_keys.append(key)
+            elif self._tmdb_cache_expire:
+                self.delete_meta_data(key)
+        return info or {}
+
+    def __reset_search_index(self):
+        """
+        重置检索索引，下次检索时重新构建
+        """
+        self._search_index = None
+        self._search_result = None
+        self._search_version += 1
+
+    def __index_add(self, key):
+        if self._search_index is not None and key not in self._search_index:
+            self._search_index[key] = str(key).lower()
+            self._search_version += 1
+
+    def __index_remove(self, keys):
+        if self._search_index is None:
+            return
+        for key in keys:
+            if self._search_index.pop(key, None) is not None:
+                self._search_version += 1
+
+    def __get_search_keys(self, search):
+        """
+        在检索索引中查找包含检索词的KEY，同一检索词翻页时复用结果，需在锁内调用
+        """
+        if self._search_index is None:
+            index = {key: str(key).lower() for key in self._meta_store.keys()}
+            for key, info in self._meta_data.items():
+                if key not in index and str(info.get("id")) != '0':
+                    index[key] = str(key).lower()
+            self._search_index = index
+            self._search_version += 1
+        search = (search or "").lower()
+        if self._search_result \
+                and self._search_result[0] == search \
+                and self._search_result[1] == self._search_version:
+            return self._search_result[2]
+        if search:
+            keys = [k for k, v in self._search_index.items() if search in v]
+        else:
+            keys = list(self._search_index)
+        self._search_result = (search, self._search_version, keys)
+        return keys
 
     def dump_meta_data(self, search, page, num):
         """
@@ -82,16 +247,17 @@ class MetaHelper(object):
             begin_pos = (page - 1) * num
 
         with lock:
-            search_metas = [(k, {
+            keys = self.__get_search_keys(search)
+            metas = [(k, self.__get_meta_item(k) or {}) for k in keys[begin_pos: begin_pos + num]]
+            return len(keys), [(k, {
                 "id": v.get("id"),
                 "title": v.get("title"),
                 "year": v.get("year"),
                 "media_type": v.get("type").value if isinstance(v.get("type"), Enum) else v.get("type"),
                 "poster_path": v.get("poster_path"),
                 "backdrop_path": v.get("backdrop_path")
-            },  str(k).replace("[电影]", "").replace("[电视剧]", "").replace("[未知]", "").replace("-None", ""))
-                for k, v in self._meta_data.items() if search.lower() in k.lower() and v.get("id") != 0]
-            return len(search_metas), search_metas[begin_pos: begin_pos + num]
+            }, str(k).replace("[电影]", "").replace("[电视剧]", "").replace("[未知]", "").replace("-None", ""))
+                for k, v in metas]
 
     def delete_meta_data(self, key):
         """
@@ -100,25 +266,40 @@ class MetaHelper(object):
         @return: 被删除的缓存内容
         """
         with lock:
-            return self._meta_data.pop(key, None)
+            info = self.__get_meta_item(key)
+            self._meta_data.pop(key, None)
+            self._dirty_keys.discard(key)
+            self._deleted_keys.add(key)
+            self.__index_remove([key])
+            return info
 
     def delete_meta_data_by_tmdbid(self, tmdbid):
         """
         清空对应TMDBID的所有缓存记录，以强制更新TMDB中最新的数据
         """
-        for key in list(self._meta_data):
-            if str(self._meta_data.get(key, {}).get("id")) == str(tmdbid):
-                with lock:
+        with lock:
+            keys = []
+            for key in list(self._meta_data):
+                if str(self._meta_data.get(key, {}).get("id")) == str(tmdbid):
                     self._meta_data.pop(key)
+                    self._dirty_keys.discard(key)
+                    keys.append(key)
+            self._store_version += 1
+            try:
+                keys.extend(self._meta_store.delete_by_tmdbid(tmdbid))
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+            self.__index_remove(keys)
 
     def delete_unknown_meta(self):
         """
-        清除未识别的缓存记录，以便重新搜索TMDB
+        清除未识别的缓存记录，以便重新搜索TMDB，未识别的记录只存在于内存中
         """
-        for key in list(self._meta_data):
-            if str(self._meta_data.get(key, {}).get("id")) == '0':
-                with lock:
+        with lock:
+            for key in list(self._meta_data):
+                if str(self._meta_data.get(key, {}).get("id")) == '0':
                     self._meta_data.pop(key)
+                    self._dirty_keys.discard(key)
 
     def modify_meta_data(self, key, title):
         """
@@ -128,25 +309,12 @@ class MetaHelper(object):
         @return: 被修改后缓存内容
         """
         with lock:
-            if self._meta_data.get(key):
-                self._meta_data[key]['title'] = title
-                self._meta_data[key][CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-            return self._meta_data.get(key)
-
-    @staticmethod
-    def __load_meta_data(path):
-        """
-        从文件中加载缓存
-        """
-        try:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    data = pickle.load(f)
-                return data
-            return {}
-        except Exception as e:
-            ExceptionUtils.exception_traceback(e)
-            return {}
+            info = self.__get_meta_item(key)
+            if info:
+                info['title'] = title
+                info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
+                self._dirty_keys.add(key)
+            return info
 
     def update_meta_data(self, meta_data):
         """
@@ -156,65 +324,47 @@ class MetaHelper(object):
             return
         with lock:
             for key, item in meta_data.items():
-                if not self._meta_data.get(key):
+                if not self.__get_meta_item(key):
                     item[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
                     self._meta_data[key] = item
+                    self._missing_keys.pop(key, None)
+                    self._deleted_keys.discard(key)
+                    self._dirty_keys.add(key)
+                    if str(item.get("id")) != '0':
+                        self.__index_add(key)
+            self.__evict()
 
     def save_meta_data(self, force=False):
         """
-        保存缓存数据到文件
+        将变化的缓存增量写入存储
         """
-        meta_data = self.__load_meta_data(self._meta_path)
-        new_meta_data = {k: v for k, v in self._meta_data.items() if str(v.get("id")) != '0'}
-
-        if not force \
-                and not self._random_sample(new_meta_data) \
-                and meta_data.keys() == new_meta_data.keys():
-            return
-
-        with open(self._meta_path, 'wb') as f:
-            pickle.dump(new_meta_data, f, pickle.HIGHEST_PROTOCOL)
-
-    def _random_sample(self, new_meta_data):
-        """
-        采样分析是否需要保存
-        """
-        ret = False
-        if len(new_meta_data) < 25:
-            keys = list(new_meta_data.keys())
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-        else:
-            count = 0
-            keys = random.sample(new_meta_data.keys(), 25)
-            for k in keys:
-                info = new_meta_data.get(k)
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k)
-                        count += 1
-            if count >= 5:
-                ret |= self._random_sample(new_meta_data)
-        return ret
+        with lock:
+            while self._touched_keys:
+                self._dirty_keys.add(self._touched_keys.popleft())
+            upserts = {k: self._meta_data[k] for k in self._dirty_keys
+                       if k in self._meta_data and str(self._meta_data[k].get("id")) != '0'}
+            deletes = list(self._deleted_keys)
+            self._dirty_keys = set()
+            self._deleted_keys = set()
+            self._store_version += 1
+            try:
+                self._meta_store.save(upserts, deletes)
+                if self._tmdb_cache_expire:
+                    expired_keys = self._meta_store.delete_expired(int(time.time()))
+                    for key in expired_keys:
+                        self._meta_data.pop(key, None)
+                    self.__index_remove(expired_keys)
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+                self._dirty_keys.update(upserts.keys())
+                self._deleted_keys.update(deletes)
 
     def get_cache_title(self, key):
         """
         获取缓存的标题
         """
-        cache_media_info = self._meta_data.get(key)
+        with lock:
+            cache_media_info = self.__get_meta_item(key)
         if not cache_media_info or not cache_media_info.get("id"):
             return None
         return cache_media_info.get("title")
@@ -223,7 +373,9 @@ class MetaHelper(object):
         """
         重新设置缓存标题
         """
-        cache_media_info = self._meta_data.get(key)
-        if not cache_media_info:
-            return
-        self._meta_data[key]['title'] = cn_title
+        with lock:
+            cache_media_info = self.__get_meta_item(key)
+            if not cache_media_info:
+                return
+            cache_media_info['title'] = cn_title
+            self._dirty_keys.add(key)
@@ -0,0 +1,254 @@
+import os
+import pickle
+import sqlite3
+from abc import ABCMeta, abstractmethod
+from threading import RLock
+
+import log
+from app.utils import ExceptionUtils
+
+CACHE_EXPIRE_TIMESTAMP_STR = "cache_expire_timestamp"
+
+
+class _IMetaStore(metaclass=ABCMeta):
+    """
+    TMDB识别缓存的持久化存储
+    """
+
+    @abstractmethod
+    def get_path(self):
+        """
+        返回存储文件路径
+        """
+        pass
+
+    @abstractmethod
+    def get(self, key):
+        """
+        按KEY读取一条缓存，不存在时返回None
+        """
+        pass
+
+    @abstractmethod
+    def save(self, upserts, deletes):
+        """
+        增量写入缓存
+        :param upserts: 新增或更新的缓存 {key: item}
+        :param deletes: 需要删除的KEY列表
+        """
+        pass
+
+    @abstractmethod
+    def keys(self):
+        """
+        返回所有已识别缓存的KEY
+        """
+        pass
+
+    @abstractmethod
+    def delete_by_tmdbid(self, tmdbid):
+        """
+        删除对应TMDBID的所有缓存
+        :return: 被删除的KEY列表
+        """
+        pass
+
+    @abstractmethod
+    def delete_expired(self, timestamp):
+        """
+        删除过期时间早于timestamp的缓存
+        :return: 被删除的KEY列表
+        """
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """
+        清空缓存
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        """
+        释放存储占用的资源
+        """
+        pass
+
+
+class MetaPickleStore(_IMetaStore):
+    """
+    整文件pickle存储，每次保存时全量重写
+    """
+    _path = None
+    _data = {}
+
+    def __init__(self, path):
+        self._path = path
+        self._data = self.load_file(path)
+
+    @staticmethod
+    def load_file(path):
+        """
+        从pickle文件中加载全部缓存
+        """
+        try:
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return pickle.load(f) or {}
+            return {}
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return {}
+
+    def __dump(self):
+        with open(self._path, 'wb') as f:
+            pickle.dump(self._data, f, pickle.HIGHEST_PROTOCOL)
+
+    def get_path(self):
+        return self._path
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def save(self, upserts, deletes):
+        if not upserts and not deletes:
+            return
+        for key in deletes or []:
+            self._data.pop(key, None)
+        self._data.update(upserts or {})
+        self.__dump()
+
+    def keys(self):
+        return [k for k, v in self._data.items() if str(v.get("id")) != '0']
+
+    def delete_by_tmdbid(self, tmdbid):
+        keys = [k for k, v in self._data.items() if str(v.get("id")) == str(tmdbid)]
+        if keys:
+            self.save({}, keys)
+        return keys
+
+    def delete_expired(self, timestamp):
+        keys = [k for k, v in self._data.items()
+                if v.get(CACHE_EXPIRE_TIMESTAMP_STR) and v.get(CACHE_EXPIRE_TIMESTAMP_STR) <= timestamp]
+        if keys:
+            self.save({}, keys)
+        return keys
+
+    def clear(self):
+        self._data = {}
+        self.__dump()
+
+    def close(self):
+        self._data = {}
+
+
+class MetaSqliteStore(_IMetaStore):
+    """
+    SQLite存储，按KEY索引，只写入变化的条目，按需读取
+    """
+    _path = None
+    _conn = None
+    _lock = None
+
+    def __init__(self, path, legacy_path=None):
+        self._path = path
+        self._lock = RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS TMDB_CACHE ("
+                               "KEY TEXT PRIMARY KEY, "
+                               "TMDBID TEXT, "
+                               "EXPIRE INTEGER, "
+                               "DATA BLOB)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS INDX_TMDB_CACHE_TMDBID ON TMDB_CACHE (TMDBID)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS INDX_TMDB_CACHE_EXPIRE ON TMDB_CACHE (EXPIRE)")
+            self._conn.commit()
+        if legacy_path:
+            self.__migrate(legacy_path)
+
+    def __migrate(self, legacy_path):
+        """
+        从旧版pickle文件迁移缓存，迁移完成后将旧文件重命名为.bak
+        """
+        if not os.path.exists(legacy_path):
+            return
+        data = MetaPickleStore.load_file(legacy_path)
+        if data:
+            log.info("【Meta】正在迁移TMDB缓存：%s 条 ..." % len(data))
+            self.save({k: v for k, v in data.items() if str(v.get("id")) != '0'}, [])
+        try:
+            os.replace(legacy_path, "%s.bak" % legacy_path)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+
+    @staticmethod
+    def __row(key, item):
+        return key, str(item.get("id")), item.get(CACHE_EXPIRE_TIMESTAMP_STR), \
+            pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+
+    def get_path(self):
+        return self._path
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT DATA FROM TMDB_CACHE WHERE KEY = ?", (key,)).fetchone()
+        if not row:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return None
+
+    def save(self, upserts, deletes):
+        if not upserts and not deletes:
+            return
+        with self._lock:
+            try:
+                if deletes:
+                    self._conn.executemany("DELETE FROM TMDB_CACHE WHERE KEY = ?",
+                                           [(key,) for key in deletes])
+                if upserts:
+                    self._conn.executemany("INSERT OR REPLACE INTO TMDB_CACHE (KEY, TMDBID, EXPIRE, DATA) "
+                                           "VALUES (?, ?, ?, ?)",
+                                           [self.__row(k, v) for k, v in upserts.items()])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def keys(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT KEY FROM TMDB_CACHE WHERE TMDBID != '0' ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def delete_by_tmdbid(self, tmdbid):
+        with self._lock:
+            rows = self._conn.execute("SELECT KEY FROM TMDB_CACHE WHERE TMDBID = ?", (str(tmdbid),)).fetchall()
+            if rows:
+                self._conn.execute("DELETE FROM TMDB_CACHE WHERE TMDBID = ?", (str(tmdbid),))
+                self._conn.commit()
+        return [row[0] for row in rows]
+
+    def delete_expired(self, timestamp):
+        with self._lock:
+            rows = self._conn.execute("SELECT KEY FROM TMDB_CACHE WHERE EXPIRE <= ?", (timestamp,)).fetchall()
+            if rows:
+                self._conn.execute("DELETE FROM TMDB_CACHE WHERE EXPIRE <= ?", (timestamp,))
+                self._conn.commit()
+        return [row[0] for row in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM TMDB_CACHE")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
@@ -1,4 +1,5 @@
-import xml.dom.minidom
+import copy
+import hashlib
 
 from app.db import MainDb, DbPersist
 from app.db.models import RSSTORRENTS
@@ -8,19 +9,90 @@ from config import Config
 
 class RssHelper:
     _db = MainDb()
+    # 各RSS地址上次的响应状态 {url: {"etag", "last_modified", "digest", "result"}}
+    _feed_states = {}
+    # 各RSS上次已处理完成的条目 {feed_key: (处理条件指纹, 条目集合)}
+    _feed_marks = {}
 
     @staticmethod
-    def parse_rssxml(url, proxy=False):
+    def request_feed(url, proxy=False, timeout=None, feed_key=None):
         """
-        解析RSS订阅URL，获取RSS中的种子信息
+        请求RSS地址，带上次响应的ETag/Last-Modified发送条件请求
         :param url: RSS地址
         :param proxy: 是否使用代理
-        :return: 种子信息列表，如为None代表Rss过期
+        :param timeout: 请求超时时间（秒），为空时使用默认值
+        :param feed_key: 缓存解析结果的标识，解析方式不同时需区分，为空时使用RSS地址
+        :return: 响应, 内容未变化时返回上次的解析结果，否则为None
         """
-        _special_title_sites = {
-            'pt.keepfrds.com': RssTitleUtils.keepfriends_title
+        state = RssHelper._feed_states.get(feed_key or url) or {}
+        headers = {"User-Agent": Config().get_ua()}
+        if state.get("etag"):
+            headers["If-None-Match"] = state.get("etag")
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state.get("last_modified")
+        ret = RequestUtils(headers=headers,
+                           proxies=Config().get_proxies() if proxy else None,
+                           timeout=timeout).get_res(url)
+        if not ret:
+            return ret, None
+        if ret.status_code == 304 and "result" in state:
+            return ret, copy.deepcopy(state.get("result"))
+        if state.get("digest") and state.get("digest") == hashlib.md5(ret.content).hexdigest():
+            return ret, copy.deepcopy(state.get("result"))
+        return ret, None
+
+    @staticmethod
+    def save_feed(url, ret, result, feed_key=None):
+        """
+        记录RSS地址本次响应的ETag/Last-Modified及解析结果，用于下次的条件请求
+        """
+        if not url or not ret or ret.status_code == 304 or not result:
+            return
+        RssHelper._feed_states[feed_key or url] = {
+            "etag": ret.headers.get("ETag"),
+            "last_modified": ret.headers.get("Last-Modified"),
+            "digest": hashlib.md5(ret.content).hexdigest(),
+            "result": copy.deepcopy(result)
         }
 
+    @staticmethod
+    def get_seen_articles(feed_key, fingerprint):
+        """
+        获取RSS上次已处理完成的条目，处理条件（订阅、规则等）变化后返回空集合
+        :param feed_key: RSS标识
+        :param fingerprint: 处理条件指纹
+        """
+        mark = RssHelper._feed_marks.get(feed_key)
+        if not mark or mark[0] != fingerprint:
+            return set()
+        return set(mark[1])
+
+    @staticmethod
+    def set_seen_articles(feed_key, fingerprint, articles):
+        """
+        记录RSS本次已处理完成的条目，只保留当前RSS中的条目
+        :param feed_key: RSS标识
+        :param fingerprint: 处理条件指纹
+        :param articles: 已处理完成的条目集合
+        """
+        RssHelper._feed_marks[feed_key] = (fingerprint, frozenset(articles))
+
+    @staticmethod
+    def clear_seen_articles():
+        """
+        清除所有RSS已处理条目的记录
+        """
+        RssHelper._feed_marks = {}
+
+    @staticmethod
+    def parse_rssxml(url, proxy=False, timeout=None):
+        """
+        解析RSS订阅URL，获取RSS中的种子信息
+        :param url: RSS地址
+        :param proxy: 是否使用代理
+        :param timeout: 请求超时时间（秒），为空时使用默认值
+        :return: 种子信息列表，如为None代表Rss过期
+        """
         _rss_expired_msg = [
             "RSS 链接已过期, 您需要获得一个新的!",
             "RSS Link has expired, You need to get a new one!"
@@ -32,9 +104,12 @@ class RssHelper:
             return []
         site_domain = StringUtils.get_url_domain(url)
         try:
-            ret = RequestUtils(proxies=Config().get_proxies() if proxy else None).get_res(url)
+            ret, last_result = RssHelper.request_feed(url=url, proxy=proxy, timeout=timeout)
             if not ret:
                 return []
+            # 内容未变化，直接使用上次的解析结果
+            if last_result is not None:
+                return last_result
             ret.encoding = ret.apparent_encoding
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
@@ -42,53 +117,9 @@ class RssHelper:
         if ret:
             ret_xml = ret.text
             try:
-                # 解析XML
-                dom_tree = xml.dom.minidom.parseString(ret_xml)
-                rootNode = dom_tree.documentElement
-                items = rootNode.getElementsByTagName("item")
-                for item in items:
-                    try:
-                        # 标题
-                        title = DomUtils.tag_value(item, "title", default="")
-                        if not title:
-                            continue
-                        # 标题特殊处理
-                        if site_domain and site_domain in _special_title_sites:
-                            title = _special_title_sites.get(site_domain)(title)
-                        # 描述
-                        description = DomUtils.tag_value(item, "description", default="")
-                        # 种子页面
-                        link = DomUtils.tag_value(item, "link", default="")
-                        # 种子链接
-                        enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
-                        if not enclosure and not link:
-                            continue
-                        # 部分RSS只有link没有enclosure
-                        if not enclosure and link:
-                            enclosure = link
-                            link = None
-                        # 大小
-                        size = DomUtils.tag_value(item, "enclosure", "length", default=0)
-                        if size and str(size).isdigit():
-                            size = int(size)
-                        else:
-                            size = 0
-                        # 发布日期
-                        pubdate = DomUtils.tag_value(item, "pubDate", default="")
-                        if pubdate:
-                            # 转换为时间
-                            pubdate = StringUtils.get_time_stamp(pubdate)
-                        # 返回对象
-                        tmp_dict = {'title': title,
-                                    'enclosure': enclosure,
-                                    'size': size,
-                                    'description': description,
-                                    'link': link,
-                                    'pubdate': pubdate}
-                        ret_array.append(tmp_dict)
-                    except Exception as e1:
-                        ExceptionUtils.exception_traceback(e1)
-                        continue
+                for item in RssHelper.parse_rssitems(ret_xml, site_domain):
+                    ret_array.append(item)
+                RssHelper.save_feed(url, ret, ret_array)
             except Exception as e2:
                 # RSS过期 观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
                 if ret_xml in _rss_expired_msg:
@@ -96,6 +127,60 @@ class RssHelper:
                 ExceptionUtils.exception_traceback(e2)
         return ret_array
 
+    @staticmethod
+    def parse_rssitems(ret_xml, site_domain=None):
+        """
+        从RSS xml中流式解析种子信息，逐条返回，不构建完整的DOM树，XML格式错误时抛出异常
+        :param ret_xml: xml文本
+        :param site_domain: 站点域名，用于标题特殊处理
+        :return: 种子信息生成器
+        """
+        _special_title_sites = {
+            'pt.keepfrds.com': RssTitleUtils.keepfriends_title
+        }
+        for item in DomUtils.iter_elements(ret_xml, "item"):
+            try:
+                # 标题
+                title = DomUtils.element_value(item, "title", default="")
+                if not title:
+                    continue
+                # 标题特殊处理
+                if site_domain and site_domain in _special_title_sites:
+                    title = _special_title_sites.get(site_domain)(title)
+                # 描述
+                description = DomUtils.element_value(item, "description", default="")
+                # 种子页面
+                link = DomUtils.element_value(item, "link", default="")
+                # 种子链接
+                enclosure = DomUtils.element_value(item, "enclosure", "url", default="")
+                if not enclosure and not link:
+                    continue
+                # 部分RSS只有link没有enclosure
+                if not enclosure and link:
+                    enclosure = link
+                    link = None
+                # 大小
+                size = DomUtils.element_value(item, "enclosure", "length", default=0)
+                if size and str(size).isdigit():
+                    size = int(size)
+                else:
+                    size = 0
+                # 发布日期
+                pubdate = DomUtils.element_value(item, "pubDate", default="")
+                if pubdate:
+                    # 转换为时间
+                    pubdate = StringUtils.get_time_stamp(pubdate)
+                # 返回对象
+                yield {'title': title,
+                       'enclosure': enclosure,
+                       'size': size,
+                       'description': description,
+                       'link': link,
+                       'pubdate': pubdate}
+            except Exception as e1:
+                ExceptionUtils.exception_traceback(e1)
+                continue
+
     @DbPersist(_db)
     def insert_rss_torrents(self, media_info):
         """
@@ -156,6 +241,7 @@ class RssHelper:
                                                RSSTORRENTS.ENCLOSURE == enclosure).delete()
         else:
             self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == title).delete()
+        self.clear_seen_articles()
 
     @DbPersist(_db)
     def truncate_rss_history(self):
@@ -163,3 +249,4 @@ class RssHelper:
         清空RSS历史记录
         """
         self._db.query(RSSTORRENTS).delete()
+        self.clear_seen_articles()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock, RLock
+
+import log
+from app.utils import ExceptionUtils, RequestUtils
+from app.utils.commons import singleton
+from config import Config, SCRAPER_IMAGE_CACHE_SIZE
+
+lock = RLock()
+
+
+@singleton
+class ScraperCacheHelper(object):
+    """
+    刮削缓存：
+    1、图片按内容的sha256存储在本地缓存目录中，同一地址只下载一次，多个文件及多次刮削共用，超出容量时清理最久未使用的图片
+    2、记录每个媒体文件刮削时的文件签名及生成的NFO、图片文件状态，均未变化时再次刮削可以跳过
+    """
+    _conn = None
+    _cache_path = None
+    # 缓存图片的总大小，启动时统计一次，之后随下载和清理增减，超出容量时才查询清理
+    _total_size = 0
+    _url_locks = {}
+    _url_locks_lock = Lock()
+
+    def __init__(self):
+        self.init_config()
+
+    def init_config(self):
+        with lock:
+            if self._conn:
+                self._conn.close()
+            self._cache_path = os.path.join(Config().get_temp_path(), "scraper_cache")
+            if not os.path.exists(self._cache_path):
+                os.makedirs(self._cache_path)
+            self._conn = sqlite3.connect(os.path.join(Config().get_config_path(), 'scraper_cache.db'),
+                                         timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS SCRAPER_IMAGES ("
+                               "URL TEXT PRIMARY KEY, "
+                               "HASH TEXT, "
+                               "SIZE INTEGER, "
+                               "ACCESSED REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS INDX_SCRAPER_IMAGES_HASH ON SCRAPER_IMAGES (HASH)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS SCRAPER_MANIFESTS ("
+                               "PATH TEXT PRIMARY KEY, "
+                               "SIGNATURE TEXT, "
+                               "OUTPUTS TEXT)")
+            self._conn.commit()
+            self._total_size = self.__get_total_size()
+
+    def __get_total_size(self):
+        """
+        统计缓存图片的总大小，同一内容被多个地址引用时只计算一次，需在锁内调用
+        """
+        row = self._conn.execute("SELECT SUM(SIZE) FROM (SELECT MAX(SIZE) AS SIZE FROM SCRAPER_IMAGES "
+                                 "GROUP BY HASH)").fetchone()
+        return (row[0] or 0) if row else 0
+
+    def __get_blob_path(self, file_hash):
+        return os.path.join(self._cache_path, file_hash[:2], file_hash)
+
+    def __get_url_lock(self, url):
+        with self._url_locks_lock:
+            url_lock = self._url_locks.get(url)
+            if not url_lock:
+                url_lock = [Lock(), 0]
+                self._url_locks[url] = url_lock
+            url_lock[1] += 1
+        return url_lock
+
+    def __release_url_lock(self, url):
+        with self._url_locks_lock:
+            url_lock = self._url_locks.get(url)
+            url_lock[1] -= 1
+            if url_lock[1] <= 0:
+                self._url_locks.pop(url, None)
+
+    def __get_cached(self, url):
+        """
+        查询已缓存的图片，缓存文件不存在时删除记录
+        """
+        with lock:
+            row = self._conn.execute("SELECT HASH FROM SCRAPER_IMAGES WHERE URL = ?", (url,)).fetchone()
+            if not row:
+                return None
+            blob_path = self.__get_blob_path(row[0])
+            if os.path.exists(blob_path):
+                self._conn.execute("UPDATE SCRAPER_IMAGES SET ACCESSED = ? WHERE URL = ?", (time.time(), url))
+                self._conn.commit()
+                return blob_path
+            self._conn.execute("DELETE FROM SCRAPER_IMAGES WHERE URL = ?", (url,))
+            self._conn.commit()
+            return None
+
+    def __download(self, url):
+        """
+        边下载边计算sha256写入临时文件，完成后按内容哈希存入缓存目录
+        :return: 缓存文件路径，下载失败时返回None，网络异常时抛出RequestException
+        """
+        res = RequestUtils().get_res(url=url, raise_exception=True, stream=True)
+        if res is None:
+            return None
+        sha256 = hashlib.sha256()
+        size = 0
+        temp_file = os.path.join(self._cache_path, "%s.%s.tmp" % (hashlib.md5(url.encode()).hexdigest(),
+                                                                   os.getpid()))
+        # 流式响应无论成功与否都要关闭，否则连接不会归还连接池
+        with res:
+            if res.status_code != 200:
+                return None
+            try:
+                with open(temp_file, "wb") as f:
+                    for chunk in res.iter_content(chunk_size=64 * 1024):
+                        if not chunk:
+                            continue
+                        sha256.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+                if not size:
+                    return None
+                file_hash = sha256.hexdigest()
+                blob_path = self.__get_blob_path(file_hash)
+                if not os.path.exists(os.path.dirname(blob_path)):
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(temp_file, blob_path)
+            finally:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+        with lock:
+            # 已有其它地址引用相同内容时不重复计算大小
+            if not self._conn.execute("SELECT 1 FROM SCRAPER_IMAGES WHERE HASH = ? LIMIT 1",
+                                      (file_hash,)).fetchone():
+                self._total_size += size
+            self._conn.execute("INSERT OR REPLACE INTO SCRAPER_IMAGES (URL, HASH, SIZE, ACCESSED) VALUES (?, ?, ?, ?)",
+                               (url, file_hash, size, time.time()))
+            self._conn.commit()
+            if self._total_size > SCRAPER_IMAGE_CACHE_SIZE:
+                self.__evict()
+        return blob_path
+
+    def get_image(self, url):
+        """
+        获取图片的本地缓存文件，未缓存时下载，同一地址同时只下载一次
+        :return: 缓存文件路径，下载失败时返回None，网络异常时抛出RequestException
+        """
+        if not url:
+            return None
+        blob_path = self.__get_cached(url)
+        if blob_path:
+            return blob_path
+        url_lock = self.__get_url_lock(url)
+        try:
+            with url_lock[0]:
+                # 等待期间可能已被其它线程下载
+                return self.__get_cached(url) or self.__download(url)
+        finally:
+            self.__release_url_lock(url)
+
+    def __evict(self):
+        """
+        缓存超出容量时按最近访问时间清理图片，同一内容被多个地址引用时一并删除记录，
+        清理到容量的九成，避免每次下载后都要清理，需在锁内调用
+        """
+        try:
+            # 以实际记录重新统计，修正计数的偏差
+            self._total_size = self.__get_total_size()
+            target_size = SCRAPER_IMAGE_CACHE_SIZE * 0.9
+            if self._total_size <= target_size:
+                return
+            rows = self._conn.execute("SELECT HASH, MAX(SIZE), MAX(ACCESSED) FROM SCRAPER_IMAGES "
+                                      "GROUP BY HASH ORDER BY MAX(ACCESSED)").fetchall()
+            for file_hash, size, _ in rows:
+                if self._total_size <= target_size:
+                    break
+                blob_path = self.__get_blob_path(file_hash)
+                if os.path.exists(blob_path):
+                    os.remove(blob_path)
+                self._conn.execute("DELETE FROM SCRAPER_IMAGES WHERE HASH = ?", (file_hash,))
+                self._total_size -= size or 0
+            self._conn.commit()
+            log.info("【Scraper】图片缓存已清理，当前大小：%s" % self._total_size)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self._conn.rollback()
+
+    @staticmethod
+    def __get_file_stats(files):
+        """
+        获取文件的大小及修改时间，有文件不存在时返回None
+        """
+        stats = {}
+        for file in files:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                return None
+            stats[file] = [stat.st_size, stat.st_mtime_ns]
+        return stats
+
+    def is_manifest_unchanged(self, file_path, signature):
+        """
+        判断媒体文件签名及上次刮削生成的文件是否均未变化
+        """
+        with lock:
+            row = self._conn.execute("SELECT SIGNATURE, OUTPUTS FROM SCRAPER_MANIFESTS WHERE PATH = ?",
+                                     (file_path,)).fetchone()
+        if not row or row[0] != signature:
+            return False
+        try:
+            outputs = json.loads(row[1])
+        except ValueError:
+            return False
+        return self.__get_file_stats(outputs.keys()) == outputs
+
+    def save_manifest(self, file_path, signature, outputs):
+        """
+        记录媒体文件的刮削结果，有文件未生成时删除记录，下次刮削时重新处理
+        :param file_path: 媒体文件路径
+        :param signature: 媒体文件及刮削配置的签名
+        :param outputs: 刮削生成或已存在的NFO、图片文件路径
+        """
+        stats = self.__get_file_stats(outputs)
+        try:
+            with lock:
+                if stats is None:
+                    self._conn.execute("DELETE FROM SCRAPER_MANIFESTS WHERE PATH = ?", (file_path,))
+                else:
+                    self._conn.execute("INSERT OR REPLACE INTO SCRAPER_MANIFESTS (PATH, SIGNATURE, OUTPUTS) "
+                                       "VALUES (?, ?, ?)", (file_path, signature, json.dumps(stats)))
+                self._conn.commit()
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            self._conn.rollback()
@@ -0,0 +1,135 @@
+import copy
+import os
+import pickle
+import time
+from collections import OrderedDict
+from threading import RLock
+
+from app.utils import ExceptionUtils
+from app.utils.commons import singleton
+from config import Config, TMDB_DETAIL_CACHE_MAXSIZE, TMDB_DETAIL_CACHE_EXPIRE
+
+lock = RLock()
+
+
+@singleton
+class TmdbCacheHelper(object):
+    """
+    TMDB详情缓存，缓存电影、电视剧、季的完整详情数据，避免命中识别缓存后仍需访问TMDB
+    {
+        (类型, TMDBID, 语种, 附加信息): (过期时间, 详情)
+    }
+    """
+    _cache_data = OrderedDict()
+    _cache_path = None
+    _dirty = False
+
+    def __init__(self):
+        self.init_config()
+
+    def init_config(self):
+        self._cache_path = os.path.join(Config().get_config_path(), 'tmdb_detail.dat')
+        with lock:
+            self._cache_data = self.__load_cache_data(self._cache_path)
+            self._dirty = False
+
+    @staticmethod
+    def make_key(dtype, tmdbid, language=None, append=None):
+        """
+        生成缓存的key
+        :param dtype: 详情类型：movie/tv/season_n
+        :param tmdbid: TMDB ID
+        :param language: 语种
+        :param append: 附加信息
+        """
+        return str(dtype), str(tmdbid), str(language), str(append)
+
+    def get_cache_path(self):
+        """
+        返回缓存文件路径
+        """
+        return self._cache_path
+
+    def get_cache(self, key):
+        """
+        获取缓存的详情，返回副本，调用方可随意修改
+        """
+        if not key:
+            return None
+        with lock:
+            item = self._cache_data.get(key)
+            if not item:
+                return None
+            expire, data = item
+            if int(time.time()) >= expire:
+                self._cache_data.pop(key, None)
+                self._dirty = True
+                return None
+            self._cache_data.move_to_end(key)
+        return copy.deepcopy(data)
+
+    def set_cache(self, key, data):
+        """
+        新增或更新缓存的详情
+        """
+        if not key or not data:
+            return
+        data = copy.deepcopy(data)
+        with lock:
+            self._cache_data[key] = (int(time.time()) + TMDB_DETAIL_CACHE_EXPIRE, data)
+            self._cache_data.move_to_end(key)
+            while len(self._cache_data) > TMDB_DETAIL_CACHE_MAXSIZE:
+                self._cache_data.popitem(last=False)
+            self._dirty = True
+
+    def delete_cache_by_tmdbid(self, tmdbid):
+        """
+        清除对应TMDBID的所有详情缓存
+        """
+        with lock:
+            for key in [k for k in self._cache_data if k[1] == str(tmdbid)]:
+                self._cache_data.pop(key, None)
+                self._dirty = True
+
+    def clear_cache(self):
+        """
+        清空所有详情缓存
+        """
+        with lock:
+            self._cache_data = OrderedDict()
+            self._dirty = True
+
+    @staticmethod
+    def __load_cache_data(path):
+        """
+        从文件中加载缓存，丢弃已过期的条目
+        """
+        try:
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                now = int(time.time())
+                return OrderedDict((k, v) for k, v in data.items() if v[0] > now)
+            return OrderedDict()
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return OrderedDict()
+
+    def save_cache_data(self, force=False):
+        """
+        保存缓存数据到文件
+        """
+        with lock:
+            if not force and not self._dirty:
+                return
+            cache_data = OrderedDict(self._cache_data)
+            self._dirty = False
+        try:
+            tmp_path = "%s.tmp" % self._cache_path
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cache_data, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._cache_path)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            with lock:
+                self._dirty = True
@@ -0,0 +1,168 @@
+import heapq
+import itertools
+import os
+from threading import Condition, Lock
+
+import log
+from app.helper.progress_helper import ProgressHelper
+from app.utils.commons import singleton
+from app.utils.types import RmtMode, ProgressKey
+from config import RMT_DEVICE_TRANSFER_THREADS
+
+# 转移方式的优先级，数值越小越优先
+TRANSFER_PRIORITIES = {
+    RmtMode.LINK: 0,
+    RmtMode.SOFTLINK: 0,
+    RmtMode.MOVE: 1,
+    RmtMode.COPY: 2,
+    RmtMode.RCLONE: 3,
+    RmtMode.RCLONECOPY: 3,
+    RmtMode.MINIO: 3,
+    RmtMode.MINIOCOPY: 3
+}
+# 只操作元数据的转移方式，不占用设备的转移并发
+METADATA_PRIORITY = 0
+
+
+class _DevicePool(object):
+    """
+    单个目的设备的转移队列，同时最多执行threads个转移，等待中的转移按优先级、先后顺序执行
+    """
+
+    def __init__(self, threads):
+        self._threads = max(int(threads or 1), 1)
+        self._running = 0
+        self._waiting = []
+        self._cond = Condition()
+
+    def busy(self):
+        """
+        是否需要排队
+        """
+        with self._cond:
+            return self._running >= self._threads or bool(self._waiting)
+
+    def waiting(self):
+        """
+        排队中的转移数
+        """
+        with self._cond:
+            return len(self._waiting)
+
+    def acquire(self, priority, seq):
+        with self._cond:
+            entry = (priority, seq)
+            heapq.heappush(self._waiting, entry)
+            while self._running >= self._threads or self._waiting[0] != entry:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._running += 1
+            # 还有空闲时让下一个转移继续
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+
+@singleton
+class TransferHelper(object):
+    """
+    文件转移调度：
+    按目的设备分别排队，不同设备之间的转移并行执行，同一设备上的复制、移动等批量转移按优先级排队；
+    硬链接、软链接及同设备内的移动只操作元数据，不排队；同一目的文件的转移始终串行
+    """
+    _device_pools = {}
+    _target_locks = {}
+    _lock = Lock()
+    _seq = itertools.count()
+    progress = None
+
+    def __init__(self):
+        self.progress = ProgressHelper()
+
+    @staticmethod
+    def __get_device(path):
+        """
+        获取路径所在的设备，路径不存在时取最近的已存在上级目录
+        """
+        path = os.path.abspath(path)
+        while path and not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            return path
+
+    def __get_priority(self, file_item, target_file, rmt_mode):
+        """
+        计算转移优先级及目的设备
+        """
+        priority = TRANSFER_PRIORITIES.get(rmt_mode, TRANSFER_PRIORITIES.get(RmtMode.COPY))
+        if priority == METADATA_PRIORITY:
+            return priority, None
+        if rmt_mode in [RmtMode.RCLONE, RmtMode.RCLONECOPY, RmtMode.MINIO, RmtMode.MINIOCOPY]:
+            # 远程存储按转移方式排队
+            return priority, rmt_mode.value
+        device = self.__get_device(target_file)
+        if rmt_mode == RmtMode.MOVE and device == self.__get_device(file_item):
+            # 同设备内移动只是重命名
+            return METADATA_PRIORITY, device
+        return priority, device
+
+    def __get_device_pool(self, device):
+        with self._lock:
+            pool = self._device_pools.get(device)
+            if not pool:
+                pool = _DevicePool(RMT_DEVICE_TRANSFER_THREADS)
+                self._device_pools[device] = pool
+            return pool
+
+    def __acquire_target(self, target_file):
+        with self._lock:
+            target_lock = self._target_locks.get(target_file)
+            if not target_lock:
+                target_lock = [Lock(), 0]
+                self._target_locks[target_file] = target_lock
+            target_lock[1] += 1
+        target_lock[0].acquire()
+
+    def __release_target(self, target_file):
+        with self._lock:
+            target_lock = self._target_locks.get(target_file)
+            target_lock[0].release()
+            target_lock[1] -= 1
+            if target_lock[1] <= 0:
+                self._target_locks.pop(target_file, None)
+
+    def execute(self, file_item, target_file, rmt_mode, command):
+        """
+        调度执行单个文件的转移
+        :param file_item: 源文件路径
+        :param target_file: 目标文件路径
+        :param rmt_mode: RmtMode转移方式
+        :param command: 执行转移的函数，返回转移结果
+        :return: command的返回值
+        """
+        target_key = os.path.normpath(target_file)
+        self.__acquire_target(target_key)
+        try:
+            priority, device = self.__get_priority(file_item, target_file, rmt_mode)
+            if priority == METADATA_PRIORITY:
+                return command()
+            pool = self.__get_device_pool(device)
+            if pool.busy():
+                log.info("【Rmt】%s 等待转移，目的设备上排队中的任务：%s" % (file_item, pool.waiting() + 1))
+                self.progress.update(ptype=ProgressKey.FileTransfer,
+                                     text="%s 排队等待转移..." % os.path.basename(file_item))
+            pool.acquire(priority, next(self._seq))
+            try:
+                return command()
+            finally:
+                pool.release()
+        finally:
+            self.__release_target(target_key)
@@ -11,6 +11,8 @@ class WordsHelper:
     dbhelper = None
     # 识别词
     words_info = []
+    # 识别词版本，每次重新加载识别词时递增，用于识别结果缓存失效
+    words_version = 0
 
     def __init__(self):
         self.init_config()
@@ -18,6 +20,7 @@ class WordsHelper:
     def init_config(self):
         self.dbhelper = DbHelper()
         self.words_info = self.dbhelper.get_custom_words(enabled=1)
+        self.words_version += 1
 
     def process(self, title):
         # 错误信息
@@ -1,5 +1,5 @@
 import datetime
-import xml.dom.minidom
+import itertools
 from abc import ABCMeta, abstractmethod
 
 import log
@@ -9,6 +9,10 @@ from app.media import Media
 from app.media.meta import MetaInfo
 from app.utils import DomUtils, RequestUtils, StringUtils, ExceptionUtils
 from app.utils.types import MediaType, SearchType, ProgressKey
+from config import INDEXER_SEARCH_TIMEOUT, INDEXER_FILTER_BATCH_SIZE
+
+# torznab扩展属性标签
+TORZNAB_ATTR_TAG = "{http://torznab.com/schemas/2015/feed}attr"
 
 
 class _IIndexClient(metaclass=ABCMeta):
@@ -81,14 +85,16 @@ class _IIndexClient(metaclass=ABCMeta):
                                                         replace_word=" ",
                                                         allow_space=True)
         api_url = f"{indexer.domain}?apikey={self.api_key}&t=search&q={search_word}"
-        result_array = self.__parse_torznabxml(api_url)
-        if len(result_array) == 0:
+        # 边解析边过滤
+        result_array = self.parse_torznabxml(self.__get_torznabxml(api_url))
+        first_result = next(result_array, None)
+        if not first_result:
             log.warn(f"【{self.index_type}】{indexer.name} 未检索到数据")
             self.progress.update(ptype='search', text=f"{indexer.name} 未检索到数据")
             return []
         else:
-            log.warn(f"【{self.index_type}】{indexer.name} 返回数据：{len(result_array)}")
-            return self.filter_search_results(result_array=result_array,
+            log.warn(f"【{self.index_type}】{indexer.name} 返回数据，开始过滤 ...")
+            return self.filter_search_results(result_array=itertools.chain([first_result], result_array),
                                               order_seq=order_seq,
                                               indexer=indexer,
                                               filter_args=filter_args,
@@ -96,54 +102,56 @@ class _IIndexClient(metaclass=ABCMeta):
                                               start_time=start_time)
 
     @staticmethod
-    def __parse_torznabxml(url):
+    def __get_torznabxml(url):
         """
-        从torznab xml中解析种子信息
+        获取torznab xml
         :param url: URL地址
-        :return: 解析出来的种子信息列表
+        :return: xml文本
         """
         if not url:
-            return []
+            return ""
         try:
             ret = RequestUtils(timeout=10).get_res(url)
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
-            return []
+            return ""
         if not ret:
-            return []
-        xmls = ret.text
-        if not xmls:
-            return []
+            return ""
+        return ret.text
 
-        torrents = []
+    @staticmethod
+    def parse_torznabxml(xmls):
+        """
+        从torznab xml中流式解析种子信息，逐条返回，不构建完整的DOM树
+        :param xmls: xml文本
+        :return: 解析出来的种子信息生成器
+        """
+        if not xmls:
+            return
         try:
-            # 解析XML
-            dom_tree = xml.dom.minidom.parseString(xmls)
-            root_node = dom_tree.documentElement
-            items = root_node.getElementsByTagName("item")
-            for item in items:
+            for item in DomUtils.iter_elements(xmls, "item"):
                 try:
                     # indexer id
-                    indexer_id = DomUtils.tag_value(item, "jackettindexer", "id",
-                                                    default=DomUtils.tag_value(item, "prowlarrindexer", "id", ""))
+                    indexer_id = DomUtils.element_value(item, "jackettindexer", "id",
+                                                        default=DomUtils.element_value(item, "prowlarrindexer", "id", ""))
                     # indexer
-                    indexer = DomUtils.tag_value(item, "jackettindexer",
-                                                 default=DomUtils.tag_value(item, "prowlarrindexer", default=""))
+                    indexer = DomUtils.element_value(item, "jackettindexer",
+                                                     default=DomUtils.element_value(item, "prowlarrindexer", default=""))
 
                     # 标题
-                    title = DomUtils.tag_value(item, "title", default="")
+                    title = DomUtils.element_value(item, "title", default="")
                     if not title:
                         continue
                     # 种子链接
-                    enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
+                    enclosure = DomUtils.element_value(item, "enclosure", "url", default="")
                     if not enclosure:
                         continue
                     # 描述
-                    description = DomUtils.tag_value(item, "description", default="")
+                    description = DomUtils.element_value(item, "description", default="")
                     # 种子大小
-                    size = DomUtils.tag_value(item, "size", default=0)
+                    size = DomUtils.element_value(item, "size", default=0)
                     # 种子页面
-                    page_url = DomUtils.tag_value(item, "comments", default="")
+                    page_url = DomUtils.element_value(item, "comments", default="")
 
                     # 做种数
                     seeders = 0
@@ -158,10 +166,9 @@ class _IIndexClient(metaclass=ABCMeta):
                     # imdbid
                     imdbid = ""
 
-                    torznab_attrs = item.getElementsByTagName("torznab:attr")
-                    for torznab_attr in torznab_attrs:
-                        name = torznab_attr.getAttribute('name')
-                        value = torznab_attr.getAttribute('value')
+                    for torznab_attr in item.iter(TORZNAB_ATTR_TAG):
+                        name = torznab_attr.get('name', '')
+                        value = torznab_attr.get('value', '')
                         if name == "seeders":
                             seeders = value
                         if name == "peers":
@@ -175,20 +182,19 @@ class _IIndexClient(metaclass=ABCMeta):
                         if name == "imdbid":
                             imdbid = value
 
-                    tmp_dict = {'indexer_id': indexer_id,
-                                'indexer': indexer,
-                                'title': title,
-                                'enclosure': enclosure,
-                                'description': description,
-                                'size': size,
-                                'seeders': seeders,
-                                'peers': peers,
-                                'freeleech': freeleech,
-                                'downloadvolumefactor': downloadvolumefactor,
-                                'uploadvolumefactor': uploadvolumefactor,
-                                'page_url': page_url,
-                                'imdbid': imdbid}
-                    torrents.append(tmp_dict)
+                    yield {'indexer_id': indexer_id,
+                           'indexer': indexer,
+                           'title': title,
+                           'enclosure': enclosure,
+                           'description': description,
+                           'size': size,
+                           'seeders': seeders,
+                           'peers': peers,
+                           'freeleech': freeleech,
+                           'downloadvolumefactor': downloadvolumefactor,
+                           'uploadvolumefactor': uploadvolumefactor,
+                           'page_url': page_url,
+                           'imdbid': imdbid}
                 except Exception as e:
                     ExceptionUtils.exception_traceback(e)
                     continue
@@ -196,9 +202,7 @@ class _IIndexClient(metaclass=ABCMeta):
             ExceptionUtils.exception_traceback(e2)
             pass
 
-        return torrents
-
-    def filter_search_results(self, result_array: list,
+    def filter_search_results(self, result_array,
                               order_seq,
                               indexer,
                               filter_args: dict,
@@ -206,179 +210,200 @@ class _IIndexClient(metaclass=ABCMeta):
                               start_time):
         """
         从搜索结果中匹配符合资源条件的记录
+        :param result_array: 搜索结果，可以是边解析边返回的生成器
         """
         ret_array = []
+        result_count = 0
         index_sucess = 0
         index_rule_fail = 0
         index_match_fail = 0
         index_error = 0
-        for item in result_array:
-            # 名称
-            torrent_name = item.get('title')
-            # 描述
-            description = item.get('description')
-            if not torrent_name:
-                index_error += 1
-                continue
-            enclosure = item.get('enclosure')
-            size = item.get('size')
-            seeders = item.get('seeders')
-            peers = item.get('peers')
-            page_url = item.get('page_url')
-            uploadvolumefactor = round(float(item.get('uploadvolumefactor')), 1) if item.get(
-                'uploadvolumefactor') is not None else 1.0
-            downloadvolumefactor = round(float(item.get('downloadvolumefactor')), 1) if item.get(
-                'downloadvolumefactor') is not None else 1.0
-            imdbid = item.get("imdbid")
-            labels = item.get("labels")
-            # 全匹配模式下，非公开站点，过滤掉做种数为0的
-            if filter_args.get("seeders") and not indexer.public and str(seeders) == "0":
-                log.info(f"【{self.client_name}】{torrent_name} 做种数为0")
-                index_rule_fail += 1
-                continue
-            # 识别种子名称
-            meta_info = MetaInfo(title=torrent_name, subtitle=f"{labels} {description}")
-            if not meta_info.get_name():
-                log.info(f"【{self.client_name}】{torrent_name} 无法识别到名称")
-                index_match_fail += 1
-                continue
-            # 大小及促销等
-            meta_info.set_torrent_info(size=size,
-                                       imdbid=imdbid,
-                                       upload_volume_factor=uploadvolumefactor,
-                                       download_volume_factor=downloadvolumefactor,
-                                       labels=labels)
+        # 按批边解析边过滤，不等待全部结果解析完成，每批先识别种子名称并过滤掉可以明确的类型，再批量检查过滤规则
+        result_array = iter(result_array)
+        timeout = False
+        while not timeout:
+            chunk = list(itertools.islice(result_array, INDEXER_FILTER_BATCH_SIZE))
+            if not chunk:
+                break
+            torrents = []
+            for item in chunk:
+                result_count += 1
+                # 名称
+                torrent_name = item.get('title')
+                # 描述
+                description = item.get('description')
+                if not torrent_name:
+                    index_error += 1
+                    continue
+                seeders = item.get('seeders')
+                uploadvolumefactor = round(float(item.get('uploadvolumefactor')), 1) if item.get(
+                    'uploadvolumefactor') is not None else 1.0
+                downloadvolumefactor = round(float(item.get('downloadvolumefactor')), 1) if item.get(
+                    'downloadvolumefactor') is not None else 1.0
+                labels = item.get("labels")
+                # 全匹配模式下，非公开站点，过滤掉做种数为0的
+                if filter_args.get("seeders") and not indexer.public and str(seeders) == "0":
+                    log.info(f"【{self.client_name}】{torrent_name} 做种数为0")
+                    index_rule_fail += 1
+                    continue
+                # 识别种子名称
+                meta_info = MetaInfo(title=torrent_name, subtitle=f"{labels} {description}")
+                if not meta_info.get_name():
+                    log.info(f"【{self.client_name}】{torrent_name} 无法识别到名称")
+                    index_match_fail += 1
+                    continue
+                # 大小及促销等
+                meta_info.set_torrent_info(size=item.get('size'),
+                                           imdbid=item.get("imdbid"),
+                                           upload_volume_factor=uploadvolumefactor,
+                                           download_volume_factor=downloadvolumefactor,
+                                           labels=labels)
 
-            # 先过滤掉可以明确的类型
-            if meta_info.type == MediaType.TV and filter_args.get("type") == MediaType.MOVIE:
-                log.info(
-                    f"【{self.client_name}】{torrent_name} 是 {meta_info.type.value}，"
-                    f"不匹配类型：{filter_args.get('type').value}")
-                index_rule_fail += 1
-                continue
+                # 先过滤掉可以明确的类型
+                if meta_info.type == MediaType.TV and filter_args.get("type") == MediaType.MOVIE:
+                    log.info(
+                        f"【{self.client_name}】{torrent_name} 是 {meta_info.type.value}，"
+                        f"不匹配类型：{filter_args.get('type').value}")
+                    index_rule_fail += 1
+                    continue
+                torrents.append((item, meta_info, uploadvolumefactor, downloadvolumefactor))
             # 检查订阅过滤规则匹配
-            match_flag, res_order, match_msg = self.filter.check_torrent_filter(
-                meta_info=meta_info,
-                filter_args=filter_args,
-                uploadvolumefactor=uploadvolumefactor,
-                downloadvolumefactor=downloadvolumefactor)
-            if not match_flag:
-                log.info(f"【{self.client_name}】{match_msg}")
-                index_rule_fail += 1
-                continue
-            # 识别媒体信息
-            if not match_media:
-                # 不过滤
-                media_info = meta_info
-            else:
-                # 0-识别并模糊匹配；1-识别并精确匹配
-                if meta_info.imdb_id \
-                        and match_media.imdb_id \
-                        and str(meta_info.imdb_id) == str(match_media.imdb_id):
-                    # IMDBID匹配，合并媒体数据
-                    media_info = self.media.merge_media_info(meta_info, match_media)
+            filter_results = self.filter.check_torrent_filter_batch(
+                torrents=[(meta_info, uploadvolumefactor, downloadvolumefactor)
+                          for _, meta_info, uploadvolumefactor, downloadvolumefactor in torrents],
+                filter_args=filter_args)
+            for (item, meta_info, uploadvolumefactor, downloadvolumefactor), \
+                    (match_flag, res_order, match_msg) in zip(torrents, filter_results):
+                # 超出搜索时限后调用方已不再等待，停止识别，避免长时间占用共用的搜索线程
+                if (datetime.datetime.now() - start_time).seconds > INDEXER_SEARCH_TIMEOUT:
+                    log.warn(f"【{self.client_name}】{indexer.name} 搜索超过 {INDEXER_SEARCH_TIMEOUT} 秒，"
+                             f"停止识别剩余数据")
+                    timeout = True
+                    break
+                torrent_name = item.get('title')
+                description = item.get('description')
+                enclosure = item.get('enclosure')
+                size = item.get('size')
+                seeders = item.get('seeders')
+                peers = item.get('peers')
+                page_url = item.get('page_url')
+                if not match_flag:
+                    log.info(f"【{self.client_name}】{match_msg}")
+                    index_rule_fail += 1
+                    continue
+                # 识别媒体信息
+                if not match_media:
+                    # 不过滤
+                    media_info = meta_info
                 else:
-                    # 查询缓存
-                    cache_info = self.media.get_cache_info(meta_info)
-                    if match_media \
-                            and str(cache_info.get("id")) == str(match_media.tmdb_id):
-                        # 缓存匹配，合并媒体数据
+                    # 0-识别并模糊匹配；1-识别并精确匹配
+                    if meta_info.imdb_id \
+                            and match_media.imdb_id \
+                            and str(meta_info.imdb_id) == str(match_media.imdb_id):
+                        # IMDBID匹配，合并媒体数据
                         media_info = self.media.merge_media_info(meta_info, match_media)
                     else:
-                        # 重新识别
-                        media_info = self.media.get_media_info(title=torrent_name, subtitle=description, chinese=False)
-                        if not media_info:
-                            log.warn(f"【{self.client_name}】{torrent_name} 识别媒体信息出错！")
-                            index_error += 1
-                            continue
-                        elif not media_info.tmdb_info:
+                        # 查询缓存
+                        cache_info = self.media.get_cache_info(meta_info)
+                        if match_media \
+                                and str(cache_info.get("id")) == str(match_media.tmdb_id):
+                            # 缓存匹配，合并媒体数据
+                            media_info = self.media.merge_media_info(meta_info, match_media)
+                        else:
+                            # 重新识别
+                            media_info = self.media.get_media_info(title=torrent_name, subtitle=description, chinese=False)
+                            if not media_info:
+                                log.warn(f"【{self.client_name}】{torrent_name} 识别媒体信息出错！")
+                                index_error += 1
+                                continue
+                            elif not media_info.tmdb_info:
+                                log.info(
+                                    f"【{self.client_name}】{torrent_name} 识别为 {media_info.get_name()} 未匹配到媒体信息")
+                                index_match_fail += 1
+                                continue
+                            # TMDBID是否匹配
+                            if str(media_info.tmdb_id) != str(match_media.tmdb_id):
+                                log.info(
+                                    f"【{self.client_name}】{torrent_name} 识别为 "
+                                    f"{media_info.type.value}/{media_info.get_title_string()}/{media_info.tmdb_id} "
+                                    f"与 {match_media.type.value}/{match_media.get_title_string()}/{match_media.tmdb_id} 不匹配")
+                                index_match_fail += 1
+                                continue
+                            # 合并媒体数据
+                            media_info = self.media.merge_media_info(media_info, match_media)
+                    # 过滤类型
+                    if filter_args.get("type"):
+                        if (filter_args.get("type") == MediaType.TV and media_info.type == MediaType.MOVIE) \
+                                or (filter_args.get("type") == MediaType.MOVIE and media_info.type == MediaType.TV):
                             log.info(
-                                f"【{self.client_name}】{torrent_name} 识别为 {media_info.get_name()} 未匹配到媒体信息")
-                            index_match_fail += 1
+                                f"【{self.client_name}】{torrent_name} 是 {media_info.type.value}/"
+                                f"{media_info.tmdb_id}，不是 {filter_args.get('type').value}")
+                            index_rule_fail += 1
+                            continue
+                    # 洗版
+                    if match_media.over_edition:
+                        # 季集不完整的资源不要
+                        if media_info.type != MediaType.MOVIE \
+                                and media_info.get_episode_list():
+                            log.info(f"【{self.client_name}】"
+                                     f"{media_info.get_title_string()}{media_info.get_season_string()} "
+                                     f"正在洗版，过滤掉季集不完整的资源：{torrent_name} {description}")
                             continue
-                        # TMDBID是否匹配
-                        if str(media_info.tmdb_id) != str(match_media.tmdb_id):
+                        # 检查优先级是否更好
+                        if match_media.res_order \
+                                and int(res_order) <= int(match_media.res_order):
                             log.info(
-                                f"【{self.client_name}】{torrent_name} 识别为 "
-                                f"{media_info.type.value}/{media_info.get_title_string()}/{media_info.tmdb_id} "
-                                f"与 {match_media.type.value}/{match_media.get_title_string()}/{match_media.tmdb_id} 不匹配")
-                            index_match_fail += 1
+                                f"【{self.client_name}】"
+                                f"{media_info.get_title_string()}{media_info.get_season_string()} "
+                                f"正在洗版，已洗版优先级：{100 - int(match_media.res_order)}，"
+                                f"当前资源优先级：{100 - int(res_order)}，"
+                                f"跳过低优先级或同优先级资源：{torrent_name}"
+                            )
                             continue
-                        # 合并媒体数据
-                        media_info = self.media.merge_media_info(media_info, match_media)
-                # 过滤类型
-                if filter_args.get("type"):
-                    if (filter_args.get("type") == MediaType.TV and media_info.type == MediaType.MOVIE) \
-                            or (filter_args.get("type") == MediaType.MOVIE and media_info.type == MediaType.TV):
-                        log.info(
-                            f"【{self.client_name}】{torrent_name} 是 {media_info.type.value}/"
-                            f"{media_info.tmdb_id}，不是 {filter_args.get('type').value}")
-                        index_rule_fail += 1
-                        continue
-                # 洗版
-                if match_media.over_edition:
-                    # 季集不完整的资源不要
-                    if media_info.type != MediaType.MOVIE \
-                            and media_info.get_episode_list():
-                        log.info(f"【{self.client_name}】"
-                                 f"{media_info.get_title_string()}{media_info.get_season_string()} "
-                                 f"正在洗版，过滤掉季集不完整的资源：{torrent_name} {description}")
-                        continue
-                    # 检查优先级是否更好
-                    if match_media.res_order \
-                            and int(res_order) <= int(match_media.res_order):
-                        log.info(
-                            f"【{self.client_name}】"
-                            f"{media_info.get_title_string()}{media_info.get_season_string()} "
-                            f"正在洗版，已洗版优先级：{100 - int(match_media.res_order)}，"
-                            f"当前资源优先级：{100 - int(res_order)}，"
-                            f"跳过低优先级或同优先级资源：{torrent_name}"
-                        )
-                        continue
-            # 检查标题是否匹配季、集、年
-            if not self.filter.is_torrent_match_sey(media_info,
-                                                    filter_args.get("season"),
-                                                    filter_args.get("episode"),
-                                                    filter_args.get("year")):
-                log.info(
-                    f"【{self.client_name}】{torrent_name} 识别为 {media_info.type.value}/"
-                    f"{media_info.get_title_string()}/{media_info.get_season_episode_string()} 不匹配季/集/年份")
-                index_match_fail += 1
-                continue
+                # 检查标题是否匹配季、集、年
+                if not self.filter.is_torrent_match_sey(media_info,
+                                                        filter_args.get("season"),
+                                                        filter_args.get("episode"),
+                                                        filter_args.get("year")):
+                    log.info(
+                        f"【{self.client_name}】{torrent_name} 识别为 {media_info.type.value}/"
+                        f"{media_info.get_title_string()}/{media_info.get_season_episode_string()} 不匹配季/集/年份")
+                    index_match_fail += 1
+                    continue
 
-            # 匹配到了
-            log.info(
-                f"【{self.client_name}】{torrent_name} {description} 识别为 {media_info.get_title_string()} "
-                f"{media_info.get_season_episode_string()} 匹配成功")
-            media_info.set_torrent_info(site=indexer.name,
-                                        site_order=order_seq,
-                                        enclosure=enclosure,
-                                        res_order=res_order,
-                                        filter_rule=filter_args.get("rule"),
-                                        size=size,
-                                        seeders=seeders,
-                                        peers=peers,
-                                        description=description,
-                                        page_url=page_url,
-                                        upload_volume_factor=uploadvolumefactor,
-                                        download_volume_factor=downloadvolumefactor)
-            if media_info not in ret_array:
-                index_sucess += 1
-                ret_array.append(media_info)
-            else:
-                index_rule_fail += 1
+                # 匹配到了
+                log.info(
+                    f"【{self.client_name}】{torrent_name} {description} 识别为 {media_info.get_title_string()} "
+                    f"{media_info.get_season_episode_string()} 匹配成功")
+                media_info.set_torrent_info(site=indexer.name,
+                                            site_order=order_seq,
+                                            enclosure=enclosure,
+                                            res_order=res_order,
+                                            filter_rule=filter_args.get("rule"),
+                                            size=size,
+                                            seeders=seeders,
+                                            peers=peers,
+                                            description=description,
+                                            page_url=page_url,
+                                            upload_volume_factor=uploadvolumefactor,
+                                            download_volume_factor=downloadvolumefactor)
+                if media_info not in ret_array:
+                    index_sucess += 1
+                    ret_array.append(media_info)
+                else:
+                    index_rule_fail += 1
         # 循环结束
         # 计算耗时
         end_time = datetime.datetime.now()
         log.info(
-            f"【{self.client_name}】{indexer.name} {len(result_array)} 条数据中，"
+            f"【{self.client_name}】{indexer.name} {result_count} 条数据中，"
             f"过滤 {index_rule_fail}，"
             f"不匹配 {index_match_fail}，"
             f"错误 {index_error}，"
             f"有效 {index_sucess}，"
             f"耗时 {(end_time - start_time).seconds} 秒")
         self.progress.update(ptype=ProgressKey.Search,
-                             text=f"{indexer.name} {len(result_array)} 条数据中，"
+                             text=f"{indexer.name} {result_count} 条数据中，"
                                   f"过滤 {index_rule_fail}，"
                                   f"不匹配 {index_match_fail}，"
                                   f"错误 {index_error}，"
@@ -1,12 +1,16 @@
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import log
 from app.helper import ProgressHelper, SubmoduleHelper, DbHelper
 from app.utils import ExceptionUtils, StringUtils
 from app.utils.commons import singleton
 from app.utils.types import SearchType, IndexerType, ProgressKey
-from config import Config
+from config import Config, INDEXER_SEARCH_THREADS, INDEXER_SEARCH_TIMEOUT
+
+# 所有搜索共用的线程池
+search_executor = ThreadPoolExecutor(max_workers=INDEXER_SEARCH_THREADS, thread_name_prefix="IndexerSearch")
 
 
 @singleton
@@ -119,13 +123,43 @@ class Indexer(object):
         :param in_from: 搜索渠道
         :return: 命中的资源媒体信息列表
         """
+        ret_array = []
+        for _, result in self.search_by_keyword_iter(key_word=key_word,
+                                                     filter_args=filter_args,
+                                                     match_media=match_media,
+                                                     in_from=in_from):
+            ret_array.extend(result)
+        return ret_array
+
+    def __search_indexer(self, state, order_seq, index, key_word, filter_args, match_media, in_from):
+        """
+        搜索单个索引站点，记录开始时间用于计算时限
+        """
+        state["start_time"] = time.time()
+        return self._client.search(order_seq,
+                                   index,
+                                   key_word,
+                                   filter_args,
+                                   match_media,
+                                   in_from)
+
+    def search_by_keyword_iter(self,
+                               key_word: [str, list],
+                               filter_args: dict,
+                               match_media=None,
+                               in_from: SearchType = None):
+        """
+        根据关键字调用 Index API 搜索，每个站点搜索完成即返回该站点命中的资源，超出时限的站点不再等待
+        参数同 search_by_keyword
+        :return: 逐个站点返回 (站点名称, 命中的资源媒体信息列表)
+        """
         if not key_word:
-            return []
+            return
 
         indexers = self.get_indexers(check=True)
         if not indexers:
             log.error("没有配置索引器，无法搜索！")
-            return []
+            return
         # 计算耗时
         start_time = datetime.datetime.now()
         if filter_args and filter_args.get("site"):
@@ -133,40 +167,70 @@ class Indexer(object):
             self.progress.update(ptype=ProgressKey.Search,
                                  text="开始搜索 %s，站点：%s ..." % (key_word, filter_args.get("site")))
         else:
-            log.info(f"【{self._client_type.value}】开始并行搜索 %s，线程数：%s ..." % (key_word, len(indexers)))
+            log.info(f"【{self._client_type.value}】开始并行搜索 %s，站点数：%s ..." % (key_word, len(indexers)))
             self.progress.update(ptype=ProgressKey.Search,
-                                 text="开始并行搜索 %s，线程数：%s ..." % (key_word, len(indexers)))
+                                 text="开始并行搜索 %s，站点数：%s ..." % (key_word, len(indexers)))
         # 多线程
-        executor = ThreadPoolExecutor(max_workers=len(indexers))
-        all_task = []
+        all_task = {}
         for index in indexers:
             order_seq = 100 - int(index.pri)
-            task = executor.submit(self._client.search,
-                                   order_seq,
-                                   index,
-                                   key_word,
-                                   filter_args,
-                                   match_media,
-                                   in_from)
-            all_task.append(task)
-        ret_array = []
+            state = {}
+            task = search_executor.submit(self.__search_indexer,
+                                          state,
+                                          order_seq,
+                                          index,
+                                          key_word,
+                                          filter_args,
+                                          match_media,
+                                          in_from)
+            all_task[task] = (index, state)
+        pending = set(all_task)
+        result_count = 0
         finish_count = 0
-        for future in as_completed(all_task):
-            result = future.result()
-            finish_count += 1
-            self.progress.update(ptype=ProgressKey.Search,
-                                 value=round(100 * (finish_count / len(all_task))))
-            if result:
-                ret_array = ret_array + result
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                # 超出时限的站点不再等待
+                now = time.time()
+                for task in list(pending):
+                    index, state = all_task.get(task)
+                    if state.get("start_time") and now - state.get("start_time") > INDEXER_SEARCH_TIMEOUT:
+                        log.warn(f"【{self._client_type.value}】{index.name} 搜索超过 {INDEXER_SEARCH_TIMEOUT} 秒，"
+                                 f"不再等待该站点结果")
+                        pending.discard(task)
+                        # 站点搜索超出时限后会停止过滤识别，记录其实际占用搜索线程的时间
+                        task.add_done_callback(
+                            lambda _, name=index.name, begin=state.get("start_time"): log.warn(
+                                f"【{self._client_type.value}】{name} 超时的搜索已结束，"
+                                f"共占用 {round(time.time() - begin)} 秒"))
+                        finish_count += 1
+                        self.progress.update(ptype=ProgressKey.Search,
+                                             value=round(100 * (finish_count / len(all_task))))
+                for task in done:
+                    index, _ = all_task.get(task)
+                    try:
+                        result = task.result() or []
+                    except Exception as err:
+                        ExceptionUtils.exception_traceback(err)
+                        result = []
+                    finish_count += 1
+                    result_count += len(result)
+                    self.progress.update(ptype=ProgressKey.Search,
+                                         value=round(100 * (finish_count / len(all_task))))
+                    if result:
+                        yield index.name, result
+        finally:
+            # 提前结束时取消还未开始的搜索
+            for task in pending:
+                task.cancel()
         # 计算耗时
         end_time = datetime.datetime.now()
         log.info(f"【{self._client_type.value}】所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
-                 % (len(ret_array), (end_time - start_time).seconds))
+                 % (result_count, (end_time - start_time).seconds))
         self.progress.update(ptype=ProgressKey.Search,
                              text="所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
-                                  % (len(ret_array), (end_time - start_time).seconds),
+                                  % (result_count, (end_time - start_time).seconds),
                              value=100)
-        return ret_array
 
     def get_indexer_statistics(self):
         """
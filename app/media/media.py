@@ -9,7 +9,7 @@ import zhconv
 from lxml import etree
 
 import log
-from app.helper import MetaHelper
+from app.helper import MetaHelper, TmdbCacheHelper
 from app.helper.openai_helper import OpenAiHelper
 from app.media.meta.metainfo import MetaInfo
 from app.media.tmdbv3api import TMDb, Search, Movie, TV, Person, Find, TMDbException, Discover, Trending, Episode, Genre
@@ -32,6 +32,7 @@ class Media:
     discover = None
     genre = None
     meta = None
+    detail_cache = None
     openai = None
     _rmt_match_mode = None
     _search_keyword = None
@@ -64,8 +65,8 @@ class Media:
             self.tmdb.cache = True
             # APIKEY
             self.tmdb.api_key = app.get('rmt_tmdbkey')
-            # 语种
-            self.tmdb.language = self._default_language
+            # 默认语种，查询时按线程设置的语种优先
+            self.tmdb.default_language = self._default_language
             # 代理
             self.tmdb.proxies = Config().get_proxies()
             # 调试模式
@@ -82,6 +83,8 @@ class Media:
             self.genre = Genre()
         # 元数据缓存
         self.meta = MetaHelper()
+        # TMDB详情缓存
+        self.detail_cache = TmdbCacheHelper()
         # ChatGPT
         self.openai = OpenAiHelper()
         # 匹配模式
@@ -563,7 +566,8 @@ class Media:
                       tmdbid,
                       language=None,
                       append_to_response=None,
-                      chinese=True):
+                      chinese=True,
+                      cache=True):
         """
         给定TMDB号，查询一条媒体信息
         :param mtype: 类型：电影、电视剧、动漫，为空时都查（此时用不上年份）
@@ -571,6 +575,7 @@ class Media:
         :param language: 语种
         :param append_to_response: 附加信息
         :param chinese: 是否转换中文标题
+        :param cache: 是否使用详情缓存，为False时强制从TMDB查询并刷新缓存
         """
         if not self.tmdb:
             log.error("【Meta】TMDB API Key 未设置！")
@@ -578,11 +583,11 @@ class Media:
         # 设置语言
         self.__set_language(language)
         if mtype == MediaType.MOVIE:
-            tmdb_info = self.__get_tmdb_movie_detail(tmdbid, append_to_response)
+            tmdb_info = self.__get_tmdb_movie_detail(tmdbid, append_to_response, cache)
             if tmdb_info:
                 tmdb_info['media_type'] = MediaType.MOVIE
         else:
-            tmdb_info = self.__get_tmdb_tv_detail(tmdbid, append_to_response)
+            tmdb_info = self.__get_tmdb_tv_detail(tmdbid, append_to_response, cache)
             if tmdb_info:
                 tmdb_info['media_type'] = MediaType.TV
         if tmdb_info:
@@ -793,7 +798,8 @@ class Media:
                 file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
                                                      tmdbid=file_media_info.get("id"),
                                                      chinese=chinese,
-                                                     append_to_response=append_to_response)
+                                                     append_to_response=append_to_response,
+                                                     cache=cache)
             # 保存到缓存
             if file_media_info is not None:
                 self.__insert_media_cache(media_key=media_key,
@@ -1107,10 +1113,12 @@ class Media:
             return []
         return self.__dict_tmdbinfos(self.trending.all_week(page=page))
 
-    def __get_tmdb_movie_detail(self, tmdbid, append_to_response=None):
+    def __get_tmdb_movie_detail(self, tmdbid, append_to_response=None, cache=True):
         """
         获取电影的详情
         :param tmdbid: TMDB ID
+        :param append_to_response: 附加信息
+        :param cache: 是否使用详情缓存
         :return: TMDB信息
         """
         """
@@ -1203,20 +1211,28 @@ class Media:
         """
         if not self.movie:
             return {}
+        cache_key = self.detail_cache.make_key("movie", tmdbid, self.tmdb.language, append_to_response)
+        if cache:
+            tmdbinfo = self.detail_cache.get_cache(cache_key)
+            if tmdbinfo:
+                return tmdbinfo
         try:
             log.info("【Meta】正在查询TMDB电影：%s ..." % tmdbid)
             tmdbinfo = self.movie.details(tmdbid, append_to_response)
             if tmdbinfo:
                 log.info(f"【Meta】{tmdbid} 查询结果：{tmdbinfo.get('title')}")
+                self.detail_cache.set_cache(cache_key, tmdbinfo)
             return tmdbinfo or {}
         except Exception as e:
             print(str(e))
             return None
 
-    def __get_tmdb_tv_detail(self, tmdbid, append_to_response=None):
+    def __get_tmdb_tv_detail(self, tmdbid, append_to_response=None, cache=True):
         """
         获取电视剧的详情
         :param tmdbid: TMDB ID
+        :param append_to_response: 附加信息
+        :param cache: 是否使用详情缓存
         :return: TMDB信息
         """
         """
@@ -1380,21 +1396,28 @@ class Media:
         """
         if not self.tv:
             return {}
+        cache_key = self.detail_cache.make_key("tv", tmdbid, self.tmdb.language, append_to_response)
+        if cache:
+            tmdbinfo = self.detail_cache.get_cache(cache_key)
+            if tmdbinfo:
+                return tmdbinfo
         try:
             log.info("【Meta】正在查询TMDB电视剧：%s ..." % tmdbid)
             tmdbinfo = self.tv.details(tmdbid, append_to_response)
             if tmdbinfo:
                 log.info(f"【Meta】{tmdbid} 查询结果：{tmdbinfo.get('name')}")
+                self.detail_cache.set_cache(cache_key, tmdbinfo)
             return tmdbinfo or {}
         except Exception as e:
             print(str(e))
             return None
 
-    def get_tmdb_tv_season_detail(self, tmdbid, season: int):
+    def get_tmdb_tv_season_detail(self, tmdbid, season: int, cache=True):
         """
         获取电视剧季的详情
         :param tmdbid: TMDB ID
         :param season: 季，数字
+        :param cache: 是否使用详情缓存
         :return: TMDB信息
         """
         """
@@ -1456,9 +1479,16 @@ class Media:
         """
         if not self.tv:
             return {}
+        cache_key = self.detail_cache.make_key("season_%s" % season, tmdbid, self.tmdb.language)
+        if cache:
+            tmdbinfo = self.detail_cache.get_cache(cache_key)
+            if tmdbinfo:
+                return tmdbinfo
         try:
             log.info("【Meta】正在查询TMDB电视剧：%s，季：%s ..." % (tmdbid, season))
             tmdbinfo = self.tv.season_details(tmdbid, season)
+            if tmdbinfo:
+                self.detail_cache.set_cache(cache_key, tmdbinfo)
             return tmdbinfo or {}
         except Exception as e:
             print(str(e))
@@ -1523,10 +1553,11 @@ class Media:
         ret_info.reverse()
         return ret_info
 
-    def get_tmdb_season_episodes(self, tmdbid, season: int):
+    def get_tmdb_season_episodes(self, tmdbid, season: int, cache=True):
         """
         :param: tmdbid: TMDB ID
         :param: season: 季号
+        :param: cache: 是否使用详情缓存
         """
         """
         从TMDB的季集信息中获得某季的集信息
@@ -1551,7 +1582,7 @@ class Media:
         """
         if not tmdbid:
             return []
-        season_info = self.get_tmdb_tv_season_detail(tmdbid=tmdbid, season=season)
+        season_info = self.get_tmdb_tv_season_detail(tmdbid=tmdbid, season=season, cache=cache)
         if not season_info:
             return []
         ret_info = []
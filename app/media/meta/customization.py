@@ -9,6 +9,8 @@ class CustomizationMatcher(object):
     """
     customization = None
     custom_separator = None
+    # 自定义配置版本，每次更新时递增，用于识别结果缓存失效
+    custom_version = 0
 
     def __init__(self):
         self.customization = None
@@ -42,3 +44,4 @@ class CustomizationMatcher(object):
         """
         self.customization = customization
         self.custom_separator = separator
+        self.custom_version += 1
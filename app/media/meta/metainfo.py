@@ -3,21 +3,71 @@ import regex as re
 
 import log
 from app.helper import WordsHelper
+from app.media.meta.customization import CustomizationMatcher
 from app.media.meta.metaanime import MetaAnime
 from app.media.meta.metavideo import MetaVideo
+from app.media.meta.release_groups import ReleaseGroupsMatcher
+from app.utils import MetaParseCache
 from app.utils.types import MediaType
 from config import RMT_MEDIAEXT
 
+# 识别结果缓存命中统计
+_META_CACHE_STAT = {"hit": 0, "miss": 0}
+
 
 def MetaInfo(title, subtitle=None, mtype=None):
     """
     媒体整理入口，根据名称和副标题，判断是哪种类型的识别，返回对应对象
+    相同名称的识别结果会被缓存，识别词、自定义制作组、自定义占位符变化后缓存自动失效
     :param title: 标题、种子名、文件名
     :param subtitle: 副标题、描述
     :param mtype: 指定识别类型，为空则自动识别类型
     :return: MetaAnime、MetaVideo
     """
+    cache_key = (title,
+                 subtitle,
+                 mtype,
+                 WordsHelper().words_version,
+                 ReleaseGroupsMatcher().custom_version,
+                 CustomizationMatcher().custom_version)
+    cache_info = MetaParseCache.get(cache_key)
+    if cache_info:
+        _META_CACHE_STAT["hit"] += 1
+        return _copy_meta_info(cache_info)
+    _META_CACHE_STAT["miss"] += 1
+    meta_info = _parse_meta_info(title, subtitle)
+    # 缓存快照而非对象本身，调用方对返回对象的修改不会影响缓存
+    cache_info = {k: v for k, v in meta_info.__dict__.items() if k != "tokens"}
+    MetaParseCache.set(cache_key, cache_info)
+    return _copy_meta_info(cache_info)
+
 
+def get_meta_cache_stat():
+    """
+    返回识别结果缓存的命中统计
+    """
+    return {
+        "hit": _META_CACHE_STAT["hit"],
+        "miss": _META_CACHE_STAT["miss"],
+        "size": MetaParseCache.size(),
+        "maxsize": MetaParseCache.maxsize
+    }
+
+
+def _copy_meta_info(cache_info):
+    """
+    根据缓存的识别结果快照生成新的识别对象，可变属性浅拷贝一份
+    """
+    meta_info = MetaVideo.__new__(MetaVideo)
+    meta_info.__dict__.update({k: v.copy() if isinstance(v, (list, dict, set)) else v
+                               for k, v in cache_info.items()})
+    return meta_info
+
+
+def _parse_meta_info(title, subtitle=None):
+    """
+    应用识别词并识别名称
+    """
     # 记录原始名称
     org_title = title
     # 应用自定义识别词，获取识别词处理后名称
@@ -1,4 +1,6 @@
 import regex as re
+
+import log
 from app.utils.commons import singleton
 
 
@@ -8,8 +10,16 @@ class ReleaseGroupsMatcher(object):
     识别制作组、字幕组
     """
     __release_groups = None
+    # 编译后的内置及自定义制作组正则，自定义配置更新时重建
+    __groups_re = None
+    # 按指定制作组编译的正则 {制作组: 正则}
+    __groups_re_cache = {}
     custom_release_groups = None
     custom_separator = None
+    # 自定义配置版本，每次更新时递增，用于识别结果缓存失效
+    custom_version = 0
+    # 按指定制作组编译的正则最多缓存数量
+    GROUPS_RE_CACHE_SIZE = 64
     RELEASE_GROUPS = {
         "0ff": ['FF(?:(?:A|WE)B|CD|E(?:DU|B)|TV)'],
         "1pt": [],
@@ -79,6 +89,27 @@ class ReleaseGroupsMatcher(object):
             for release_group in site_groups:
                 release_groups.append(release_group)
         self.__release_groups = '|'.join(release_groups)
+        self.__groups_re = self.__compile_groups(self.__release_groups)
+        self.__groups_re_cache = {}
+
+    @staticmethod
+    def __compile_groups(groups):
+        """
+        编译制作组/字幕组正则
+        """
+        return re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\]\[】&])" % groups, re.I)
+
+    def __get_groups_re(self, groups):
+        """
+        获取指定制作组/字幕组编译后的正则
+        """
+        groups_re = self.__groups_re_cache.get(groups)
+        if not groups_re:
+            groups_re = self.__compile_groups(groups)
+            if len(self.__groups_re_cache) >= self.GROUPS_RE_CACHE_SIZE:
+                self.__groups_re_cache.clear()
+            self.__groups_re_cache[groups] = groups_re
+        return groups_re
 
     def match(self, title=None, groups=None):
         """
@@ -89,15 +120,13 @@ class ReleaseGroupsMatcher(object):
         if not title:
             return ""
         if not groups:
-            if self.custom_release_groups:
-                groups = f"{self.__release_groups}|{self.custom_release_groups}"
-            else:
-                groups = self.__release_groups
+            groups_re = self.__groups_re
+        else:
+            groups_re = self.__get_groups_re(groups)
         title = f"{title} "
-        groups_re = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\]\[】&])" % groups, re.I)
         # 处理一个制作组识别多次的情况，保留顺序
         unique_groups = []
-        for item in re.findall(groups_re, title):
+        for item in groups_re.findall(title):
             if item not in unique_groups:
                 unique_groups.append(item)
         separator = self.custom_separator or "@"
@@ -107,5 +136,13 @@ class ReleaseGroupsMatcher(object):
         """
         更新自定义制作组/字幕组，自定义分隔符
         """
+        groups_re = None
+        if release_groups:
+            try:
+                groups_re = self.__compile_groups(f"{self.__release_groups}|{release_groups}")
+            except Exception as err:
+                log.error(f"【Meta】自定义制作组/字幕组 {release_groups} 有误：{err}，将仅使用内置制作组/字幕组")
         self.custom_release_groups = release_groups
         self.custom_separator = separator
+        self.__groups_re = groups_re or self.__compile_groups(self.__release_groups)
+        self.custom_version += 1
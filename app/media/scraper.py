@@ -1,5 +1,8 @@
 import os.path
+import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from xml.dom import minidom
 
 from requests.exceptions import RequestException
@@ -7,22 +10,28 @@ from requests.exceptions import RequestException
 import log
 from app.conf import SystemConfig, ModuleConf
 from app.helper import FfmpegHelper
+from app.helper.scraper_cache_helper import ScraperCacheHelper
 from app.media.douban import DouBan
 from app.media.meta import MetaInfo
 from app.utils.commons import retry
-from config import Config, RMT_MEDIAEXT
-from app.utils import DomUtils, RequestUtils, ExceptionUtils, NfoReader, SystemUtils
+from config import Config, RMT_MEDIAEXT, SCRAPER_IMAGE_THREADS
+from app.utils import DomUtils, ExceptionUtils, NfoReader, SystemUtils, PathUtils, StringUtils
 from app.utils.types import MediaType, SystemConfigKey, RmtMode
 from app.media import Media
 
+# 所有刮削共用的图片下载线程池
+image_executor = ThreadPoolExecutor(max_workers=SCRAPER_IMAGE_THREADS, thread_name_prefix="ScraperImage")
+
 
 class Scraper:
     media = None
+    cache = None
     _scraper_flag = False
     _scraper_nfo = {}
     _scraper_pic = {}
-    _rmt_mode = None
     _temp_path = None
+    # 当前线程的刮削任务
+    _local = None
 
     def __init__(self):
         self.media = Media()
@@ -32,69 +41,157 @@ class Scraper:
         if scraper_conf:
             self._scraper_nfo = scraper_conf.get('scraper_nfo') or {}
             self._scraper_pic = scraper_conf.get('scraper_pic') or {}
-        self._rmt_mode = None
+        self.cache = ScraperCacheHelper()
+        self._local = threading.local()
         self._temp_path = os.path.join(Config().get_temp_path(), "scraper")
         if not os.path.exists(self._temp_path):
             os.makedirs(self._temp_path)
 
     def folder_scraper(self, path, exclude_path=None, mode=None):
         """
-        刮削指定文件夹或文件
+        刮削指定文件夹或文件，电视剧按剧集目录分组，同一剧集只识别一次
         :param path: 文件夹或文件路径
         :param exclude_path: 排除路径
-        :param mode: 刮削模式，可选值：force_nfo, force_all
+        :param mode: 刮削模式，可选值：force_nfo, force_all，非强制模式时跳过文件及刮削结果均未变化的文件
         :return:
         """
         # 模式
         force_nfo = True if mode in ["force_nfo", "force_all"] else False
         force_pic = True if mode in ["force_all"] else False
-        # 每个媒体库下的所有文件
+        # 电视剧按剧集目录分组，电影逐个处理
+        groups = {}
         for file in self.__get_library_files(path, exclude_path):
             if not file:
                 continue
-            log.info(f"【Scraper】开始刮削媒体库文件：{file} ...")
-            # 识别媒体文件
             meta_info = MetaInfo(os.path.basename(file))
-            # 优先读取本地文件
-            tmdbid = None
             if meta_info.type == MediaType.MOVIE:
-                # 电影
-                movie_nfo = os.path.join(os.path.dirname(file), "movie.nfo")
-                if os.path.exists(movie_nfo):
-                    tmdbid = self.__get_tmdbid_from_nfo(movie_nfo)
-                file_nfo = os.path.join(os.path.splitext(file)[0] + ".nfo")
-                if not tmdbid and os.path.exists(file_nfo):
-                    tmdbid = self.__get_tmdbid_from_nfo(file_nfo)
-            else:
-                # 电视剧
-                tv_nfo = os.path.join(os.path.dirname(os.path.dirname(file)), "tvshow.nfo")
-                if os.path.exists(tv_nfo):
-                    tmdbid = self.__get_tmdbid_from_nfo(tv_nfo)
-            if tmdbid and not force_nfo:
-                log.info(f"【Scraper】读取到本地nfo文件的tmdbid：{tmdbid}")
-                meta_info.set_tmdb_info(self.media.get_tmdb_info(mtype=meta_info.type,
-                                                                 tmdbid=tmdbid,
-                                                                 append_to_response='all'))
-                media_info = meta_info
+                group_key = (MediaType.MOVIE, file)
             else:
-                medias = self.media.get_media_info_on_files(file_list=[file],
-                                                            append_to_response="all")
-                if not medias:
+                # 同一剧集目录下按文件名识别出的名称区分，避免平铺目录或多部剧集共用上级目录时混用信息；
+                # 文件名中没有名称时按所在目录区分
+                group_key = (MediaType.TV,
+                             os.path.dirname(os.path.dirname(file)),
+                             meta_info.get_name() or os.path.dirname(file))
+            groups.setdefault(group_key, []).append((file, meta_info))
+        for (mtype, *_), files in groups.items():
+            self.__scrape_group(mtype=mtype,
+                                files=files,
+                                force_nfo=force_nfo,
+                                force_pic=force_pic)
+
+    def __scrape_group(self, mtype, files, force_nfo=False, force_pic=False):
+        """
+        刮削同一部电影或同一部剧集的文件，剧集信息只查询一次，图片在本组文件处理完后统一等待下载完成
+        :param mtype: 媒体类型
+        :param files: [(文件路径, MetaInfo)]
+        """
+        # 非强制模式下跳过未变化的文件
+        signatures = {}
+        scrape_files = []
+        for file, meta_info in files:
+            signatures[file] = self.__get_signature(file)
+            if not force_nfo \
+                    and signatures[file] \
+                    and self.cache.is_manifest_unchanged(file, signatures[file]):
+                log.debug(f"【Scraper】{file} 未发生变化，跳过刮削")
+                continue
+            scrape_files.append((file, meta_info))
+        if not scrape_files:
+            return
+        tmdb_info = None
+        outputs = {}
+        job = self.__new_job()
+        self._local.job = job
+        try:
+            for file, meta_info in scrape_files:
+                log.info(f"【Scraper】开始刮削媒体库文件：{file} ...")
+                if tmdb_info and mtype == MediaType.TV:
+                    # 沿用同一剧集已识别的信息
+                    if meta_info.begin_season is None:
+                        meta_info.begin_season = MetaInfo(os.path.basename(os.path.dirname(file))).begin_season
+                    meta_info.set_tmdb_info(tmdb_info)
+                    media_info = meta_info
+                else:
+                    media_info = self.__get_media_info(file, meta_info, force_nfo)
+                if not media_info or not media_info.tmdb_info:
                     continue
-                media_info = None
-                for _, media in medias.items():
-                    media_info = media
-                    break
-            if not media_info or not media_info.tmdb_info:
+                tmdb_info = media_info.tmdb_info
+                outputs[file] = self.gen_scraper_files(media=media_info,
+                                                       dir_path=os.path.dirname(file),
+                                                       file_name=os.path.splitext(os.path.basename(file))[0],
+                                                       file_ext=os.path.splitext(file)[-1],
+                                                       force=True,
+                                                       force_nfo=force_nfo,
+                                                       force_pic=force_pic)
+                log.info(f"【Scraper】{file} 刮削完成")
+        finally:
+            self._local.job = None
+            self.__wait_job(job)
+        for file, file_outputs in outputs.items():
+            if file_outputs is None or not signatures.get(file):
                 continue
-            self.gen_scraper_files(media=media_info,
-                                   dir_path=os.path.dirname(file),
-                                   file_name=os.path.splitext(os.path.basename(file))[0],
-                                   file_ext=os.path.splitext(file)[-1],
-                                   force=True,
-                                   force_nfo=force_nfo,
-                                   force_pic=force_pic)
-            log.info(f"【Scraper】{file} 刮削完成")
+            self.cache.save_manifest(file, signatures[file], file_outputs)
+
+    def __get_media_info(self, file, meta_info, force_nfo=False):
+        """
+        识别媒体文件，优先使用本地nfo文件中的tmdbid
+        """
+        tmdbid = None
+        if meta_info.type == MediaType.MOVIE:
+            # 电影
+            movie_nfo = os.path.join(os.path.dirname(file), "movie.nfo")
+            if os.path.exists(movie_nfo):
+                tmdbid = self.__get_tmdbid_from_nfo(movie_nfo)
+            file_nfo = os.path.join(os.path.splitext(file)[0] + ".nfo")
+            if not tmdbid and os.path.exists(file_nfo):
+                tmdbid = self.__get_tmdbid_from_nfo(file_nfo)
+        else:
+            # 电视剧
+            tv_nfo = os.path.join(os.path.dirname(os.path.dirname(file)), "tvshow.nfo")
+            if os.path.exists(tv_nfo):
+                tmdbid = self.__get_tmdbid_from_nfo(tv_nfo)
+        if tmdbid and not force_nfo:
+            log.info(f"【Scraper】读取到本地nfo文件的tmdbid：{tmdbid}")
+            meta_info.set_tmdb_info(self.media.get_tmdb_info(mtype=meta_info.type,
+                                                             tmdbid=tmdbid,
+                                                             append_to_response='all'))
+            return meta_info
+        medias = self.media.get_media_info_on_files(file_list=[file],
+                                                    append_to_response="all")
+        for _, media in medias.items():
+            return media
+        return None
+
+    def __get_signature(self, file):
+        """
+        媒体文件及刮削配置的签名，文件不存在时返回None
+        """
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+        return StringUtils.md5_hash(str([stat.st_size, stat.st_mtime_ns, self._scraper_nfo, self._scraper_pic]))
+
+    @staticmethod
+    def __new_job(rmt_mode=None):
+        """
+        刮削任务：图片下载任务、当前文件涉及的输出文件、本次任务中已生成过的文件
+        """
+        return {"rmt_mode": rmt_mode, "futures": [], "outputs": [], "done": set()}
+
+    @staticmethod
+    def __wait_job(job):
+        """
+        等待刮削任务的图片下载完成
+        """
+        if job.get("futures"):
+            wait(job.get("futures"))
+
+    def __add_output(self, out_file):
+        self._local.job["outputs"].append(out_file)
+
+    def __is_done(self, out_file):
+        return out_file in self._local.job["done"]
 
     @staticmethod
     def __get_library_files(in_path, exclude_path=None):
@@ -105,16 +202,9 @@ class Scraper:
             yield in_path
             return
 
-        for root, dirs, files in os.walk(in_path):
-            if exclude_path and any(os.path.abspath(root).startswith(os.path.abspath(path))
-                                    for path in exclude_path.split(",")):
-                continue
-
-            for file in files:
-                cur_path = os.path.join(root, file)
-                # 检查后缀
-                if os.path.splitext(file)[-1].lower() in RMT_MEDIAEXT:
-                    yield cur_path
+        yield from PathUtils.iter_dir_files(in_path=in_path,
+                                            exts=RMT_MEDIAEXT,
+                                            exclude_paths=exclude_path.split(",") if exclude_path else None)
 
     @staticmethod
     def __get_tmdbid_from_nfo(file_path):
@@ -376,7 +466,7 @@ class Scraper:
         # 保存文件
         self.__save_nfo(doc, os.path.join(out_path, os.path.join(out_path, "%s.nfo" % file_name)))
 
-    def __save_remove_file(self, out_file, content):
+    def __save_remove_file(self, out_file, content, rmt_mode=None):
         """
         保存文件到远端
         """
@@ -386,17 +476,16 @@ class Scraper:
             os.makedirs(temp_file_dir)
         with open(temp_file, "wb") as f:
             f.write(content)
-        if self._rmt_mode in [RmtMode.RCLONE, RmtMode.RCLONECOPY]:
+        if rmt_mode in [RmtMode.RCLONE, RmtMode.RCLONECOPY]:
             SystemUtils.rclone_move(temp_file, out_file)
-        elif self._rmt_mode in [RmtMode.MINIO, RmtMode.MINIOCOPY]:
+        elif rmt_mode in [RmtMode.MINIO, RmtMode.MINIOCOPY]:
             SystemUtils.minio_move(temp_file, out_file)
         else:
             SystemUtils.move(temp_file, out_file)
 
-    @retry(RequestException, logger=log)
     def __save_image(self, url, out_path, itype='', force=False):
         """
-        下载poster.jpg并保存
+        登记图片下载，由线程池并行下载，本次任务中已保存过的图片不重复处理
         """
         if not url or not out_path:
             return
@@ -404,18 +493,31 @@ class Scraper:
             image_path = os.path.join(out_path, "%s.%s" % (itype, str(url).split('.')[-1]))
         else:
             image_path = out_path
+        self.__add_output(image_path)
+        if self.__is_done(image_path):
+            return
         if not force and os.path.exists(image_path):
             return
+        job = self._local.job
+        job["done"].add(image_path)
+        job["futures"].append(image_executor.submit(self.__download_image,
+                                                    url, image_path, itype, job.get("rmt_mode")))
+
+    @retry(RequestException, logger=log)
+    def __download_image(self, url, image_path, itype='', rmt_mode=None):
+        """
+        下载图片到本地缓存并保存，已缓存的图片不再下载
+        """
         try:
             log.info(f"【Scraper】正在下载{itype}图片：{url} ...")
-            r = RequestUtils().get_res(url=url, raise_exception=True)
-            if r:
-                # 下载到temp目录，远程则先存到temp再远程移动，本地则直接保存
-                if self._rmt_mode in ModuleConf.REMOTE_RMT_MODES:
-                    self.__save_remove_file(image_path, r.content)
+            cache_file = self.cache.get_image(url)
+            if cache_file:
+                # 远程则先存到temp再远程移动，本地则直接从缓存复制
+                if rmt_mode in ModuleConf.REMOTE_RMT_MODES:
+                    with open(cache_file, "rb") as f:
+                        self.__save_remove_file(image_path, f.read(), rmt_mode)
                 else:
-                    with open(file=image_path, mode="wb") as img:
-                        img.write(r.content)
+                    shutil.copyfile(cache_file, image_path)
                 log.info(f"【Scraper】{itype}图片已保存：{image_path}")
             else:
                 log.info(f"【Scraper】{itype}图片下载失败，请检查网络连通性")
@@ -426,10 +528,13 @@ class Scraper:
 
     def __save_nfo(self, doc, out_file):
         log.info("【Scraper】正在保存NFO文件：%s" % out_file)
+        self.__add_output(out_file)
+        self._local.job["done"].add(out_file)
         xml_str = doc.toprettyxml(indent="  ", encoding="utf-8")
         # 下载到temp目录，远程则先存到temp再远程移动，本地则直接保存
-        if self._rmt_mode in ModuleConf.REMOTE_RMT_MODES:
-            self.__save_remove_file(out_file, xml_str)
+        rmt_mode = self._local.job.get("rmt_mode")
+        if rmt_mode in ModuleConf.REMOTE_RMT_MODES:
+            self.__save_remove_file(out_file, xml_str, rmt_mode)
         else:
             with open(out_file, "wb") as xml_file:
                 xml_file.write(xml_str)
@@ -454,18 +559,26 @@ class Scraper:
         :param force_nfo: 是否强制刮削NFO
         :param force_pic: 是否强制刮削图片
         :param rmt_mode: 转移方式
+        :return: 生成或已存在的NFO、图片文件路径，刮削出错时返回None
         """
         if not force and not self._scraper_flag:
-            return
+            return []
         if not self._scraper_nfo and not self._scraper_pic:
-            return
+            return []
 
         if not self._scraper_nfo:
             self._scraper_nfo = {}
         if not self._scraper_pic:
             self._scraper_pic = {}
 
-        self._rmt_mode = rmt_mode
+        # 未在分组刮削中时单独创建任务，返回前等待图片下载完成
+        job = getattr(self._local, "job", None)
+        own_job = not job
+        if own_job:
+            job = self.__new_job()
+            self._local.job = job
+        job["rmt_mode"] = rmt_mode
+        job["outputs"] = []
 
         try:
             # 电影
@@ -475,9 +588,12 @@ class Scraper:
                 #  movie nfo
                 if scraper_movie_nfo.get("basic") or scraper_movie_nfo.get("credits"):
                     # 已存在时不处理
-                    if force_nfo \
-                            or (not os.path.exists(os.path.join(dir_path, "movie.nfo"))
-                                and not os.path.exists(os.path.join(dir_path, "%s.nfo" % file_name))):
+                    exists_nfos = [nfo_file for nfo_file in [os.path.join(dir_path, "movie.nfo"),
+                                                             os.path.join(dir_path, "%s.nfo" % file_name)]
+                                   if os.path.exists(nfo_file)]
+                    for nfo_file in exists_nfos:
+                        self.__add_output(nfo_file)
+                    if force_nfo or not exists_nfos:
                         # 查询Douban信息
                         if scraper_movie_nfo.get("credits") and scraper_movie_nfo.get("credits_chinese"):
                             doubaninfo = self.douban.get_douban_info(media)
@@ -529,8 +645,10 @@ class Scraper:
                 scraper_tv_nfo = self._scraper_nfo.get("tv")
                 scraper_tv_pic = self._scraper_pic.get("tv")
                 # tv nfo
-                if force_nfo \
-                        or not os.path.exists(os.path.join(os.path.dirname(dir_path), "tvshow.nfo")):
+                tv_nfo = os.path.join(os.path.dirname(dir_path), "tvshow.nfo")
+                if os.path.exists(tv_nfo):
+                    self.__add_output(tv_nfo)
+                if (force_nfo or not os.path.exists(tv_nfo)) and not self.__is_done(tv_nfo):
                     if scraper_tv_nfo.get("basic") or scraper_tv_nfo.get("credits"):
                         # 查询Douban信息
                         if scraper_tv_nfo.get("credits") and scraper_tv_nfo.get("credits_chinese"):
@@ -579,8 +697,10 @@ class Scraper:
                         self.__save_image(thumb_image, os.path.dirname(dir_path), "thumb", force_pic)
                 # season nfo
                 if scraper_tv_nfo.get("season_basic"):
-                    if force_nfo \
-                            or not os.path.exists(os.path.join(dir_path, "season.nfo")):
+                    season_nfo = os.path.join(dir_path, "season.nfo")
+                    if os.path.exists(season_nfo):
+                        self.__add_output(season_nfo)
+                    if (force_nfo or not os.path.exists(season_nfo)) and not self.__is_done(season_nfo):
                         # season nfo
                         seasoninfo = self.media.get_tmdb_tv_season_detail(tmdbid=media.tmdb_id,
                                                                           season=int(media.get_season_seq()))
@@ -591,8 +711,10 @@ class Scraper:
                 # episode nfo
                 if scraper_tv_nfo.get("episode_basic") \
                         or scraper_tv_nfo.get("episode_credits"):
-                    if force_nfo \
-                            or not os.path.exists(os.path.join(dir_path, "%s.nfo" % file_name)):
+                    episode_nfo = os.path.join(dir_path, "%s.nfo" % file_name)
+                    if os.path.exists(episode_nfo):
+                        self.__add_output(episode_nfo)
+                    if force_nfo or not os.path.exists(episode_nfo):
                         seasoninfo = self.media.get_tmdb_tv_season_detail(tmdbid=media.tmdb_id,
                                                                           season=int(media.get_season_seq()))
                         if seasoninfo:
@@ -645,6 +767,8 @@ class Scraper:
                 # episode thumb
                 if scraper_tv_pic.get("episode_thumb"):
                     episode_thumb = os.path.join(dir_path, file_name + "-thumb.jpg")
+                    if os.path.exists(episode_thumb):
+                        self.__add_output(episode_thumb)
                     if not force_pic \
                             and not os.path.exists(episode_thumb):
                         # 优先从TMDB查询
@@ -661,10 +785,16 @@ class Scraper:
                                 log.info(f"【Scraper】正在生成缩略图：{video_path} ...")
                                 FfmpegHelper().get_thumb_image_from_video(video_path=video_path,
                                                                           image_path=episode_thumb)
+                                self.__add_output(episode_thumb)
                                 log.info(f"【Scraper】缩略图生成完成：{episode_thumb}")
-
+            return job["outputs"]
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
+            return None
+        finally:
+            if own_job:
+                self._local.job = None
+                self.__wait_job(job)
 
     def __gen_people_chinese_info(self, directors, actors, doubaninfo):
         """
@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import logging
-import os
+import threading
 import time
-from functools import lru_cache
 
 import requests
 import requests.exceptions
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
 
 from .as_obj import AsObj
 from .exceptions import TMDbException
@@ -14,111 +16,192 @@ from .exceptions import TMDbException
 logger = logging.getLogger(__name__)
 
 
+class RateLimiter(object):
+    """
+    Token bucket shared by all TMDb instances. It refills at ``rate`` requests
+    per ``period`` seconds and is adjusted by the X-RateLimit-* response headers.
+    """
+
+    def __init__(self, rate=40, period=1):
+        self._capacity = rate
+        self._period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._blocked_until = 0
+        self._lock = threading.Lock()
+
+    def __refill(self, now):
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._updated) * self._capacity / self._period)
+        self._updated = now
+
+    def acquire(self, wait=True):
+        """
+        Take one token, sleeping until one is available when wait is True.
+        :return: seconds to wait when wait is False and no token is available, else 0
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.__refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return 0
+                sleep_time = max(self._blocked_until - now,
+                                 (1 - self._tokens) * self._period / self._capacity)
+            if not wait:
+                return sleep_time
+            time.sleep(sleep_time)
+
+    def update(self, headers):
+        """
+        Sync the bucket with the rate limit headers of a response.
+        """
+        try:
+            limit = int(headers["X-RateLimit-Limit"]) if "X-RateLimit-Limit" in headers else None
+            remaining = int(headers["X-RateLimit-Remaining"]) if "X-RateLimit-Remaining" in headers else None
+            reset = int(headers["X-RateLimit-Reset"]) if "X-RateLimit-Reset" in headers else None
+        except ValueError:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.__refill(now)
+            if limit:
+                self._capacity = limit
+            if remaining is not None:
+                self._tokens = min(self._tokens, remaining)
+                if remaining < 1 and reset:
+                    self._blocked_until = max(self._blocked_until, now + max(reset - time.time(), 0))
+
+    def block(self, seconds):
+        """
+        Stop handing out tokens for the given seconds, e.g. after a 429 response.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
 class TMDb(object):
-    TMDB_API_KEY = "TMDB_API_KEY"
-    TMDB_LANGUAGE = "TMDB_LANGUAGE"
-    TMDB_WAIT_ON_RATE_LIMIT = "TMDB_WAIT_ON_RATE_LIMIT"
-    TMDB_DEBUG_ENABLED = "TMDB_DEBUG_ENABLED"
-    TMDB_CACHE_ENABLED = "TMDB_CACHE_ENABLED"
-    TMDB_PROXIES = "TMDB_PROXIES"
-    TMDB_DOMAIN = "TMDB_DOMAIN"
     REQUEST_CACHE_MAXSIZE = 512
+    REQUEST_CACHE_EXPIRE = 3600
+    POOL_MAXSIZE = 20
+    RATE_LIMIT_RETRIES = 3
+
+    # settings shared by all instances, set through any instance
+    _settings = {
+        "api_key": None,
+        "language": "zh",
+        "domain": "https://api.themoviedb.org/3",
+        "proxies": None,
+        "wait_on_rate_limit": True,
+        "debug": False,
+        "cache": True
+    }
+    _shared_session = None
+    _session_lock = threading.Lock()
+    _cache = TTLCache(maxsize=REQUEST_CACHE_MAXSIZE, ttl=REQUEST_CACHE_EXPIRE)
+    _cache_lock = threading.Lock()
+    _rate_limiter = RateLimiter()
+    # language and paging of the current thread
+    _local = threading.local()
 
     def __init__(self, obj_cached=True, session=None):
-        self._session = requests.Session() if session is None else session
-        self._remaining = 40
-        self._reset = None
+        self._session = session
         self.obj_cached = obj_cached
-        if os.environ.get(self.TMDB_LANGUAGE) is None:
-            os.environ[self.TMDB_LANGUAGE] = "zh"
-        if not os.environ.get(self.TMDB_DOMAIN):
-            os.environ[self.TMDB_DOMAIN] = "https://api.themoviedb.org/3"
+
+    @property
+    def session(self):
+        if self._session is not None:
+            return self._session
+        with self._session_lock:
+            if TMDb._shared_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                TMDb._shared_session = session
+            return TMDb._shared_session
 
     @property
     def page(self):
-        return os.environ["page"]
+        return getattr(self._local, "page", None)
 
     @property
     def total_results(self):
-        return os.environ["total_results"]
+        return getattr(self._local, "total_results", None)
 
     @property
     def total_pages(self):
-        return os.environ["total_pages"]
+        return getattr(self._local, "total_pages", None)
 
     @property
     def api_key(self):
-        return os.environ.get(self.TMDB_API_KEY)
+        return self._settings.get("api_key")
+
+    @api_key.setter
+    def api_key(self, api_key):
+        self._settings["api_key"] = str(api_key)
 
     @property
     def domain(self):
-        return os.environ.get(self.TMDB_DOMAIN)
+        return self._settings.get("domain")
 
     @domain.setter
     def domain(self, domain):
-        os.environ[self.TMDB_DOMAIN] = str(domain or '')
+        self._settings["domain"] = str(domain or '')
 
     @property
     def proxies(self):
-        return os.environ.get(self.TMDB_PROXIES)
+        return self._settings.get("proxies")
 
     @proxies.setter
     def proxies(self, proxies):
         if proxies:
-            proxies_strs = []
-            for key, value in proxies.items():
-                if not value:
-                    continue
-                proxies_strs.append("'%s': '%s'" % (key, value))
-            if proxies_strs:
-                os.environ[self.TMDB_PROXIES] = "{%s}" % ",".join(proxies_strs)
-            else:
-                os.environ[self.TMDB_PROXIES] = 'None'
-
-    @api_key.setter
-    def api_key(self, api_key):
-        os.environ[self.TMDB_API_KEY] = str(api_key)
+            self._settings["proxies"] = {key: value for key, value in proxies.items() if value} or None
 
     @property
     def language(self):
-        return os.environ.get(self.TMDB_LANGUAGE)
+        """
+        Language of the current thread, falls back to the default language.
+        """
+        return getattr(self._local, "language", None) or self._settings.get("language")
 
     @language.setter
     def language(self, language):
-        os.environ[self.TMDB_LANGUAGE] = language
+        self._local.language = language
+
+    @property
+    def default_language(self):
+        return self._settings.get("language")
+
+    @default_language.setter
+    def default_language(self, language):
+        self._settings["language"] = language
 
     @property
     def wait_on_rate_limit(self):
-        if os.environ.get(self.TMDB_WAIT_ON_RATE_LIMIT) == "False":
-            return False
-        else:
-            return True
+        return self._settings.get("wait_on_rate_limit")
 
     @wait_on_rate_limit.setter
     def wait_on_rate_limit(self, wait_on_rate_limit):
-        os.environ[self.TMDB_WAIT_ON_RATE_LIMIT] = str(wait_on_rate_limit)
+        self._settings["wait_on_rate_limit"] = bool(wait_on_rate_limit)
 
     @property
     def debug(self):
-        if os.environ.get(self.TMDB_DEBUG_ENABLED) == "True":
-            return True
-        else:
-            return False
+        return self._settings.get("debug")
 
     @debug.setter
     def debug(self, debug):
-        os.environ[self.TMDB_DEBUG_ENABLED] = str(debug)
+        self._settings["debug"] = bool(debug)
 
     @property
     def cache(self):
-        if os.environ.get(self.TMDB_CACHE_ENABLED) == "False":
-            return False
-        else:
-            return True
+        return self._settings.get("cache")
 
     @cache.setter
     def cache(self, cache):
-        os.environ[self.TMDB_CACHE_ENABLED] = str(cache)
+        self._settings["cache"] = bool(cache)
 
     @staticmethod
     def _get_obj(result, key="results", all_details=False):
@@ -129,13 +212,29 @@ class TMDb(object):
         else:
             return [AsObj(**res) for res in result[key]]
 
-    @staticmethod
-    @lru_cache(maxsize=REQUEST_CACHE_MAXSIZE)
-    def cached_request(method, url, data, proxies):
-        return requests.request(method, url, data=data, proxies=eval(proxies), verify=False, timeout=10)
-
     def cache_clear(self):
-        return self.cached_request.cache_clear()
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _request(self, method, url, data=None):
+        """
+        Send a request under the shared rate limit, retrying on 429.
+        """
+        for _ in range(self.RATE_LIMIT_RETRIES + 1):
+            sleep_time = self._rate_limiter.acquire(wait=self.wait_on_rate_limit)
+            if sleep_time:
+                raise TMDbException("Rate limit reached. Try again in %d seconds." % sleep_time)
+            req = self.session.request(method, url, data=data, proxies=self.proxies, timeout=10, verify=False)
+            self._rate_limiter.update(req.headers)
+            if req.status_code != 429:
+                return req
+            retry_after = req.headers.get("Retry-After")
+            sleep_time = int(retry_after) if str(retry_after).isdigit() else 1
+            self._rate_limiter.block(sleep_time)
+            if not self.wait_on_rate_limit:
+                raise TMDbException("Rate limit reached. Try again in %d seconds." % sleep_time)
+            logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
+        raise TMDbException("Rate limit reached.")
 
     def _call(
             self, action, append_to_response, call_cached=True, method="GET", data=None
@@ -151,46 +250,33 @@ class TMDb(object):
             self.language,
         )
 
-        if self.cache and self.obj_cached and call_cached and method != "POST":
-            req = self.cached_request(method, url, data, self.proxies)
-        else:
-            req = self._session.request(method, url, data=data, proxies=eval(self.proxies), timeout=10, verify=False)
-
-        headers = req.headers
-
-        if "X-RateLimit-Remaining" in headers:
-            self._remaining = int(headers["X-RateLimit-Remaining"])
-
-        if "X-RateLimit-Reset" in headers:
-            self._reset = int(headers["X-RateLimit-Reset"])
-
-        if self._remaining < 1:
-            current_time = int(time.time())
-            sleep_time = self._reset - current_time
-
-            if self.wait_on_rate_limit:
-                logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
-                time.sleep(abs(sleep_time))
-                self._call(action, append_to_response, call_cached, method, data)
-            else:
-                raise TMDbException(
-                    "Rate limit reached. Try again in %d seconds." % sleep_time
-                )
-
-        json = req.json()
+        use_cache = self.cache and self.obj_cached and call_cached and method != "POST"
+        cache_key = (method, url, data, str(self.proxies))
+        json = None
+        if use_cache:
+            with self._cache_lock:
+                json = self._cache.get(cache_key)
+            if json is not None:
+                json = copy.deepcopy(json)
+
+        if json is None:
+            json = self._request(method, url, data=data).json()
+            if use_cache and "errors" not in json and json.get("success") is not False:
+                with self._cache_lock:
+                    self._cache[cache_key] = copy.deepcopy(json)
 
         if "page" in json:
-            os.environ["page"] = str(json["page"])
+            self._local.page = json["page"]
 
         if "total_results" in json:
-            os.environ["total_results"] = str(json["total_results"])
+            self._local.total_results = json["total_results"]
 
         if "total_pages" in json:
-            os.environ["total_pages"] = str(json["total_pages"])
+            self._local.total_pages = json["total_pages"]
 
         if self.debug:
             logger.info(json)
-            logger.info(self.cached_request.cache_info())
+            logger.info("cache size: %s" % len(self._cache))
 
         if "errors" in json:
             raise TMDbException(json["errors"])
@@ -132,13 +132,23 @@ class _IMediaClient(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def get_items(self, parent):
+    def get_items(self, parent, raise_exception=False):
         """
         获取媒体库中的所有媒体
         :param parent: 上一级的ID
+        :param raise_exception: 获取出错时是否抛出异常，用于同步时区分不完整的结果
+        :return: 媒体信息，其中modified为媒体在服务器上的变更标识，用于增量同步
         """
         pass
 
+    @staticmethod
+    def get_modified_mark(*values):
+        """
+        生成媒体的变更标识，服务器未返回任何变更信息时为空，同步时每次都会更新该媒体
+        """
+        values = [str(value) for value in values if value not in [None, ""]]
+        return "|".join(values) if values else ""
+
     @abstractmethod
     def get_play_url(self, item_id):
         """
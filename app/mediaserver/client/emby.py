@@ -5,7 +5,7 @@ import log
 from app.mediaserver.client._base import _IMediaClient
 from app.utils import RequestUtils, SystemUtils, ExceptionUtils, IpUtils
 from app.utils.types import MediaType, MediaServerType
-from config import Config
+from config import Config, MEDIASYNC_PAGE_SIZE, MEDIASYNC_ITEM_FIELDS
 
 
 class Emby(_IMediaClient):
@@ -318,7 +318,7 @@ class Emby(_IMediaClient):
         :param year: 年份
         :param tmdb_id: TMDBID
         :param season: 季
-        :return: 集号的列表
+        :return: 集号的列表，查询失败时返回None
         """
         if not self._host or not self._apikey:
             return None
@@ -354,7 +354,7 @@ class Emby(_IMediaClient):
             ExceptionUtils.exception_traceback(e)
             log.error(f"【{self.client_name}】连接Shows/Id/Episodes出错：" + str(e))
             return None
-        return []
+        return None
 
     def get_no_exists_episodes(self, meta_info, season, total_num):
         """
@@ -617,40 +617,56 @@ class Emby(_IMediaClient):
         """
         return f"{self._play_host or self._host}web/index.html#!/item?id={item_id}&context=home&serverId={self._serverid}"
 
-    def get_items(self, parent):
+    def get_items(self, parent, raise_exception=False):
         """
-        获取媒体服务器所有媒体库列表
+        获取媒体库中的所有电影和电视剧，按页批量获取所需字段，不再逐个查询详情
+        :param parent: 媒体库ID
+        :param raise_exception: 获取出错时是否抛出异常，否则只返回已获取到的媒体
         """
         if not parent:
             yield {}
         if not self._host or not self._apikey:
             yield {}
-        req_url = "%semby/Users/%s/Items?ParentId=%s&api_key=%s" % (self._host, self._user, parent, self._apikey)
-        try:
-            res = RequestUtils().get_res(req_url)
-            if res and res.status_code == 200:
-                results = res.json().get("Items") or []
-                for result in results:
-                    if not result:
+        start_index = 0
+        while True:
+            req_url = "%semby/Users/%s/Items?ParentId=%s&Recursive=true&IncludeItemTypes=Movie,Series" \
+                      "&Fields=%s&StartIndex=%s&Limit=%s&api_key=%s" % (
+                          self._host, self._user, parent, MEDIASYNC_ITEM_FIELDS,
+                          start_index, MEDIASYNC_PAGE_SIZE, self._apikey)
+            try:
+                res = RequestUtils().get_res(req_url, raise_exception=raise_exception)
+                if not res or res.status_code != 200:
+                    if raise_exception:
+                        raise IOError("获取媒体库 %s 数据失败，状态码：%s" % (
+                            parent, res.status_code if res is not None else "无响应"))
+                    break
+                result = res.json() or {}
+                results = result.get("Items") or []
+                for item_info in results:
+                    if not item_info:
                         continue
-                    if result.get("Type") in ["Movie", "Series"]:
-                        item_info = self.get_iteminfo(result.get("Id"))
-                        yield {"id": result.get("Id"),
-                               "library": item_info.get("ParentId"),
-                               "type": item_info.get("Type"),
-                               "title": item_info.get("Name"),
-                               "originalTitle": item_info.get("OriginalTitle"),
-                               "year": item_info.get("ProductionYear"),
-                               "tmdbid": item_info.get("ProviderIds", {}).get("Tmdb"),
-                               "imdbid": item_info.get("ProviderIds", {}).get("Imdb"),
-                               "path": item_info.get("Path"),
-                               "json": str(item_info)}
-                    elif "Folder" in result.get("Type"):
-                        for item in self.get_items(parent=result.get('Id')):
-                            yield item
-        except Exception as e:
-            ExceptionUtils.exception_traceback(e)
-            log.error(f"【{self.client_name}】连接Users/Items出错：" + str(e))
+                    yield {"id": item_info.get("Id"),
+                           "library": item_info.get("ParentId"),
+                           "type": item_info.get("Type"),
+                           "title": item_info.get("Name"),
+                           "originalTitle": item_info.get("OriginalTitle"),
+                           "year": item_info.get("ProductionYear"),
+                           "tmdbid": item_info.get("ProviderIds", {}).get("Tmdb"),
+                           "imdbid": item_info.get("ProviderIds", {}).get("Imdb"),
+                           "path": item_info.get("Path"),
+                           "modified": self.get_modified_mark(item_info.get("Etag"),
+                                                              item_info.get("DateLastMediaAdded"),
+                                                              item_info.get("RecursiveItemCount")),
+                           "json": str(item_info)}
+                start_index += len(results)
+                if not results or start_index >= (result.get("TotalRecordCount") or 0):
+                    break
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+                log.error(f"【{self.client_name}】连接Users/Items出错：" + str(e))
+                if raise_exception:
+                    raise
+                break
         yield {}
 
     def get_playing_sessions(self):
@@ -433,9 +433,11 @@ class Plex(_IMediaClient):
         """
         return f'{self._play_host or self._host}#!/server/{self._plex.machineIdentifier}/details?key={item_id}'
 
-    def get_items(self, parent):
+    def get_items(self, parent, raise_exception=False):
         """
         获取媒体服务器所有媒体库列表
+        :param parent: 媒体库ID
+        :param raise_exception: 获取出错时是否抛出异常，否则只返回已获取到的媒体
         """
         if not parent:
             yield {}
@@ -460,9 +462,13 @@ class Plex(_IMediaClient):
                            "tmdbid": ids['tmdb_id'],
                            "imdbid": ids['imdb_id'],
                            "tvdbid": ids['tvdb_id'],
-                           "path": path}
+                           "path": path,
+                           "modified": self.get_modified_mark(item.updatedAt,
+                                                              getattr(item, "leafCount", None))}
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
+            if raise_exception:
+                raise
         yield {}
 
     @staticmethod
@@ -1,5 +1,6 @@
 import json
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import log
 from app.conf import SystemConfig
@@ -10,10 +11,11 @@ from app.message import Message
 from app.utils import ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaServerType, MovieTypes, SystemConfigKey, ProgressKey
-from config import Config
+from config import Config, MEDIASYNC_THREADS, MEDIASYNC_BATCH_SIZE
 
 lock = threading.Lock()
 server_lock = threading.Lock()
+mirror_lock = threading.Lock()
 
 
 @singleton
@@ -22,6 +24,14 @@ class MediaServer:
 
     _server_type = None
     _server = None
+    # 是否使用本地同步的媒体库数据判断媒体是否存在
+    _local_exists_check = False
+    # 本地媒体库镜像：{"tv": {TMDBID: (ITEMID, {季: 集的位图})}, "movie": {标题: [(年份, ITEMID)]}}
+    _mirror = None
+    # 收到媒体库变化通知、镜像已过期的ITEMID
+    _stale_items = set()
+    # 会引起媒体库变化的Webhook事件
+    _library_events = ["library.new", "library.deleted", "ItemAdded", "ItemDeleted"]
     mediadb = None
     progress = None
     message = None
@@ -45,6 +55,10 @@ class MediaServer:
         # 当前使用的媒体库服务器
         self._server_type = Config().get_config('media').get('media_server') or 'emby'
         self._server = None
+        # 本地镜像判断媒体是否存在
+        laboratory = Config().get_config('laboratory') or {}
+        self._local_exists_check = True if laboratory.get("mediasync_exists_check") else False
+        self.__reset_mirror()
 
     def __build_class(self, ctype, conf):
         for mediaserver_schema in self._mediaserver_schemas:
@@ -155,6 +169,12 @@ class MediaServer:
         """
         if not self.server:
             return None
+        if self._local_exists_check:
+            no_exists_episodes = self.__get_local_no_exists_episodes(meta_info,
+                                                                    season_number,
+                                                                    episode_count)
+            if no_exists_episodes is not None:
+                return no_exists_episodes
         return self.server.get_no_exists_episodes(meta_info,
                                                   season_number,
                                                   episode_count)
@@ -168,8 +188,86 @@ class MediaServer:
         """
         if not self.server:
             return None
+        if self._local_exists_check:
+            exists_movies = self.__get_local_movies(title, year)
+            if exists_movies:
+                return exists_movies
         return self.server.get_movies(title, year)
 
+    def __reset_mirror(self):
+        """
+        清空本地媒体库镜像，下次使用时重新从数据库加载
+        """
+        with mirror_lock:
+            self._mirror = None
+            self._stale_items = set()
+
+    def __get_mirror(self):
+        """
+        获取本地媒体库镜像，由同步的媒体库数据生成，按TMDBID索引剧集、按标题索引电影：
+        {"tv": {TMDBID: ([媒体ID], {季号: 集的位图})}, "movie": {标题: [(年份, 媒体ID)]}}
+        """
+        mirror = self._mirror
+        if mirror is not None:
+            return mirror
+        with mirror_lock:
+            if self._mirror is not None:
+                return self._mirror
+            mirror = {"tv": {}, "movie": {}}
+            for item in self.mediadb.get_items(server_type=self._server_type):
+                if item.ITEM_TYPE in ['Movie', 'movie']:
+                    mirror["movie"].setdefault(item.TITLE, []).append((str(item.YEAR), str(item.ITEM_ID)))
+                elif item.ITEM_TYPE in ['Series', 'show'] and item.TMDBID:
+                    # 同一剧集可能分布在多个媒体库或多个条目中，合并各条目的集
+                    item_ids, seasons = mirror["tv"].setdefault(str(item.TMDBID), ([], {}))
+                    item_ids.append(str(item.ITEM_ID))
+                    for seasoninfo in json.loads(item.JSON or "[]") or []:
+                        season_num = seasoninfo.get("season_num")
+                        episode_num = seasoninfo.get("episode_num")
+                        if season_num is None or not episode_num:
+                            continue
+                        seasons[int(season_num)] = seasons.get(int(season_num), 0) | (1 << int(episode_num))
+            self._mirror = mirror
+            return mirror
+
+    def __is_stale(self, item_id):
+        """
+        镜像中的媒体是否已收到变化通知
+        """
+        return any(item_id == stale_id or item_id.endswith("/%s" % stale_id) for stale_id in self._stale_items)
+
+    def __get_local_no_exists_episodes(self, meta_info, season_number, episode_count):
+        """
+        从本地媒体库镜像中查询缺少的集，镜像中没有该剧集时返回None
+        """
+        if not meta_info.tmdb_id:
+            return None
+        try:
+            item = self.__get_mirror().get("tv").get(str(meta_info.tmdb_id))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return None
+        if not item or any(self.__is_stale(item_id) for item_id in item[0]):
+            return None
+        episodes = item[1].get(int(season_number or 1), 0)
+        return [episode for episode in range(1, episode_count + 1) if not episodes & (1 << episode)]
+
+    def __get_local_movies(self, title, year=None):
+        """
+        从本地媒体库镜像中查询电影，镜像中没有时返回空
+        """
+        try:
+            movies = self.__get_mirror().get("movie").get(title) or []
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return []
+        for movie_year, item_id in movies:
+            if self.__is_stale(item_id):
+                continue
+            if not year or movie_year == str(year):
+                return [{'title': title, 'year': movie_year}]
+        return []
+
     def refresh_library_by_items(self, items):
         """
         按类型、名称、年份来刷新媒体库
@@ -187,14 +285,15 @@ class MediaServer:
             return []
         return self.server.get_libraries()
 
-    def get_items(self, parent):
+    def get_items(self, parent, raise_exception=False):
         """
         获取媒体库中的所有媒体
         :param parent: 上一级的ID
+        :param raise_exception: 获取出错时是否抛出异常
         """
         if not self.server:
             return []
-        return self.server.get_items(parent)
+        return self.server.get_items(parent, raise_exception=raise_exception)
 
     def get_play_url(self, item_id):
         """
@@ -214,53 +313,97 @@ class MediaServer:
             return []
         return self.server.get_tv_episodes(item_id=item_id)
 
-    def sync_mediaserver(self):
+    def sync_mediaserver(self, full=False):
         """
-        同步媒体库所有数据到本地数据库
+        同步媒体库所有数据到本地数据库，默认增量同步：
+        并行获取各媒体库的媒体，按变更标识与已同步的数据比对，只查询和写入有变化的媒体，删除已不存在的媒体
+        :param full: 是否全量同步，全量同步时所有媒体都重新查询和写入
         """
         if not self.server:
             return
         with lock:
             # 开始进度条
-            log.info("【MediaServer】开始同步媒体库数据...")
+            log.info("【MediaServer】开始%s同步媒体库数据..." % ("全量" if full else "增量"))
             self.progress.start(ProgressKey.MediaSync)
             self.progress.update(ptype=ProgressKey.MediaSync, text="请稍候...")
             # 获取需同步的媒体库
             librarys = self.systemconfig.get(SystemConfigKey.SyncLibrary) or []
+            librarys = [library for library in self.get_libraries() if str(library.get("id")) in librarys]
+            # 已同步媒体的变更标识
+            modified_marks = {} if full else self.mediadb.get_modified_marks(server_type=self._server_type)
+            item_librarys = self.mediadb.get_item_libraries(server_type=self._server_type)
+            # 并行获取各媒体库的媒体
+            self.progress.update(ptype=ProgressKey.MediaSync,
+                                 text="正在获取 %s 数据..." % "、".join([lib.get("name") for lib in librarys]))
+            with ThreadPoolExecutor(max_workers=min(len(librarys), MEDIASYNC_THREADS) or 1) as executor:
+                library_items = list(executor.map(lambda lib: self.__get_library_items(lib.get("id")), librarys))
+            # 获取出错的媒体库只同步已获取到的媒体，不删除其已同步的数据
+            complete_librarys = set()
+            for library, (_, complete) in zip(librarys, library_items):
+                if not complete:
+                    log.warn("【MediaServer】媒体库 %s 数据获取不完整，保留已同步的数据" % library.get("name"))
+                else:
+                    complete_librarys.add(str(library.get("id")))
             # 汇总统计
-            medias_count = self.get_medias_count()
-            total_media_count = medias_count.get("MovieCount") + medias_count.get("SeriesCount")
             total_count = 0
             movie_count = 0
             tv_count = 0
-            # 清空登记薄
-            self.mediadb.empty(server_type=self._server_type)
-            for library in self.get_libraries():
-                if str(library.get("id")) not in librarys:
-                    continue
-                # 获取媒体库所有项目
-                self.progress.update(ptype=ProgressKey.MediaSync,
-                                     text="正在获取 %s 数据..." % (library.get("name")))
-                for item in self.get_items(library.get("id")):
-                    if not item:
+            sync_items = {}
+            changed_items = []
+            for library, (items, _) in zip(librarys, library_items):
+                for item in items:
+                    item_id = str(item.get("id"))
+                    if item_id in sync_items:
                         continue
-                    # 更新进度
-                    seasoninfo = []
+                    # 记录为所同步的媒体库，用于按媒体库删除已不存在的媒体
+                    item["library"] = str(library.get("id"))
+                    sync_items[item_id] = item
                     total_count += 1
                     if item.get("type") in ['Movie', 'movie']:
                         movie_count += 1
                     elif item.get("type") in ['Series', 'show']:
                         tv_count += 1
-                        # 查询剧集信息
-                        seasoninfo = self.get_tv_episodes(item.get("id"))
+                    # 变更标识及所属媒体库均相同的媒体无需更新
+                    if item.get("modified") and modified_marks.get(item_id) == item.get("modified") \
+                            and item_librarys.get(item_id) == item.get("library"):
+                        continue
+                    changed_items.append(item)
+            log.info("【MediaServer】媒体库共 %s 个媒体，需要更新 %s 个" % (total_count, len(changed_items)))
+            # 并行查询有变化的剧集信息，分批写入
+            finished_count = 0
+            failed_count = 0
+            with ThreadPoolExecutor(max_workers=MEDIASYNC_THREADS) as executor:
+                for i in range(0, len(changed_items), MEDIASYNC_BATCH_SIZE):
+                    batch_items = changed_items[i:i + MEDIASYNC_BATCH_SIZE]
+                    seasoninfos = executor.map(self.__get_item_seasoninfo, batch_items)
+                    # 查询集信息失败的剧集不写入，保留原数据及变更标识，下次增量同步时重新查询
+                    upsert_items = [(item, seasoninfo) for item, seasoninfo in zip(batch_items, seasoninfos)
+                                    if seasoninfo is not None]
+                    failed_count += len(batch_items) - len(upsert_items)
+                    self.mediadb.upsert(server_type=self._server_type,
+                                        items=upsert_items)
+                    finished_count += len(batch_items)
                     self.progress.update(ptype=ProgressKey.MediaSync,
-                                         text="正在同步 %s，已完成：%s / %s ..." % (
-                                             library.get("name"), total_count, total_media_count),
-                                         value=round(100 * total_count / total_media_count, 1))
-                    # 插入数据
-                    self.mediadb.insert(server_type=self._server_type,
-                                        iteminfo=item,
-                                        seasoninfo=seasoninfo)
+                                         text="正在同步媒体库数据，已完成：%s / %s ..." % (
+                                             finished_count, len(changed_items)),
+                                         value=round(100 * finished_count / len(changed_items), 1))
+            if failed_count:
+                log.warn("【MediaServer】%s 个剧集查询集信息失败，将在下次同步时重试" % failed_count)
+            # 按媒体库删除已不存在的媒体，只处理完整获取到数据的媒体库；
+            # 不属于任何同步媒体库的数据（媒体库已取消同步或旧版本数据）只在所有媒体库均获取完整时删除
+            all_complete = len(complete_librarys) == len(librarys)
+            sync_librarys = set(str(library.get("id")) for library in librarys)
+            vanished_ids = []
+            for item_id, library in item_librarys.items():
+                if item_id in sync_items:
+                    continue
+                if library in complete_librarys or (all_complete and library not in sync_librarys):
+                    vanished_ids.append(item_id)
+            for i in range(0, len(vanished_ids), MEDIASYNC_BATCH_SIZE):
+                self.mediadb.delete_items(server_type=self._server_type,
+                                          item_ids=vanished_ids[i:i + MEDIASYNC_BATCH_SIZE])
+            if vanished_ids:
+                log.info("【MediaServer】删除已不存在的媒体：%s 个" % len(vanished_ids))
 
             # 更新总体同步情况
             self.mediadb.statistics(server_type=self._server_type,
@@ -272,7 +415,36 @@ class MediaServer:
                                  value=100,
                                  text="媒体库数据同步完成，同步数量：%s" % total_count)
             self.progress.end(ProgressKey.MediaSync)
-            log.info("【MediaServer】媒体库数据同步完成，同步数量：%s" % total_count)
+            # 重新加载本地媒体库镜像
+            self.__reset_mirror()
+            log.info("【MediaServer】媒体库数据同步完成，同步数量：%s，更新：%s" % (total_count, len(changed_items)))
+
+    def __get_library_items(self, library_id):
+        """
+        获取媒体库的所有媒体
+        :return: 媒体列表及是否完整获取，获取出错时返回已获取到的媒体
+        """
+        items = []
+        try:
+            for item in self.get_items(library_id, raise_exception=True):
+                if item:
+                    items.append(item)
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return items, False
+        return items, True
+
+    def __get_item_seasoninfo(self, item):
+        """
+        查询剧集的所有集信息，电影返回空，查询失败时返回None
+        """
+        if item.get("type") not in ['Series', 'show']:
+            return []
+        try:
+            return self.get_tv_episodes(item.get("id"))
+        except Exception as e:
+            ExceptionUtils.exception_traceback(e)
+            return None
 
     def check_item_exists(self,
                           mtype,
@@ -359,6 +531,10 @@ class MediaServer:
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             log.error(f"【MediaServer】webhook 消息解析异常")
+        if event_info and event_info.get("event") in self._library_events and event_info.get("item_id"):
+            # 媒体库发生变化，该媒体改为实时查询，直到下次同步
+            with mirror_lock:
+                self._stale_items.add(str(event_info.get("item_id")))
         if event_info:
             # 获取消息图片
             if event_info.get("item_type") == "TV":
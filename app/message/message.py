@@ -7,6 +7,7 @@ import log
 from app.conf import ModuleConf
 from app.helper import DbHelper, SubmoduleHelper
 from app.message.message_center import MessageCenter
+from app.message.message_dispatcher import MessageDispatcher
 from app.utils import StringUtils, ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import SearchType, MediaType
@@ -39,6 +40,9 @@ class Message(object):
         # 停止旧服务
         if self._active_clients:
             for active_client in self._active_clients:
+                # 旧的发送队列发送完排队中的消息后退出
+                if active_client.get("dispatcher"):
+                    active_client.get("dispatcher").stop()
                 if active_client.get("search_type") in self.get_search_types():
                     client = active_client.get("client")
                     if client and hasattr(client, "stop_service"):
@@ -72,6 +76,7 @@ class Message(object):
                 "client": self.__build_class(ctype=client_config.TYPE, conf=config)
             }
             client.update(client_conf)
+            client["dispatcher"] = MessageDispatcher(client)
             self._active_clients.append(client)
             if client.get("interactive"):
                 self._active_interactive_clients[client.get("search_type")] = client
@@ -100,16 +105,18 @@ class Message(object):
             log.error(f"【Message】{ctype} 发送测试消息失败：%s" % ret_msg)
         return state
 
-    def __sendmsg(self, client, title, text="", image="", url="", user_id=""):
+    def __sendmsg(self, client, title, text="", image="", url="", user_id="", coalesce=None, digest=None):
         """
-        通用消息发送
+        通用消息发送，消息进入消息端的发送队列后立即返回
         :param client: 消息端
         :param title: 消息标题
         :param text: 消息内容
         :param image: 图片URL
         :param url: 消息跳转地址
         :param user_id: 用户ID，如有则只发给这个用户
-        :return: 发送状态、错误信息
+        :param coalesce: 合并键，短时间内的同类消息合并为一条发送
+        :param digest: 合并后的消息标题，%s 为合并的消息数
+        :return: 是否已加入发送队列
         """
         if not client or not client.get('client'):
             return None
@@ -123,26 +130,13 @@ class Message(object):
                 url = ""
         else:
             url = ""
-        # 消息内容分段
-        max_length = client.get("max_length")
-        if max_length:
-            texts = StringUtils.split_text(text, max_length)
-        else:
-            texts = [text]
-        # 循环发送
-        for txt in texts:
-            if not title:
-                title = txt
-                txt = ""
-            state, ret_msg = client.get('client').send_msg(title=title,
-                                                           text=txt,
-                                                           image=image,
-                                                           url=url,
-                                                           user_id=user_id)
-            title = None
-            if not state:
-                log.error(f"【Message】{cname} 消息发送失败：%s" % ret_msg)
-                return state
+        client.get("dispatcher").put(title=title,
+                                     text=text,
+                                     image=image,
+                                     url=url,
+                                     user_id=user_id,
+                                     coalesce=coalesce,
+                                     digest=digest)
         return True
 
     def send_channel_msg(self, channel, title, text="", image="", url="", user_id=""):
@@ -180,13 +174,11 @@ class Message(object):
             return None
         cname = client.get('name')
         log.info(f"【Message】发送消息 {cname}：title={title}")
-        state, ret_msg = client.get('client').send_list_msg(medias=medias,
-                                                            user_id=user_id,
-                                                            title=title,
-                                                            url=self._domain)
-        if not state:
-            log.error(f"【Message】{cname} 发送消息失败：%s" % ret_msg)
-        return state
+        client.get("dispatcher").put(title=title,
+                                     medias=medias,
+                                     user_id=user_id,
+                                     url=self._domain)
+        return True
 
     def send_channel_list_msg(self, channel, title, medias: list, user_id=""):
         """
@@ -267,7 +259,9 @@ class Message(object):
                     title=msg_title,
                     text=msg_text,
                     image=can_item.get_message_image(),
-                    url='downloading'
+                    url='downloading',
+                    coalesce="download_start",
+                    digest="共%s个任务开始下载"
                 )
 
     def send_transfer_movie_message(self, in_from: Enum, media_info, exist_filenum, category_flag):
@@ -302,7 +296,9 @@ class Message(object):
                     title=msg_title,
                     text=msg_str,
                     image=media_info.get_message_image(),
-                    url='history'
+                    url='history',
+                    coalesce="transfer_finished",
+                    digest="共%s个媒体已入库"
                 )
 
     def send_transfer_tv_message(self, message_medias: dict, in_from: Enum):
@@ -334,7 +330,9 @@ class Message(object):
                         title=msg_title,
                         text=msg_str,
                         image=item_info.get_message_image(),
-                        url='history')
+                        url='history',
+                        coalesce="transfer_finished",
+                        digest="共%s个媒体已入库")
 
     def send_download_fail_message(self, item, error_msg):
         """
@@ -655,6 +653,13 @@ class Message(object):
         else:
             return [client for client in self._active_interactive_clients.values()]
 
+    def get_dispatch_stats(self):
+        """
+        查询各消息端发送队列的统计信息
+        """
+        return {client.get("name"): client.get("dispatcher").get_stats()
+                for client in self._active_clients if client.get("dispatcher")}
+
     @staticmethod
     def get_search_types():
         """
@@ -0,0 +1,193 @@
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+
+import log
+from app.utils import ExceptionUtils, StringUtils
+from config import MESSAGE_QUEUE_MAXSIZE, MESSAGE_SEND_RETRIES, MESSAGE_RETRY_BACKOFF, MESSAGE_COALESCE_DELAY
+
+
+class MessageDispatcher(object):
+    """
+    单个消息渠道的发送队列，由独立线程按先后顺序发送，调用方入队后立即返回：
+    1、发送失败时按退避时间重试，长消息分段发送时只重试失败的分段
+    2、带合并键的消息在队列中等待合并时间，期间到达的同类消息合并为一条汇总消息
+    3、统计队列长度、发送结果及消息从入队到发送完成的耗时
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._name = client.get("name")
+        self._queue = deque()
+        self._cond = Condition()
+        self._stopped = False
+        self._stats = {
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "latency": 0,
+            "max_latency": 0
+        }
+        self._stats_lock = Lock()
+        self._thread = Thread(target=self.__run, name=f"Message-{self._name}", daemon=True)
+        self._thread.start()
+
+    def put(self, title, text="", image="", url="", user_id="", medias=None, coalesce=None, digest=None):
+        """
+        消息入队
+        :param title: 消息标题
+        :param text: 消息内容
+        :param image: 图片URL
+        :param url: 消息跳转地址
+        :param user_id: 用户ID，如有则只发给这个用户
+        :param medias: 媒体信息列表，有值时按列表选择消息发送
+        :param coalesce: 合并键，同一合并键的消息在合并时间内合并发送
+        :param digest: 合并后的消息标题，%s 为合并的消息数
+        """
+        now = time.time()
+        with self._cond:
+            if coalesce:
+                for item in self._queue:
+                    if item.get("coalesce") == coalesce:
+                        item.get("messages").append({"title": title, "text": text})
+                        self.__count(queued=1, coalesced=1)
+                        return
+            if len(self._queue) >= MESSAGE_QUEUE_MAXSIZE:
+                self._queue.popleft()
+                self.__count(dropped=1)
+                log.warn(f"【Message】{self._name} 待发送消息过多，已丢弃最早的消息")
+            self._queue.append({
+                "messages": [{"title": title, "text": text}],
+                "image": image,
+                "url": url,
+                "user_id": user_id,
+                "medias": medias,
+                "coalesce": coalesce,
+                "digest": digest,
+                "created": now,
+                "due": now + MESSAGE_COALESCE_DELAY if coalesce else now
+            })
+            self.__count(queued=1)
+            self._cond.notify()
+
+    def stop(self):
+        """
+        停止发送线程，队列中的消息发送完后退出
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def get_stats(self):
+        """
+        获取发送统计
+        :return: {"depth": 排队中的消息数, "queued": 入队数, "sent": 发送成功数, "failed": 发送失败数,
+                  "retried": 重试次数, "coalesced": 被合并的消息数, "dropped": 丢弃数,
+                  "avg_latency": 平均耗时（秒）, "max_latency": 最大耗时（秒）}
+        """
+        with self._cond:
+            depth = len(self._queue)
+        with self._stats_lock:
+            stats = dict(self._stats)
+        latency = stats.pop("latency")
+        finished = stats.get("sent") + stats.get("failed")
+        stats["avg_latency"] = round(latency / finished, 3) if finished else 0
+        stats["max_latency"] = round(stats.get("max_latency"), 3)
+        stats["depth"] = depth
+        return stats
+
+    def __count(self, latency=None, **counts):
+        with self._stats_lock:
+            for key, value in counts.items():
+                self._stats[key] += value
+            if latency is not None:
+                self._stats["latency"] += latency
+                self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+
+    def __run(self):
+        while True:
+            with self._cond:
+                while True:
+                    wait_time = None
+                    if self._queue:
+                        wait_time = self._queue[0].get("due") - time.time()
+                        if wait_time <= 0 or self._stopped:
+                            item = self._queue.popleft()
+                            break
+                    elif self._stopped:
+                        return
+                    self._cond.wait(wait_time)
+            try:
+                state = self.__send_item(item)
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+                state = False
+            latency = time.time() - item.get("created")
+            if state:
+                self.__count(latency=latency, sent=1)
+            else:
+                self.__count(latency=latency, failed=1)
+
+    def __send_item(self, item):
+        """
+        发送一条队列中的消息，合并的消息汇总为标题列表
+        """
+        messages = item.get("messages")
+        if len(messages) > 1:
+            title = item.get("digest") % len(messages)
+            text = "\n".join([message.get("title") for message in messages])
+        else:
+            title = messages[0].get("title")
+            text = messages[0].get("text")
+        client = self._client.get("client")
+        if item.get("medias"):
+            state, ret_msg = self.__retry(lambda: client.send_list_msg(medias=item.get("medias"),
+                                                                       user_id=item.get("user_id"),
+                                                                       title=title,
+                                                                       url=item.get("url")))
+            if not state:
+                log.error(f"【Message】{self._name} 发送消息失败：%s" % ret_msg)
+            return state
+        # 消息内容分段
+        max_length = self._client.get("max_length")
+        if max_length:
+            texts = StringUtils.split_text(text, max_length)
+        else:
+            texts = [text]
+        # 循环发送
+        for txt in texts:
+            if not title:
+                title = txt
+                txt = ""
+            state, ret_msg = self.__retry(lambda: client.send_msg(title=title,
+                                                                  text=txt,
+                                                                  image=item.get("image"),
+                                                                  url=item.get("url"),
+                                                                  user_id=item.get("user_id")))
+            title = None
+            if not state:
+                log.error(f"【Message】{self._name} 消息发送失败：%s" % ret_msg)
+                return state
+        return True
+
+    def __retry(self, func):
+        """
+        发送失败时按退避时间重试
+        :return: 发送状态、错误信息
+        """
+        state, ret_msg = False, ""
+        for retry_count in range(MESSAGE_SEND_RETRIES + 1):
+            if retry_count:
+                self.__count(retried=1)
+                time.sleep(MESSAGE_RETRY_BACKOFF * 2 ** (retry_count - 1))
+            try:
+                state, ret_msg = func()
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+                state, ret_msg = False, str(e)
+            if state:
+                break
+        return state, ret_msg
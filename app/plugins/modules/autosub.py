@@ -15,7 +15,7 @@ from lxml import etree
 from app.helper import FfmpegHelper
 from app.helper.openai_helper import OpenAiHelper
 from app.plugins.modules._base import _IPluginModule
-from app.utils import SystemUtils
+from app.utils import SystemUtils, PathUtils
 from config import RMT_MEDIAEXT
 
 
@@ -617,16 +617,9 @@ class AutoSub(_IPluginModule):
             yield in_path
             return
 
-        for root, dirs, files in os.walk(in_path):
-            if exclude_path and any(os.path.abspath(root).startswith(os.path.abspath(path))
-                                    for path in exclude_path.split(",")):
-                continue
-
-            for file in files:
-                cur_path = os.path.join(root, file)
-                # 检查后缀
-                if os.path.splitext(file)[-1].lower() in RMT_MEDIAEXT:
-                    yield cur_path
+        yield from PathUtils.iter_dir_files(in_path=in_path,
+                                            exts=RMT_MEDIAEXT,
+                                            exclude_paths=exclude_path.split(",") if exclude_path else None)
 
     @staticmethod
     def __load_srt(file_path):
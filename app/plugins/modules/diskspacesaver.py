@@ -2,6 +2,7 @@ import datetime
 import hashlib
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from app.plugins.modules._base import _IPluginModule
 from app.utils import SystemUtils
@@ -32,6 +33,8 @@ class DiskSpaceSaver(_IPluginModule):
     # 私有属性
     _path = ''
     _size = 100
+    # 同时计算SHA1的文件数
+    _hash_threads = 4
 
     @staticmethod
     def get_fields():
@@ -209,67 +212,132 @@ class DiskSpaceSaver(_IPluginModule):
                     h.update(buffer_view[:n])
         return h.hexdigest()
 
-    def find_duplicates(self, folder_path, _ext_list, _file_size, last_result, fast=False):
+    def __scan_files(self, folder_path, _ext_list, min_size):
         """
-        查找重复的文件，返回字典，key 为文件的 SHA1 值，value 为文件路径的列表
+        遍历目录，每个文件只stat一次，返回符合后缀和大小的文件信息
         """
-        duplicates = {}
-        file_group_by_size = {}
-        # 先进行依次过滤
-        for dirpath, dirnames, filenames in os.walk(folder_path):
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                file_ext = os.path.splitext(file_path)[1]
-                file_size = os.path.getsize(file_path)
+        files = []
+        try:
+            entries = list(os.scandir(folder_path))
+        except OSError as err:
+            self.warn(f"磁盘空间释放 无法读取目录 {folder_path}：{str(err)}")
+            return files
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    files.extend(self.__scan_files(entry.path, _ext_list, min_size))
+                    continue
+                if not entry.is_file():
+                    continue
+                file_ext = os.path.splitext(entry.name)[1]
                 if file_ext.lower() not in _ext_list:
                     continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            if stat.st_size < min_size:
+                continue
+            files.append({'filePath': entry.path,
+                          'fileSize': stat.st_size,
+                          'fileModifyTime': str(datetime.datetime.fromtimestamp(stat.st_mtime)),
+                          'inode': (stat.st_dev, stat.st_ino)})
+        return files
 
-                if os.path.getsize(file_path) < _file_size * 1024 * 1024:
-                    continue
-                file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-                if file_group_by_size.get(file_size) is None:
-                    file_group_by_size[file_size] = []
+    def __hash_files(self, file_list, file_index, key, fast):
+        """
+        计算文件SHA1，路径、大小、修改时间与上次结果一致时直接使用上次结果，其余文件并行计算
+        :param key: 结果中保存SHA1的字段，fileSha1为整体SHA1，fileFastSha1为头部/中间/尾部SHA1
+        :return: {文件路径: SHA1}
+        """
+        hashes = {}
+        to_hash = []
+        for file_info in file_list:
+            file_path = file_info['filePath']
+            info = file_index.get(file_path)
+            if info \
+                    and info.get('fileSize') == file_info['fileSize'] \
+                    and info.get('fileModifyTime') == file_info['fileModifyTime'] \
+                    and info.get(key):
+                self.debug(f'磁盘空间释放 文件 {file_path} 的大小和修改时间与上次处理结果一致，直接使用上次处理结果')
+                hashes[file_path] = info.get(key)
+            else:
+                to_hash.append(file_info)
 
-                file_group_by_size[file_size].append(
-                    {'filePath': file_path, 'fileExt': file_ext, 'fileSize': file_size,
-                     'fileModifyTime': str(file_mtime)})
+        def hash_file(_file_info):
+            _file_path = _file_info['filePath']
+            self.info(f'磁盘空间释放 计算文件 {_file_path} 的 {"快速" if fast else ""}SHA1 值')
+            try:
+                return _file_info, self.get_sha1(_file_path, fast=fast)
+            except OSError as e:
+                self.warn(f'磁盘空间释放 计算文件 {_file_path} 的 SHA1 值失败：{str(e)}')
+                return _file_info, None
 
-        # 循环 file_group_by_size
-        for file_size, file_list in file_group_by_size.items():
-            # 如果文件数量大于1，进行sha1计算
-            if len(file_list) <= 1:
-                # 没有大小一样的 不需要处理
-                self.debug(f'磁盘空间释放 {file_list[0]["filePath"]} 大小相同的文件数量为1，无需计算sha1')
-                continue
-            for file_info in file_list:
-                file_path = file_info['filePath']
-                file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-                file_size = os.path.getsize(file_path)
-                sha1 = None
+        if to_hash:
+            with ThreadPoolExecutor(max_workers=self._hash_threads) as executor:
+                for file_info, sha1 in executor.map(hash_file, to_hash):
+                    if not sha1:
+                        continue
+                    file_path = file_info['filePath']
+                    hashes[file_path] = sha1
+                    info = file_index.get(file_path)
+                    if not info \
+                            or info.get('fileSize') != file_info['fileSize'] \
+                            or info.get('fileModifyTime') != file_info['fileModifyTime']:
+                        info = {'filePath': file_path,
+                                'fileSize': file_info['fileSize'],
+                                'fileModifyTime': file_info['fileModifyTime']}
+                        file_index[file_path] = info
+                    info[key] = sha1
+        return hashes
 
-                # 查找是否存在相同路径的文件
-                for info in last_result['file_info']:
-                    if file_path == info['filePath']:
-                        # 如果文件大小和修改时间都一致，则直接使用之前计算的 sha1 值
-                        if file_size == info['fileSize'] and str(file_mtime) == info['fileModifyTime']:
-                            self.info(
-                                f'磁盘空间释放 文件 {file_path} 的大小和修改时间与上次处理结果一致，直接使用上次处理结果')
-                            sha1 = info['fileSha1']
-                        break
+    @staticmethod
+    def __group_candidates(file_list, hashes=None):
+        """
+        按大小（及SHA1）分组，只保留有两个以上文件的组
+        """
+        groups = {}
+        for file_info in file_list:
+            if hashes is None:
+                group_key = file_info['fileSize']
+            else:
+                sha1 = hashes.get(file_info['filePath'])
+                if not sha1:
+                    continue
+                group_key = (file_info['fileSize'], sha1)
+            groups.setdefault(group_key, []).append(file_info)
+        return [group for group in groups.values() if len(group) > 1]
 
-                if sha1 is None:
-                    self.info(f'磁盘空间释放 计算文件 {file_path} 的 SHA1 值')
-                    sha1 = self.get_sha1(file_path, fast=fast)
-                    file_info = {'filePath': file_path,
-                                 'fileSize': file_size,
-                                 'fileModifyTime': str(file_mtime),
-                                 'fileSha1': sha1}
-                    last_result['file_info'].append(file_info)
+    def find_duplicates(self, folder_path, _ext_list, _file_size, last_result, fast=False):
+        """
+        查找重复的文件，返回字典，key 为文件的 SHA1 值，value 为文件路径的列表
+        依次按大小、头部/中间/尾部SHA1、整体SHA1筛选，已是硬链接的文件只计算一次
+        """
+        # 上次处理结果按路径建立索引
+        file_index = {info.get('filePath'): info for info in last_result['file_info']}
+        # 遍历文件
+        files = self.__scan_files(folder_path, _ext_list, _file_size * 1024 * 1024)
+        self.info(f'磁盘空间释放 {folder_path} 共有 {len(files)} 个符合条件的文件')
+        # 同一inode的文件已是硬链接，只取一个参与比较
+        inodes = {}
+        for file_info in files:
+            inodes.setdefault(file_info['inode'], []).append(file_info)
+        # 大小相同的文件才可能重复
+        candidates = [file_info for group in self.__group_candidates([links[0] for links in inodes.values()])
+                      for file_info in group]
+        self.info(f'磁盘空间释放 大小相同的文件共有 {len(candidates)} 个')
+        # 头部/中间/尾部SHA1相同的文件才需要计算整体SHA1
+        hashes = self.__hash_files(candidates, file_index, 'fileFastSha1', fast=True)
+        candidates = [file_info for group in self.__group_candidates(candidates, hashes) for file_info in group]
+        if not fast:
+            self.info(f'磁盘空间释放 快速SHA1相同的文件共有 {len(candidates)} 个，计算整体SHA1')
+            hashes = self.__hash_files(candidates, file_index, 'fileSha1', fast=False)
+        last_result['file_info'] = list(file_index.values())
 
-                if sha1 in duplicates:
-                    duplicates[sha1].append(file_path)
-                else:
-                    duplicates[sha1] = [file_path]
+        # 重复的文件还原为同一inode的所有路径，所有硬链接都要替换才能释放空间
+        duplicates = {}
+        for group in self.__group_candidates(candidates, hashes):
+            duplicates[hashes.get(group[0]['filePath'])] = [link['filePath'] for file_info in group
+                                                            for link in inodes.get(file_info['inode'])]
         return duplicates
 
     def process_duplicates(self, duplicates, dry_run=False):
@@ -1,7 +1,11 @@
+import json
+import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
-from threading import Event
+from threading import Event, Lock
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -69,12 +73,22 @@ class IYUUAutoSeed(_IPluginModule):
     # 待校全种子hash清单
     _recheck_torrents = {}
     _is_recheck_running = False
-    # 辅种缓存，出错的种子不再重复辅种，可清除
-    _error_caches = []
-    # 辅种缓存，辅种成功的种子，可清除
-    _success_caches = []
-    # 辅种缓存，出错的种子不再重复辅种，且无法清除。种子被删除404等情况
-    _permanent_error_caches = []
+    # 辅种缓存 {类型: {种子hash: 缓存时间}}，类型：
+    # checked 已查询过IYUU的种子，到期前不再查询；success 辅种成功的种子；error 出错的种子，不再重复辅种，可清除；
+    # permanent_error 出错的种子，不再重复辅种，且无法清除，种子被删除404等情况
+    _caches = {}
+    # 各类缓存的有效期（天），为空则不过期
+    _cache_expires = {
+        "checked": 7,
+        "success": 30,
+        "error": 7,
+        "permanent_error": None
+    }
+    _cache_lock = Lock()
+    # 计数及校验清单锁
+    _lock = Lock()
+    # 同时辅种的站点数，同一站点的种子依次添加
+    _seed_threads = 5
     # 辅种计数
     total = 0
     realtotal = 0
@@ -197,7 +211,7 @@ class IYUUAutoSeed(_IPluginModule):
                         {
                             'title': '下一次运行时清除缓存',
                             'required': "",
-                            'tooltip': '打开后下一次运行前会先清除辅种缓存，辅种出错的种子会重新尝试辅种，此开关仅生效一次',
+                            'tooltip': '打开后下一次运行前会先清除辅种缓存，所有种子会重新查询，辅种出错的种子会重新尝试辅种，此开关仅生效一次',
                             'type': 'switch',
                             'id': 'clearcache',
                         }
@@ -220,9 +234,7 @@ class IYUUAutoSeed(_IPluginModule):
             self._notify = config.get("notify")
             self._nolabels = config.get("nolabels")
             self._clearcache = config.get("clearcache")
-            self._permanent_error_caches = config.get("permanent_error_caches") or []
-            self._error_caches = [] if self._clearcache else config.get("error_caches") or []
-            self._success_caches = [] if self._clearcache else config.get("success_caches") or []
+            self.__load_caches(config)
         # 停止现有任务
         self.stop_service()
 
@@ -363,12 +375,98 @@ class IYUUAutoSeed(_IPluginModule):
             "downloaders": self._downloaders,
             "sites": self._sites,
             "notify": self._notify,
-            "nolabels": self._nolabels,
-            "success_caches": self._success_caches,
-            "error_caches": self._error_caches,
-            "permanent_error_caches": self._permanent_error_caches
+            "nolabels": self._nolabels
         })
 
+    def __get_cache_path(self):
+        return os.path.join(self.get_data_path(), "caches.json")
+
+    def __load_caches(self, config):
+        """
+        加载辅种缓存，丢弃已过期的记录，并迁移旧版本保存在配置中的缓存
+        """
+        caches = {}
+        cache_path = self.__get_cache_path()
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    caches = json.load(f) or {}
+            except Exception as err:
+                self.warn(f"读取辅种缓存失败：{str(err)}")
+        now = time.time()
+        migrated = False
+        for cache_type in self._cache_expires.keys():
+            cache = caches.get(cache_type) or {}
+            for hash_str in config.get(f"{cache_type}_caches") or []:
+                cache.setdefault(hash_str, now)
+                migrated = True
+            if self._clearcache and cache_type != "permanent_error":
+                cache = {}
+            caches[cache_type] = cache
+        with self._cache_lock:
+            self._caches = caches
+            self.__expire_caches()
+        if migrated:
+            self.__save_caches()
+            self.__update_config()
+
+    def __expire_caches(self):
+        """
+        清除过期的缓存记录，需在锁内调用
+        """
+        now = time.time()
+        for cache_type, expire_days in self._cache_expires.items():
+            if not expire_days:
+                continue
+            cache = self._caches.get(cache_type) or {}
+            self._caches[cache_type] = {hash_str: cache_time for hash_str, cache_time in cache.items()
+                                        if now - cache_time < expire_days * 86400}
+
+    def __save_caches(self):
+        """
+        保存辅种缓存
+        """
+        with self._cache_lock:
+            self.__expire_caches()
+            data = json.dumps(self._caches)
+        try:
+            with open(self.__get_cache_path(), 'w') as f:
+                f.write(data)
+        except Exception as err:
+            self.warn(f"保存辅种缓存失败：{str(err)}")
+
+    def __is_cached(self, hash_str, *cache_types):
+        """
+        种子是否在任一类型的缓存中且未过期
+        """
+        now = time.time()
+        with self._cache_lock:
+            for cache_type in cache_types:
+                cache_time = (self._caches.get(cache_type) or {}).get(hash_str)
+                if cache_time is None:
+                    continue
+                expire_days = self._cache_expires.get(cache_type)
+                if not expire_days or now - cache_time < expire_days * 86400:
+                    return True
+        return False
+
+    def __add_cache(self, hash_str, cache_type):
+        """
+        加入缓存
+        """
+        if not hash_str:
+            return
+        with self._cache_lock:
+            self._caches.setdefault(cache_type, {})[hash_str] = time.time()
+
+    def __count(self, **kwargs):
+        """
+        更新辅种计数
+        """
+        with self._lock:
+            for key, value in kwargs.items():
+                setattr(self, key, getattr(self, key) + value)
+
     def auto_seed(self):
         """
         开始辅种
@@ -398,15 +496,24 @@ class IYUUAutoSeed(_IPluginModule):
             else:
                 self.info(f"下载器 {downloader} 没有已完成种子")
                 continue
+            # 下载器中全部种子的Hash，用于判断辅种是否已存在
+            all_torrents = self.downloader.get_torrents(downloader_id=downloader)
+            exist_hashs = set(self.__get_hash(torrent, downloader_type)
+                              for torrent in all_torrents) if all_torrents is not None else None
             hash_strs = []
+            checked_count = 0
             for torrent in torrents:
                 if self._event.is_set():
                     self.info(f"辅种服务停止")
                     return
                 # 获取种子hash
                 hash_str = self.__get_hash(torrent, downloader_type)
-                if hash_str in self._error_caches or hash_str in self._permanent_error_caches:
-                    self.info(f"种子 {hash_str} 辅种失败且已缓存，跳过 ...")
+                if self.__is_cached(hash_str, "error", "permanent_error"):
+                    self.debug(f"种子 {hash_str} 辅种失败且已缓存，跳过 ...")
+                    continue
+                # 近期已查询过的种子不再查询
+                if self.__is_cached(hash_str, "checked"):
+                    checked_count += 1
                     continue
                 save_path = self.__get_save_path(torrent, downloader_type)
                 # 获取种子标签
@@ -424,6 +531,8 @@ class IYUUAutoSeed(_IPluginModule):
                     "hash": hash_str,
                     "save_path": save_path
                 })
+            if checked_count:
+                self.info(f"{checked_count} 个种子近期已查询过辅种，跳过 ...")
             if hash_strs:
                 self.info(f"总共需要辅种的种子数：{len(hash_strs)}")
                 # 分组处理，减少IYUU Api请求次数
@@ -433,13 +542,19 @@ class IYUUAutoSeed(_IPluginModule):
                     chunk = hash_strs[i:i + chunk_size]
                     # 处理分组
                     self.__seed_torrents(hash_strs=chunk,
-                                         downloader=downloader)
+                                         downloader=downloader,
+                                         exist_hashs=exist_hashs)
+                    # 保存缓存，中途停止时已处理的部分不再重复查询
+                    self.__save_caches()
+                    if self._event.is_set():
+                        self.info(f"辅种服务停止")
+                        return
                 # 触发校验检查
                 self.check_recheck()
             else:
                 self.info(f"没有需要辅种的种子")
         # 保存缓存
-        self.__update_config()
+        self.__save_caches()
         # 发送消息
         if self._notify:
             if self.success or self.fail:
@@ -495,37 +610,39 @@ class IYUUAutoSeed(_IPluginModule):
                 self._recheck_torrents[downloader] = []
         self._is_recheck_running = False
 
-    def __seed_torrents(self, hash_strs: list, downloader):
+    def __seed_torrents(self, hash_strs: list, downloader, exist_hashs=None):
         """
-        执行一批种子的辅种
+        执行一批种子的辅种，不同站点的种子并行添加，同一站点的种子依次添加以遵守站点流控
+        :param exist_hashs: 下载器中已有种子的Hash集合，为None时逐个查询下载器
         """
         if not hash_strs:
             return
         self.info(f"下载器 {downloader} 开始查询辅种，数量：{len(hash_strs)} ...")
         # 下载器中的Hashs
-        hashs = [item.get("hash") for item in hash_strs]
+        hashs = set(item.get("hash") for item in hash_strs)
         # 每个Hash的保存目录
         save_paths = {}
         for item in hash_strs:
             save_paths[item.get("hash")] = item.get("save_path")
         # 查询可辅种数据
-        seed_list, msg = self.iyuuhelper.get_seed_info(hashs)
+        seed_list, msg = self.iyuuhelper.get_seed_info([item.get("hash") for item in hash_strs])
         if not isinstance(seed_list, dict):
             self.warn(f"当前种子列表没有可辅种的站点：{msg}")
+            # 查询成功但没有可辅种数据的，不再重复查询
+            if seed_list is not None or "未查询到" in str(msg):
+                for hash_str in hashs:
+                    self.__add_cache(hash_str, "checked")
             return
         else:
             self.info(f"IYUU返回可辅种数：{len(seed_list)}")
-        # 遍历
+        # 按站点分组的辅种任务
+        site_seeds = {}
         for current_hash, seed_info in seed_list.items():
             if not seed_info:
                 continue
             seed_torrents = seed_info.get("torrent")
             if not isinstance(seed_torrents, list):
                 seed_torrents = [seed_torrents]
-
-            # 本次辅种成功的种子
-            success_torrents = []
-
             for seed in seed_torrents:
                 if not seed:
                     continue
@@ -534,26 +651,51 @@ class IYUUAutoSeed(_IPluginModule):
                 if not seed.get("sid") or not seed.get("info_hash"):
                     continue
                 if seed.get("info_hash") in hashs:
-                    self.info(f"{seed.get('info_hash')} 已在下载器中，跳过 ...")
+                    self.debug(f"{seed.get('info_hash')} 已在下载器中，跳过 ...")
+                    continue
+                if self.__is_cached(seed.get("info_hash"), "success"):
+                    self.debug(f"{seed.get('info_hash')} 已处理过辅种，跳过 ...")
                     continue
-                if seed.get("info_hash") in self._success_caches:
-                    self.info(f"{seed.get('info_hash')} 已处理过辅种，跳过 ...")
+                if self.__is_cached(seed.get("info_hash"), "error", "permanent_error"):
+                    self.debug(f"种子 {seed.get('info_hash')} 辅种失败且已缓存，跳过 ...")
                     continue
-                if seed.get("info_hash") in self._error_caches or seed.get("info_hash") in self._permanent_error_caches:
-                    self.info(f"种子 {seed.get('info_hash')} 辅种失败且已缓存，跳过 ...")
+                site_seeds.setdefault(seed.get("sid"), []).append((current_hash, seed))
+
+        def __seed_site(seeds):
+            results = []
+            for _current_hash, _seed in seeds:
+                if self._event.is_set():
+                    results.append((_current_hash, _seed, None))
                     continue
                 # 添加任务
-                success = self.__download_torrent(seed=seed,
-                                                  downloader=downloader,
-                                                  save_path=save_paths.get(current_hash))
-                if success:
-                    success_torrents.append(seed.get("info_hash"))
-
-            # 辅种成功的去重放入历史
-            if len(success_torrents) > 0:
-                self.__save_history(current_hash=current_hash,
-                                    downloader=downloader,
-                                    success_torrents=success_torrents)
+                results.append((_current_hash, _seed, self.__download_torrent(seed=_seed,
+                                                                                downloader=downloader,
+                                                                                save_path=save_paths.get(
+                                                                                    _current_hash),
+                                                                                exist_hashs=exist_hashs)))
+            return results
+
+        # 本次辅种成功的种子
+        success_torrents = {}
+        # 因流控等原因未能处理的种子，下次重新查询
+        retry_hashs = set()
+        if site_seeds:
+            with ThreadPoolExecutor(max_workers=min(len(site_seeds), self._seed_threads)) as executor:
+                for site_results in executor.map(__seed_site, site_seeds.values()):
+                    for current_hash, seed, success in site_results:
+                        if success is None:
+                            retry_hashs.add(current_hash)
+                        elif success:
+                            success_torrents.setdefault(current_hash, []).append(seed.get("info_hash"))
+
+        # 辅种成功的去重放入历史
+        for current_hash, torrents in success_torrents.items():
+            self.__save_history(current_hash=current_hash,
+                                downloader=downloader,
+                                success_torrents=torrents)
+        # 记录已查询的种子
+        for hash_str in hashs - retry_hashs:
+            self.__add_cache(hash_str, "checked")
 
         self.info(f"下载器 {downloader} 辅种完成")
 
@@ -609,7 +751,7 @@ class IYUUAutoSeed(_IPluginModule):
         except Exception as e:
             print(str(e))
 
-    def __download_torrent(self, seed, downloader, save_path):
+    def __download_torrent(self, seed, downloader, save_path, exist_hashs=None):
         """
         下载种子
         torrent: {
@@ -617,15 +759,15 @@ class IYUUAutoSeed(_IPluginModule):
                     "torrent_id": 377467,
                     "info_hash": "a444850638e7a6f6220e2efdde94099c53358159"
                 }
+        :return: 是否成功，因流控未处理时返回None
         """
-        self.total += 1
+        self.__count(total=1)
         # 获取种子站点及下载地址模板
         site_url, download_page = self.iyuuhelper.get_torrent_url(seed.get("sid"))
         if not site_url or not download_page:
             # 加入缓存
-            self._error_caches.append(seed.get("info_hash"))
-            self.fail += 1
-            self.cached += 1
+            self.__add_cache(seed.get("info_hash"), "error")
+            self.__count(fail=1, cached=1)
             return False
         # 查询站点
         site_info = self.sites.get_sites(siteurl=site_url)
@@ -635,27 +777,29 @@ class IYUUAutoSeed(_IPluginModule):
         if self._sites and str(site_info.get("id")) not in self._sites:
             self.info("当前站点不在选择的辅助站点范围，跳过 ...")
             return False
-        self.realtotal += 1
+        self.__count(realtotal=1)
         # 查询hash值是否已经在下载器中
-        torrent_info = self.downloader.get_torrents(downloader_id=downloader,
-                                                    ids=[seed.get("info_hash")])
-        if torrent_info:
+        if exist_hashs is not None:
+            torrent_exists = seed.get("info_hash") in exist_hashs
+        else:
+            torrent_exists = self.downloader.get_torrents(downloader_id=downloader,
+                                                          ids=[seed.get("info_hash")])
+        if torrent_exists:
             self.debug(f"{seed.get('info_hash')} 已在下载器中，跳过 ...")
-            self.exist += 1
+            self.__count(exist=1)
             return False
         # 站点流控
         if self.sites.check_ratelimit(site_info.get("id")):
-            self.fail += 1
-            return False
+            self.__count(fail=1)
+            return None
         # 下载种子
         torrent_url = self.__get_download_url(seed=seed,
                                               site=site_info,
                                               base_url=download_page)
         if not torrent_url:
             # 加入失败缓存
-            self._error_caches.append(seed.get("info_hash"))
-            self.fail += 1
-            self.cached += 1
+            self.__add_cache(seed.get("info_hash"), "error")
+            self.__count(fail=1, cached=1)
             return False
         # 强制使用Https
         torrent_url = f"{torrent_url}&https=1"
@@ -676,21 +820,24 @@ class IYUUAutoSeed(_IPluginModule):
             self.warn(f"添加下载任务出错，"
                       f"错误原因：{retmsg or '下载器添加任务失败'}，"
                       f"种子链接：{torrent_url}")
-            self.fail += 1
+            self.__count(fail=1)
             # 加入失败缓存
             if retmsg and ('无法打开链接' in retmsg or '触发站点流控' in retmsg):
-                self._error_caches.append(seed.get("info_hash"))
+                self.__add_cache(seed.get("info_hash"), "error")
             else:
                 # 种子不存在的情况
-                self._permanent_error_caches.append(seed.get("info_hash"))
+                self.__add_cache(seed.get("info_hash"), "permanent_error")
             return False
         else:
-            self.success += 1
+            self.__count(success=1)
+            if exist_hashs is not None:
+                exist_hashs.add(seed.get("info_hash"))
             # 追加校验任务
             self.info(f"添加校验检查任务：{download_id} ...")
-            if not self._recheck_torrents.get(downloader):
-                self._recheck_torrents[downloader] = []
-            self._recheck_torrents[downloader].append(download_id)
+            with self._lock:
+                if not self._recheck_torrents.get(downloader):
+                    self._recheck_torrents[downloader] = []
+                self._recheck_torrents[downloader].append(download_id)
             # 下载成功
             self.info(f"成功添加辅种下载，站点：{site_info.get('name')}，种子链接：{torrent_url}")
             # TR会自动校验
@@ -700,7 +847,7 @@ class IYUUAutoSeed(_IPluginModule):
                 self.downloader.recheck_torrents(downloader_id=downloader, ids=[download_id])
 
             # 成功也加入缓存，有一些改了路径校验不通过的，手动删除后，下一次又会辅上
-            self._success_caches.append(seed.get("info_hash"))
+            self.__add_cache(seed.get("info_hash"), "success")
             return True
 
     @staticmethod
@@ -1,19 +1,21 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 
 import log
 import traceback
 from app.downloader import Downloader
 from app.filter import Filter
-from app.helper import DbHelper, RssHelper
+from app.helper import DbHelper, RssHelper, WordsHelper
 from app.media import Media
 from app.media.meta import MetaInfo
 from app.sites import Sites, SiteConf
 from app.subscribe import Subscribe
-from app.utils import ExceptionUtils, Torrent
+from app.utils import ExceptionUtils, Torrent, StringUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaType, SearchType
 from app.message import Message
+from config import Config, RSS_FETCH_THREADS, RSS_FETCH_TIMEOUT
 
 lock = Lock()
 
@@ -30,6 +32,7 @@ class Rss:
     rsshelper = None
     subscribe = None
     message = None
+    _fetch_threads = RSS_FETCH_THREADS
 
     def __init__(self):
         self.init_config()
@@ -45,6 +48,13 @@ class Rss:
         self.dbhelper = DbHelper()
         self.rsshelper = RssHelper()
         self.subscribe = Subscribe()
+        pt = Config().get_config('pt') or {}
+        try:
+            self._fetch_threads = int(pt.get('rss_fetch_threads') or RSS_FETCH_THREADS)
+        except (ValueError, TypeError):
+            self._fetch_threads = RSS_FETCH_THREADS
+        if self._fetch_threads < 1:
+            self._fetch_threads = 1
 
     def rssdownload(self):
         """
@@ -108,20 +118,36 @@ class Rss:
             total_num = 0
             rss_download_torrents = []
             rss_no_exists = {}
-            # 遍历站点资源
+            # 订阅、过滤规则、识别词未变化时，跳过各站点上次已处理完成的条目
+            subscribe_fingerprint = StringUtils.md5_hash((rss_movies,
+                                                          rss_tvs,
+                                                          self.filter.rule_version,
+                                                          WordsHelper().words_version))
+            # 有订阅且配置了rssurl的站点
+            fetch_sites = []
             for site_info in rss_sites_info:
                 if not site_info:
                     continue
-                # 站点名称
-                site_name = site_info.get("name")
                 # 没有订阅的站点中的不搜索
-                if check_sites and site_name not in check_sites:
+                if check_sites and site_info.get("name") not in check_sites:
                     continue
+                if not site_info.get("rssurl"):
+                    log.info(f"【Rss】{site_info.get('name')} 未配置rssurl，跳过...")
+                    continue
+                fetch_sites.append(site_info)
+            # 并行下载解析各站点RSS，不再提交新任务，已提交的任务继续执行
+            executor = ThreadPoolExecutor(max_workers=min(len(fetch_sites), self._fetch_threads) or 1)
+            fetch_tasks = [executor.submit(self.rsshelper.parse_rssxml,
+                                           url=site_info.get("rssurl"),
+                                           timeout=RSS_FETCH_TIMEOUT)
+                           for site_info in fetch_sites]
+            executor.shutdown(wait=False)
+            # 按站点顺序依次处理RSS结果
+            for site_info, fetch_task in zip(fetch_sites, fetch_tasks):
+                # 站点名称
+                site_name = site_info.get("name")
                 # 站点rss链接
                 rss_url = site_info.get("rssurl")
-                if not rss_url:
-                    log.info(f"【Rss】{site_name} 未配置rssurl，跳过...")
-                    continue
                 # 站点信息
                 site_id = site_info.get("id")
                 site_cookie = site_info.get("cookie")
@@ -132,13 +158,17 @@ class Rss:
                 site_proxy = site_info.get("proxy")
                 # 使用的规则
                 site_fliter_rule = site_info.get("rule")
-                # 开始下载RSS
+                # 等待RSS下载完成
                 log.info(f"【Rss】正在处理：{site_name}")
                 if site_info.get("pri"):
                     site_order = 100 - int(site_info.get("pri"))
                 else:
                     site_order = 0
-                rss_acticles = self.rsshelper.parse_rssxml(url=rss_url)
+                try:
+                    rss_acticles = fetch_task.result()
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    rss_acticles = []
                 if rss_acticles is None:
                     # RSS链接过期
                     log.error(f"【Rss】站点 {site_name} RSS链接已过期，请重新获取！")
@@ -152,6 +182,13 @@ class Rss:
                     continue
                 else:
                     log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}")
+                # 上次已处理完成的条目
+                rss_fingerprint = StringUtils.md5_hash((subscribe_fingerprint, site_info))
+                seen_articles = self.rsshelper.get_seen_articles(rss_url, rss_fingerprint)
+                # 本次已处理完成的条目：已订阅过、不在订阅范围、已加入下载
+                done_articles = set()
+                # 待登记处理历史的资源，站点处理结束后批量写入
+                rss_torrents = []
                 # 处理RSS结果
                 res_num = 0
                 for article in rss_acticles:
@@ -164,11 +201,16 @@ class Rss:
                         page_url = article.get('link')
                         # 种子大小
                         size = article.get('size')
+                        # 上次已处理完成
+                        if enclosure in seen_articles:
+                            done_articles.add(enclosure)
+                            continue
                         # 开始处理
                         log.info(f"【Rss】开始处理：{title}")
                         # 检查这个种子是不是下过了
                         if self.rsshelper.is_rssd_by_enclosure(enclosure):
                             log.info(f"【Rss】{title} 已成功订阅过")
+                            done_articles.add(enclosure)
                             continue
                         # 识别种子名称，开始搜索TMDB
                         media_info = MetaInfo(title=title)
@@ -209,6 +251,10 @@ class Rss:
 
                         # 未匹配
                         if not match_flag:
+                            # 已识别出TMDB信息且不在订阅范围内的不再处理，未识别出的下次重新识别，
+                            # 不符合过滤条件的促销等可能变化，下次仍需检查
+                            if not match_info and media_info.tmdb_id:
+                                done_articles.add(enclosure)
                             continue
 
                         # 非模糊匹配命中，检查本地情况，检查删除订阅
@@ -242,8 +288,9 @@ class Rss:
                         # 设置下载参数
                         media_info.set_download_info(download_setting=match_info.get("download_setting"),
                                                      save_path=match_info.get("save_path"))
-                        # 插入数据库历史记录
-                        self.rsshelper.insert_rss_torrents(media_info)
+                        # 记录待插入的数据库历史记录
+                        rss_torrents.append(media_info)
+                        done_articles.add(enclosure)
                         # 加入下载列表
                         __update_no_exist(match_info.get("id"), media_info, match_info, no_exists)
                         res_num = res_num + 1
@@ -252,6 +299,14 @@ class Rss:
                         ExceptionUtils.exception_traceback(e)
                         log.error("【Rss】处理RSS发生错误：%s" % str(e))
                         continue
+                # 插入数据库历史记录
+                if rss_torrents:
+                    with self.dbhelper.batch():
+                        for media_info in rss_torrents:
+                            self.rsshelper.insert_rss_torrents(media_info)
+                self.rsshelper.set_seen_articles(rss_url, rss_fingerprint, done_articles)
+                if seen_articles:
+                    log.info("【Rss】%s 跳过上次已处理的 %s 条数据" % (site_name, len(seen_articles & done_articles)))
                 log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源" % (site_name, res_num))
             log.info("【Rss】所有RSS处理结束，共 %s 个有效资源" % len(rss_download_torrents))
             for rid, item in rss_items.items():
@@ -11,13 +11,13 @@ from lxml import etree
 import log
 from app.downloader import Downloader
 from app.filter import Filter
-from app.helper import DbHelper, RssHelper
+from app.helper import DbHelper, RssHelper, WordsHelper
 from app.media import Media
 from app.media.meta import MetaInfo
 from app.message import Message
 from app.searcher import Searcher
 from app.subscribe import Subscribe
-from app.utils import RequestUtils, StringUtils, ExceptionUtils
+from app.utils import StringUtils, ExceptionUtils
 from app.utils.commons import singleton
 from app.utils.types import MediaType, SearchType, RssType
 from config import Config
@@ -189,6 +189,8 @@ class RssChecker(object):
         rss_subscribe_torrents = []
         # 需要搜索的项目
         rss_search_torrents = []
+        # 待登记处理历史的订阅项目
+        rss_history_torrents = []
         # 任务信息
         taskinfo = self.get_rsstask_info(taskid)
         if not taskinfo:
@@ -199,6 +201,14 @@ class RssChecker(object):
             return
         else:
             log.info("【RssChecker】%s 获取数据：%s" % (taskinfo.get("name"), len(rss_result)))
+        # 任务配置、过滤规则、识别词未变化时，跳过上次已处理完成的条目
+        rss_fingerprint = StringUtils.md5_hash(({k: v for k, v in taskinfo.items()
+                                                 if k not in ["update_time", "counter"]},
+                                                self.filter.rule_version,
+                                                WordsHelper().words_version))
+        seen_articles = self.rsshelper.get_seen_articles(f"userrss_{taskid}", rss_fingerprint)
+        # 本次已处理完成的条目
+        done_articles = set()
         # 处理RSS结果
         res_num = 0
         for res in rss_result:
@@ -207,6 +217,11 @@ class RssChecker(object):
                 title = res.get('title')
                 if not title:
                     continue
+                # 上次已处理完成
+                article_key = res.get('enclosure') or title
+                if article_key in seen_articles:
+                    done_articles.add(article_key)
+                    continue
                 # 种子链接
                 enclosure = res.get('enclosure')
                 # 种子页面
@@ -229,6 +244,7 @@ class RssChecker(object):
                 # 检查是否已处理过
                 if self.is_article_processed(task_type, title, year, enclosure):
                     log.info("【RssChecker】%s 已处理过" % title)
+                    done_articles.add(article_key)
                     continue
 
                 if task_type == "D":
@@ -284,7 +300,7 @@ class RssChecker(object):
                     }
                     match_flag, res_order, match_msg = self.filter.check_torrent_filter(meta_info=media_info,
                                                                                         filter_args=filter_args)
-                    # 未匹配
+                    # 未匹配，过滤条件中的促销、做种数等可能变化，下次仍需检查
                     if not match_flag:
                         log.info(f"【RssChecker】{match_msg}")
                         continue
@@ -323,7 +339,7 @@ class RssChecker(object):
                     }
                     match_flag, _, match_msg = self.filter.check_torrent_filter(meta_info=media_info,
                                                                                 filter_args=filter_args)
-                    # 未匹配
+                    # 未匹配，过滤条件中的促销、做种数等可能变化，下次仍需检查
                     if not match_flag:
                         log.info(f"【RssChecker】{match_msg}")
                         continue
@@ -334,11 +350,13 @@ class RssChecker(object):
                                                        season=media_info.get_season_string()):
                         log.info(
                             f"【RssChecker】{media_info.get_title_string()}{media_info.get_season_string()} 已订阅过")
+                        done_articles.add(article_key)
                         continue
                     # 订阅meta_name存enclosure与下载区别
                     media_info.set_torrent_info(enclosure=meta_name)
-                    # 添加处理历史
-                    self.rsshelper.insert_rss_torrents(media_info)
+                    # 记录待添加的处理历史
+                    rss_history_torrents.append(media_info)
+                    done_articles.add(article_key)
                     if media_info not in rss_subscribe_torrents:
                         rss_subscribe_torrents.append(media_info)
                         res_num = res_num + 1
@@ -348,8 +366,14 @@ class RssChecker(object):
                 log.error("【Rss】处理RSS发生错误：" + "".join(traceback.format_exception(e)))
                 continue
         log.info("【RssChecker】%s 处理结束，匹配到 %s 个有效资源" % (taskinfo.get("name"), res_num))
+        # 添加处理历史
+        if rss_history_torrents:
+            with self.dbhelper.batch():
+                for media_info in rss_history_torrents:
+                    self.rsshelper.insert_rss_torrents(media_info)
         # 添加下载
         if rss_download_torrents:
+            downloads = []
             for media in rss_download_torrents:
                 downloader_id, ret, ret_msg = self.downloader.download(
                     media_info=media,
@@ -358,14 +382,15 @@ class RssChecker(object):
                     in_from=SearchType.USERRSS,
                     proxy=taskinfo.get("proxy"))
                 if ret:
-                    # 下载类型的 这里下载成功了 插入数据库
-                    self.rsshelper.insert_rss_torrents(media)
-                    # 登记自定义RSS任务下载记录
-                    downloader_name = self.downloader.get_downloader_conf(downloader_id).get("name")
-                    self.dbhelper.insert_userrss_task_history(taskid, media.org_string, downloader_name)
+                    # 下载成功后才标记为已处理，下载失败的下次仍需处理
+                    done_articles.add(media.enclosure)
+                    downloads.append((media, self.downloader.get_downloader_conf(downloader_id).get("name")))
                 else:
                     log.error("【RssChecker】添加下载任务 %s 失败：%s" % (
                         media.get_title_string(), ret_msg or "请检查下载任务是否已存在"))
+            # 下载类型的 下载成功的插入数据库
+            self.__insert_download_history(taskid, downloads)
+        self.rsshelper.set_seen_articles(f"userrss_{taskid}", rss_fingerprint, done_articles)
         # 添加订阅
         if rss_subscribe_torrents:
             for media in rss_subscribe_torrents:
@@ -438,16 +463,22 @@ class RssChecker(object):
                     log.error(f"【RssChecker】任务 {task_name} 配置解析器 {parser_name} 附加参数不合法")
                     continue
                 rss_url = "%s?%s" % (rss_url, param_url) if rss_url.find("?") == -1 else "%s&%s" % (rss_url, param_url)
-            # 请求数据
+            # 请求数据，内容未变化时直接使用上次的解析结果
+            feed_key = StringUtils.md5_hash((rss_url, rss_parser, i))
             try:
-                ret = RequestUtils(proxies=Config().get_proxies() if taskinfo.get("proxy") else None
-                                   ).get_res(rss_url)
+                ret, last_result = self.rsshelper.request_feed(url=rss_url,
+                                                               proxy=taskinfo.get("proxy"),
+                                                               feed_key=feed_key)
                 if not ret:
                     continue
+                if last_result is not None:
+                    rss_result += last_result
+                    continue
                 ret.encoding = ret.apparent_encoding
             except Exception as e2:
                 ExceptionUtils.exception_traceback(e2)
                 continue
+            url_result = []
             # 解析数据 XPATH
             if rss_parser.get("type") == "XML":
                 try:
@@ -469,10 +500,11 @@ class RssChecker(object):
                             if value:
                                 rss_item.update({key: value[0]})
                         rss_item.update({"address_index": i+1})
-                        rss_result.append(rss_item)
+                        url_result.append(rss_item)
                 except Exception as err:
                     ExceptionUtils.exception_traceback(err)
                     log.error(f"【RssChecker】任务 {task_name} RSS地址 {rss_url} 获取的订阅报文无法解析：{str(err)}")
+                    rss_result += url_result
                     continue
             elif rss_parser.get("type") == "JSON":
                 try:
@@ -497,7 +529,9 @@ class RssChecker(object):
                         if value:
                             rss_item.update({key: value[0]})
                     rss_item.update({"address_index": i+1})
-                    rss_result.append(rss_item)
+                    url_result.append(rss_item)
+            self.rsshelper.save_feed(rss_url, ret, url_result, feed_key=feed_key)
+            rss_result += url_result
         return rss_result
 
     def get_userrss_parser(self, pid=None):
@@ -636,35 +670,42 @@ class RssChecker(object):
         """
         try:
             task_type = self.get_rsstask_info(taskid).get("uses")
-            if flag == "set_finished":
-                for article in articles:
-                    title = article.get("title")
-                    enclosure = article.get("enclosure")
-                    year = article.get("year")
-                    meta_name = f"{title} {year}" if year else title
-                    if not self.is_article_processed(task_type, title, enclosure, year):
-                        if task_type == "D":
-                            self.rsshelper.simple_insert_rss_torrents(meta_name, enclosure)
-                        elif task_type == "R":
-                            self.rsshelper.simple_insert_rss_torrents(meta_name, meta_name)
-            elif flag == "set_unfinish":
-                for article in articles:
-                    title = article.get("title")
-                    enclosure = article.get("enclosure")
-                    year = article.get("year")
-                    meta_name = f"{title} {year}" if year else title
-                    if task_type == "D":
-                        self.rsshelper.simple_delete_rss_torrents(meta_name, enclosure)
-                    elif task_type == "R":
-                        self.rsshelper.simple_delete_rss_torrents(meta_name, meta_name)
-            else:
+            if flag not in ["set_finished", "set_unfinish"]:
                 return False
+            with self.dbhelper.batch():
+                self.__set_articles_state(task_type, flag, articles)
             return True
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             log.error("【RssChecker】设置RSS报文状态时发生错误：%s - %s" % (str(e), traceback.format_exc()))
             return False
 
+    def __set_articles_state(self, task_type, flag, articles):
+        """
+        设置RSS报文的处理状态
+        """
+        if flag == "set_finished":
+            for article in articles:
+                title = article.get("title")
+                enclosure = article.get("enclosure")
+                year = article.get("year")
+                meta_name = f"{title} {year}" if year else title
+                if not self.is_article_processed(task_type, title, enclosure, year):
+                    if task_type == "D":
+                        self.rsshelper.simple_insert_rss_torrents(meta_name, enclosure)
+                    elif task_type == "R":
+                        self.rsshelper.simple_insert_rss_torrents(meta_name, meta_name)
+        elif flag == "set_unfinish":
+            for article in articles:
+                title = article.get("title")
+                enclosure = article.get("enclosure")
+                year = article.get("year")
+                meta_name = f"{title} {year}" if year else title
+                if task_type == "D":
+                    self.rsshelper.simple_delete_rss_torrents(meta_name, enclosure)
+                elif task_type == "R":
+                    self.rsshelper.simple_delete_rss_torrents(meta_name, meta_name)
+
     def download_rss_articles(self, taskid, articles):
         """
         RSS报文下载
@@ -677,26 +718,41 @@ class RssChecker(object):
         taskinfo = self.get_rsstask_info(taskid)
         if not taskinfo:
             return
-        for article in articles:
-            media = self.media.get_media_info(title=article.get("title"))
-            media.set_torrent_info(enclosure=article.get("enclosure"))
-            downloader_id, ret, ret_msg = self.downloader.download(
-                media_info=media,
-                download_dir=taskinfo.get("save_path"),
-                download_setting=taskinfo.get("download_setting"),
-                in_from=SearchType.USERRSS,
-                proxy=taskinfo.get("proxy"))
-            downloader_name = self.downloader.get_downloader_conf(downloader_id).get("name")
-            if ret:
-                # 插入数据库
+        downloads = []
+        try:
+            for article in articles:
+                media = self.media.get_media_info(title=article.get("title"))
+                media.set_torrent_info(enclosure=article.get("enclosure"))
+                downloader_id, ret, ret_msg = self.downloader.download(
+                    media_info=media,
+                    download_dir=taskinfo.get("save_path"),
+                    download_setting=taskinfo.get("download_setting"),
+                    in_from=SearchType.USERRSS,
+                    proxy=taskinfo.get("proxy"))
+                downloader_name = self.downloader.get_downloader_conf(downloader_id).get("name")
+                if ret:
+                    downloads.append((media, downloader_name))
+                else:
+                    log.error("【RssChecker】添加下载任务 %s 失败：%s" % (
+                        media.get_title_string(), ret_msg or "请检查下载任务是否已存在"))
+                    return False
+            return True
+        finally:
+            # 插入数据库
+            self.__insert_download_history(taskid, downloads)
+
+    def __insert_download_history(self, taskid, downloads):
+        """
+        批量插入下载成功的RSS历史记录，并登记自定义RSS任务下载记录
+        :param taskid: 自定义RSS的ID
+        :param downloads: [(媒体信息, 下载器名称)]
+        """
+        if not downloads:
+            return
+        with self.dbhelper.batch():
+            for media, downloader_name in downloads:
                 self.rsshelper.insert_rss_torrents(media)
-                # 登记自定义RSS任务下载记录
                 self.dbhelper.insert_userrss_task_history(taskid, media.org_string, downloader_name)
-            else:
-                log.error("【RssChecker】添加下载任务 %s 失败：%s" % (
-                    media.get_title_string(), ret_msg or "请检查下载任务是否已存在"))
-                return False
-        return True
 
     def get_userrss_mediainfos(self):
         taskinfos = self.dbhelper.get_userrss_tasks()
@@ -7,7 +7,7 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.events import EVENT_JOB_ERROR
 
 import log
-from app.helper import MetaHelper
+from app.helper import MetaHelper, TmdbCacheHelper
 from app.mediaserver import MediaServer
 from app.rss import Rss
 from app.sites import SiteUserInfo
@@ -111,6 +111,7 @@ class Scheduler:
 
         # 元数据定时保存
         self.SCHEDULER.add_job(MetaHelper().save_meta_data, 'interval', seconds=METAINFO_SAVE_INTERVAL)
+        self.SCHEDULER.add_job(TmdbCacheHelper().save_cache_data, 'interval', seconds=METAINFO_SAVE_INTERVAL)
 
         # 定时把队列中的监控文件转移走
         self.SCHEDULER.add_job(Sync().transfer_mon_files, 'interval', seconds=SYNC_TRANSFER_INTERVAL)
@@ -47,10 +47,28 @@ class Searcher:
         :param in_from: 搜索渠道
         :return: 命中的资源媒体信息列表
         """
+        media_list = []
+        for _, result in self.search_medias_iter(key_word=key_word,
+                                                 filter_args=filter_args,
+                                                 match_media=match_media,
+                                                 in_from=in_from):
+            media_list.extend(result)
+        return media_list
+
+    def search_medias_iter(self,
+                           key_word: [str, list],
+                           filter_args: dict,
+                           match_media=None,
+                           in_from: SearchType = None):
+        """
+        根据关键字调用索引器检查媒体，每个站点搜索完成即返回该站点命中的资源
+        参数同 search_medias
+        :return: 逐个站点返回 (站点名称, 命中的资源媒体信息列表)
+        """
         if not key_word:
-            return []
+            return
         if not self.indexer:
-            return []
+            return
         # 触发事件
         self.eventmanager.send_event(EventType.SearchStart, {
             "key_word": key_word,
@@ -58,10 +76,10 @@ class Searcher:
             "filter_args": filter_args,
             "search_type": in_from.value if in_from else None
         })
-        return self.indexer.search_by_keyword(key_word=key_word,
-                                              filter_args=filter_args,
-                                              match_media=match_media,
-                                              in_from=in_from)
+        yield from self.indexer.search_by_keyword_iter(key_word=key_word,
+                                                       filter_args=filter_args,
+                                                       match_media=match_media,
+                                                       in_from=in_from)
 
     def search_one_media(self, media_info: MetaVideo,
                          in_from: SearchType,
@@ -300,14 +300,15 @@ class SiteUserInfo(object):
                 site_user_infos = p.map(self.__refresh_site_data, refresh_sites)
                 site_user_infos = [info for info in site_user_infos if info]
 
-            # 登记历史数据
-            self.dbhelper.insert_site_statistics_history(site_user_infos)
-            # 实时用户数据
-            self.dbhelper.update_site_user_statistics(site_user_infos)
-            # 更新站点图标
-            self.dbhelper.update_site_favicon(site_user_infos)
-            # 实时做种信息
-            self.dbhelper.update_site_seed_info(site_user_infos)
+            with self.dbhelper.batch():
+                # 登记历史数据
+                self.dbhelper.insert_site_statistics_history(site_user_infos)
+                # 实时用户数据
+                self.dbhelper.update_site_user_statistics(site_user_infos)
+                # 更新站点图标
+                self.dbhelper.update_site_favicon(site_user_infos)
+                # 实时做种信息
+                self.dbhelper.update_site_seed_info(site_user_infos)
             # 站点图标重新加载
             self.sites.init_favicons()
 
@@ -425,7 +426,8 @@ class SiteUserInfo(object):
         """
         更新站点数据中的站点名称
         """
-        self.dbhelper.update_site_user_statistics_site_name(name, old_name)
-        self.dbhelper.update_site_seed_info_site_name(name, old_name)
-        self.dbhelper.update_site_statistics_site_name(name, old_name)
+        with self.dbhelper.batch():
+            self.dbhelper.update_site_user_statistics_site_name(name, old_name)
+            self.dbhelper.update_site_seed_info_site_name(name, old_name)
+            self.dbhelper.update_site_statistics_site_name(name, old_name)
         return True
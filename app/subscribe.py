@@ -6,7 +6,7 @@ import log
 from app.conf import SystemConfig
 from app.downloader import Downloader
 from app.filter import Filter
-from app.helper import DbHelper, MetaHelper
+from app.helper import DbHelper, MetaHelper, TmdbCacheHelper
 from app.indexer import Indexer
 from app.media import Media, DouBan
 from app.media.meta import MetaInfo
@@ -28,6 +28,7 @@ lock = Lock()
 class Subscribe:
     dbhelper = None
     metahelper = None
+    tmdbcache = None
     searcher = None
     message = None
     media = None
@@ -44,6 +45,7 @@ class Subscribe:
     def init_config(self):
         self.dbhelper = DbHelper()
         self.metahelper = MetaHelper()
+        self.tmdbcache = TmdbCacheHelper()
         self.searcher = Searcher()
         self.message = Message()
         self.media = Media()
@@ -617,6 +619,8 @@ class Subscribe:
             name = rss_info.get("name")
             year = rss_info.get("year") or ""
             tmdbid = rss_info.get("tmdbid")
+            # 清除TMDB详情缓存，重新查询
+            self.__delete_tmdb_cache(tmdbid)
             # 更新TMDB信息
             media_info = self.__get_media_info(tmdbid=tmdbid,
                                                name=name,
@@ -651,6 +655,8 @@ class Subscribe:
             total = rss_info.get("total")
             total_ep = rss_info.get("total_ep")
             lack = rss_info.get("lack")
+            # 清除TMDB详情缓存（含季的集信息），重新查询
+            self.__delete_tmdb_cache(tmdbid)
             # 更新TMDB信息
             media_info = self.__get_media_info(tmdbid=tmdbid,
                                                name=name,
@@ -689,13 +695,20 @@ class Subscribe:
                         media_info.tmdb_id)
         log.info("【Subscribe】订阅TMDB信息刷新完成")
 
+    def __delete_tmdb_cache(self, tmdbid):
+        """
+        清除TMDBID对应的电影、电视剧及季详情缓存
+        """
+        if tmdbid and not str(tmdbid).startswith("DB:"):
+            self.tmdbcache.delete_cache_by_tmdbid(tmdbid)
+
     def __get_media_info(self, tmdbid, name, year, mtype, cache=True):
         """
         综合返回媒体信息
         """
         if tmdbid and not str(tmdbid).startswith("DB:"):
             media_info = MetaInfo(title="%s %s".strip() % (name, year))
-            tmdb_info = self.media.get_tmdb_info(mtype=mtype, tmdbid=tmdbid)
+            tmdb_info = self.media.get_tmdb_info(mtype=mtype, tmdbid=tmdbid, cache=cache)
             media_info.set_tmdb_info(tmdb_info)
         else:
             media_info = self.media.get_media_info(title="%s %s" % (
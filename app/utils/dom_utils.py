@@ -1,3 +1,6 @@
+from xml.etree import ElementTree
+
+
 class DomUtils:
 
     @staticmethod
@@ -17,6 +20,59 @@ class DomUtils:
                     return firstChild.data
         return default
 
+    @staticmethod
+    def iter_elements(xml_text, tag_name, chunk_size=64 * 1024):
+        """
+        流式解析XML文本，逐个返回指定标签的节点，不构建完整的DOM树，节点返回后即清空
+        :param xml_text: XML文本
+        :param tag_name: 标签名称，带命名空间的标签为 {命名空间URI}标签名，不带命名空间时也匹配默认命名空间下的同名标签（如RSS 1.0）
+        :param chunk_size: 每次送入解析器的字符数
+        """
+        if not xml_text:
+            return
+        parser = ElementTree.XMLPullParser(events=("end",))
+        for pos in range(0, len(xml_text), chunk_size):
+            parser.feed(xml_text[pos:pos + chunk_size])
+            for _, element in parser.read_events():
+                if DomUtils.__match_tag(element.tag, tag_name):
+                    yield element
+                    element.clear()
+        parser.close()
+        for _, element in parser.read_events():
+            if DomUtils.__match_tag(element.tag, tag_name):
+                yield element
+                element.clear()
+
+    @staticmethod
+    def __match_tag(tag, tag_name):
+        """
+        标签名称是否匹配，未指定命名空间时按本地名称匹配
+        """
+        if tag == tag_name:
+            return True
+        return not tag_name.startswith("{") and tag.rsplit("}", 1)[-1] == tag_name
+
+    @staticmethod
+    def element_value(element, tag_name, attname="", default=None):
+        """
+        解析ElementTree节点下的标签值，与tag_value一致只取第一个同名标签，
+        节点在默认命名空间中时（如RSS 1.0）同时匹配该命名空间下的同名标签
+        """
+        tag_names = [tag_name]
+        if element.tag.startswith("{") and not tag_name.startswith("{"):
+            tag_names.append("%s}%s" % (element.tag.split("}", 1)[0], tag_name))
+        for child in element.iter():
+            if child is element or child.tag not in tag_names:
+                continue
+            if attname:
+                attvalue = child.get(attname)
+                if attvalue:
+                    return attvalue
+            elif child.text:
+                return child.text
+            return default
+        return default
+
     @staticmethod
     def add_node(doc, parent, name, value=None):
         """
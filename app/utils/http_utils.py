@@ -1,10 +1,129 @@
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+from threading import Lock
+from urllib.parse import urlparse
+
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
-from config import Config
+from urllib3.util.retry import Retry
+from config import Config, HTTP_POOL_MAXSIZE, HTTP_POOL_TIMEOUT, HTTP_SESSION_MAXSIZE, HTTP_RETRIES, \
+    HTTP_RETRY_BACKOFF, HTTP_RETRY_STATUS
 
 urllib3.disable_warnings(InsecureRequestWarning)
 
+# 连接统计 {scheme://host:port: {"requests": 请求数, "connections": 新建连接数}}
+_connection_stats = {}
+_stats_lock = Lock()
+
+
+def _count_connection(pool, key):
+    """
+    记录连接池的请求及新建连接次数
+    """
+    name = "%s://%s:%s" % (pool.scheme, pool.host, pool.port)
+    with _stats_lock:
+        stats = _connection_stats.setdefault(name, {"requests": 0, "connections": 0})
+        stats[key] += 1
+
+
+class _CountingPoolMixin(object):
+    """
+    统计连接复用情况的连接池，每次取连接计为一次请求，池中无空闲连接时新建连接；
+    连接数达到上限时等待其它请求归还连接，requests不传入等待时间，未指定时使用默认超时，避免无限等待
+    """
+
+    def _get_conn(self, timeout=None):
+        _count_connection(self, "requests")
+        return super()._get_conn(timeout=HTTP_POOL_TIMEOUT if timeout is None else timeout)
+
+    def _new_conn(self):
+        _count_connection(self, "connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, urllib3.HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, urllib3.HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    使用统计连接池的适配器，socks代理沿用其自身的连接池
+    """
+    _pool_classes = {
+        "http": _CountingHTTPConnectionPool,
+        "https": _CountingHTTPSConnectionPool
+    }
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if isinstance(manager, urllib3.ProxyManager):
+            manager.pool_classes_by_scheme = self._pool_classes
+        return manager
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except urllib3.exceptions.EmptyPoolError as e:
+            # 等待空闲连接超时，转换为requests的连接异常，调用方按连接失败处理
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+
+class _SessionPool(object):
+    """
+    按站点及代理共享的会话，复用keep-alive连接；会话不保存响应中的cookie，行为与单次请求一致
+    """
+    _sessions = OrderedDict()
+    _lock = Lock()
+
+    @staticmethod
+    def __build_session():
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        # 只重试连接失败及服务端临时错误，读取超时不重试，避免调用方的超时时间被成倍放大
+        retries = Retry(total=HTTP_RETRIES,
+                        read=0,
+                        backoff_factor=HTTP_RETRY_BACKOFF,
+                        status_forcelist=HTTP_RETRY_STATUS,
+                        raise_on_status=False,
+                        respect_retry_after_header=False)
+        adapter = _PooledAdapter(pool_connections=1,
+                                 pool_maxsize=HTTP_POOL_MAXSIZE,
+                                 pool_block=True,
+                                 max_retries=retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @classmethod
+    def get(cls, url, proxies=None):
+        """
+        获取站点对应的会话
+        """
+        url_info = urlparse(url)
+        key = (url_info.scheme.lower(), url_info.netloc.lower(),
+               tuple(sorted(proxies.items())) if isinstance(proxies, dict) else None)
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if session:
+                cls._sessions.move_to_end(key)
+                return session
+            session = cls.__build_session()
+            cls._sessions[key] = session
+            while len(cls._sessions) > HTTP_SESSION_MAXSIZE:
+                _, expired = cls._sessions.popitem(last=False)
+                expired.close()
+            return session
+
 
 class RequestUtils:
     _headers = None
@@ -55,69 +174,49 @@ class RequestUtils:
         if timeout:
             self._timeout = timeout
 
+    def __get_session(self, url):
+        """
+        未指定会话时使用站点共享的会话
+        """
+        return self._session or _SessionPool.get(url, self._proxies)
+
     def post(self, url, data=None, json=None):
         if json is None:
             json = {}
         try:
-            if self._session:
-                return self._session.post(url,
-                                          data=data,
-                                          verify=False,
-                                          headers=self._headers,
-                                          proxies=self._proxies,
-                                          timeout=self._timeout,
-                                          json=json)
-            else:
-                return requests.post(url,
-                                     data=data,
-                                     verify=False,
-                                     headers=self._headers,
-                                     proxies=self._proxies,
-                                     timeout=self._timeout,
-                                     json=json)
+            return self.__get_session(url).post(url,
+                                                data=data,
+                                                verify=False,
+                                                headers=self._headers,
+                                                proxies=self._proxies,
+                                                timeout=self._timeout,
+                                                json=json)
         except requests.exceptions.RequestException:
             return None
 
     def get(self, url, params=None):
         try:
-            if self._session:
-                r = self._session.get(url,
-                                      verify=False,
-                                      headers=self._headers,
-                                      proxies=self._proxies,
-                                      timeout=self._timeout,
-                                      params=params)
-            else:
-                r = requests.get(url,
-                                 verify=False,
-                                 headers=self._headers,
-                                 proxies=self._proxies,
-                                 timeout=self._timeout,
-                                 params=params)
+            r = self.__get_session(url).get(url,
+                                            verify=False,
+                                            headers=self._headers,
+                                            proxies=self._proxies,
+                                            timeout=self._timeout,
+                                            params=params)
             return str(r.content, 'utf-8')
         except requests.exceptions.RequestException:
             return None
 
-    def get_res(self, url, params=None, allow_redirects=True, raise_exception=False):
+    def get_res(self, url, params=None, allow_redirects=True, raise_exception=False, stream=False):
         try:
-            if self._session:
-                return self._session.get(url,
-                                         params=params,
-                                         verify=False,
-                                         headers=self._headers,
-                                         proxies=self._proxies,
-                                         cookies=self._cookies,
-                                         timeout=self._timeout,
-                                         allow_redirects=allow_redirects)
-            else:
-                return requests.get(url,
-                                    params=params,
-                                    verify=False,
-                                    headers=self._headers,
-                                    proxies=self._proxies,
-                                    cookies=self._cookies,
-                                    timeout=self._timeout,
-                                    allow_redirects=allow_redirects)
+            return self.__get_session(url).get(url,
+                                               params=params,
+                                               verify=False,
+                                               headers=self._headers,
+                                               proxies=self._proxies,
+                                               cookies=self._cookies,
+                                               timeout=self._timeout,
+                                               allow_redirects=allow_redirects,
+                                               stream=stream)
         except requests.exceptions.RequestException:
             if raise_exception:
                 raise requests.exceptions.RequestException
@@ -125,33 +224,32 @@ class RequestUtils:
 
     def post_res(self, url, data=None, params=None, allow_redirects=True, files=None, json=None):
         try:
-            if self._session:
-                return self._session.post(url,
-                                          data=data,
-                                          params=params,
-                                          verify=False,
-                                          headers=self._headers,
-                                          proxies=self._proxies,
-                                          cookies=self._cookies,
-                                          timeout=self._timeout,
-                                          allow_redirects=allow_redirects,
-                                          files=files,
-                                          json=json)
-            else:
-                return requests.post(url,
-                                     data=data,
-                                     params=params,
-                                     verify=False,
-                                     headers=self._headers,
-                                     proxies=self._proxies,
-                                     cookies=self._cookies,
-                                     timeout=self._timeout,
-                                     allow_redirects=allow_redirects,
-                                     files=files,
-                                     json=json)
+            return self.__get_session(url).post(url,
+                                                data=data,
+                                                params=params,
+                                                verify=False,
+                                                headers=self._headers,
+                                                proxies=self._proxies,
+                                                cookies=self._cookies,
+                                                timeout=self._timeout,
+                                                allow_redirects=allow_redirects,
+                                                files=files,
+                                                json=json)
         except requests.exceptions.RequestException:
             return None
 
+    @staticmethod
+    def get_connection_stats():
+        """
+        获取各站点连接的复用情况
+        :return: {scheme://host:port: {"requests": 请求数, "connections": 新建连接数, "reused": 复用连接数}}
+        """
+        with _stats_lock:
+            return {name: {"requests": stats.get("requests"),
+                           "connections": stats.get("connections"),
+                           "reused": max(stats.get("requests") - stats.get("connections"), 0)}
+                    for name, stats in _connection_stats.items()}
+
     @staticmethod
     def cookie_parse(cookies_str, array=False):
         """
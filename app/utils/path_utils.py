@@ -4,49 +4,102 @@ import os
 class PathUtils:
 
     @staticmethod
-    def get_dir_files(in_path, exts="", filesize=0, episode_format=None):
+    def iter_dir_files(in_path, exts="", filesize=0, episode_format=None, exclude_paths=None):
         """
-        获得目录下的媒体文件列表List ，按后缀、大小、格式过滤
+        逐个返回目录下的文件，按后缀、大小、格式过滤；回收站、隐藏目录及排除的目录整个跳过，不再进入
+        :param in_path: 目录或文件
+        :param exts: 后缀
+        :param filesize: 最小文件大小
+        :param episode_format: 集数格式
+        :param exclude_paths: 排除的目录列表
         """
         if not in_path:
-            return []
+            return
         if not os.path.exists(in_path):
-            return []
-        ret_list = []
-        if os.path.isdir(in_path):
-            for root, dirs, files in os.walk(in_path):
-                for file in files:
-                    cur_path = os.path.join(root, file)
-                    # 检查路径是否合法
-                    if PathUtils.is_invalid_path(cur_path):
-                        continue
-                    # 检查格式匹配
-                    if episode_format and not episode_format.match(file):
-                        continue
-                    # 检查后缀
-                    if exts and os.path.splitext(file)[-1].lower() not in exts:
-                        continue
-                    # 检查文件大小
-                    if filesize and os.path.getsize(cur_path) < filesize:
-                        continue
-                    # 命中
-                    if cur_path not in ret_list:
-                        ret_list.append(cur_path)
-        else:
+            return
+        if not os.path.isdir(in_path):
             # 检查路径是否合法
             if PathUtils.is_invalid_path(in_path):
-                return []
+                return
             # 检查后缀
             if exts and os.path.splitext(in_path)[-1].lower() not in exts:
-                return []
+                return
             # 检查格式
             if episode_format and not episode_format.match(os.path.basename(in_path)):
-                return []
+                return
             # 检查文件大小
             if filesize and os.path.getsize(in_path) < filesize:
-                return []
-            ret_list.append(in_path)
-        return ret_list
+                return
+            yield in_path
+            return
+        if exclude_paths:
+            exclude_paths = [os.path.abspath(path) for path in exclude_paths if path]
+        yield from PathUtils.__iter_dir_files(in_path, exts, filesize, episode_format, exclude_paths)
+
+    @staticmethod
+    def __iter_dir_files(in_path, exts, filesize, episode_format, exclude_paths):
+        """
+        按目录逐层遍历，先返回当前目录下的文件，再依次进入子目录，顺序与os.walk一致
+        """
+        # 目录不合法时其下的文件都不合法
+        if PathUtils.is_invalid_path(os.path.join(in_path, "")):
+            return
+        if exclude_paths and any(os.path.abspath(in_path).startswith(path) for path in exclude_paths):
+            return
+        sub_dirs = []
+        try:
+            with os.scandir(in_path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        # 与os.walk一致，不进入目录的软链接
+                        if not entry.is_symlink():
+                            sub_dirs.append(entry.path)
+                        continue
+                    # 检查路径是否合法
+                    if PathUtils.is_invalid_path(entry.path):
+                        continue
+                    # 检查格式匹配
+                    if episode_format and not episode_format.match(entry.name):
+                        continue
+                    # 检查后缀
+                    if exts and os.path.splitext(entry.name)[-1].lower() not in exts:
+                        continue
+                    # 检查文件大小，复用DirEntry的stat结果
+                    if filesize:
+                        try:
+                            if entry.stat().st_size < filesize:
+                                continue
+                        except OSError:
+                            continue
+                    yield entry.path
+        except OSError:
+            return
+        for sub_dir in sub_dirs:
+            yield from PathUtils.__iter_dir_files(sub_dir, exts, filesize, episode_format, exclude_paths)
+
+    @staticmethod
+    def get_dir_files(in_path, exts="", filesize=0, episode_format=None):
+        """
+        获得目录下的媒体文件列表List ，按后缀、大小、格式过滤
+        """
+        return list(PathUtils.iter_dir_files(in_path=in_path,
+                                             exts=exts,
+                                             filesize=filesize,
+                                             episode_format=episode_format))
+
+    @staticmethod
+    def has_dir_files(in_path, exts="", filesize=0, episode_format=None):
+        """
+        目录下是否存在符合条件的文件，找到第一个即返回
+        """
+        return next(PathUtils.iter_dir_files(in_path=in_path,
+                                             exts=exts,
+                                             filesize=filesize,
+                                             episode_format=episode_format), None) is not None
 
     @staticmethod
     def get_dir_level1_files(in_path, exts=""):
@@ -56,11 +109,11 @@ class PathUtils:
         ret_list = []
         if not os.path.exists(in_path):
             return []
-        for file in os.listdir(in_path):
-            path = os.path.join(in_path, file)
-            if os.path.isfile(path):
-                if not exts or os.path.splitext(file)[-1].lower() in exts:
-                    ret_list.append(path)
+        with os.scandir(in_path) as it:
+            for entry in it:
+                if entry.is_file():
+                    if not exts or os.path.splitext(entry.name)[-1].lower() in exts:
+                        ret_list.append(entry.path)
         return ret_list
 
     @staticmethod
@@ -72,13 +125,13 @@ class PathUtils:
         if not os.path.exists(in_path):
             return []
         if os.path.isdir(in_path):
-            for file in os.listdir(in_path):
-                path = os.path.join(in_path, file)
-                if os.path.isfile(path):
-                    if not exts or os.path.splitext(file)[-1].lower() in exts:
-                        ret_list.append(path)
-                else:
-                    ret_list.append(path)
+            with os.scandir(in_path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        if not exts or os.path.splitext(entry.name)[-1].lower() in exts:
+                            ret_list.append(entry.path)
+                    else:
+                        ret_list.append(entry.path)
         else:
             ret_list.append(in_path)
         return ret_list
@@ -12,6 +12,10 @@ import dateutil.parser
 from app.utils.exception_utils import ExceptionUtils
 from app.utils.types import MediaType
 
+_chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
+_japanese_pattern = re.compile(r'[\u3040-\u309F\u30A0-\u30FF]')
+_korean_pattern = re.compile(r'[\uAC00-\uD7FF]')
+
 
 class StringUtils:
 
@@ -72,24 +76,21 @@ class StringUtils:
         """
         if isinstance(word, list):
             word = " ".join(word)
-        chn = re.compile(r'[\u4e00-\u9fff]')
-        if chn.search(word):
+        if _chinese_pattern.search(word):
             return True
         else:
             return False
 
     @staticmethod
     def is_japanese(word):
-        jap = re.compile(r'[\u3040-\u309F\u30A0-\u30FF]')
-        if jap.search(word):
+        if _japanese_pattern.search(word):
             return True
         else:
             return False
 
     @staticmethod
     def is_korean(word):
-        kor = re.compile(r'[\uAC00-\uD7FF]')
-        if kor.search(word):
+        if _korean_pattern.search(word):
             return True
         else:
             return False
@@ -2,6 +2,8 @@ import re
 
 from config import SPLIT_CHARS
 
+_split_pattern = re.compile(SPLIT_CHARS)
+
 
 class Tokens:
     _text = ""
@@ -14,7 +16,7 @@ class Tokens:
         self.load_text(text)
 
     def load_text(self, text):
-        splited_text = re.split(r'%s' % SPLIT_CHARS, text)
+        splited_text = _split_pattern.split(text)
         for sub_text in splited_text:
             if sub_text:
                 self._tokens.append(sub_text)
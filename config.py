@@ -28,12 +28,92 @@ RMT_MIN_FILESIZE = 150 * 1024 * 1024
 AUTO_REMOVE_TORRENTS_INTERVAL = 1800
 # 下载文件转移检查时间间隔，
 PT_TRANSFER_INTERVAL = 300
+# 下载器同时转移的下载任务数
+RMT_TRANSFER_THREADS = 3
+# 同一目的设备上同时执行的复制、移动等转移数
+RMT_DEVICE_TRANSFER_THREADS = 1
+# 媒体库索引中目录修改时间距扫描时间小于该秒数时视为未确认，下次访问重新扫描（NAS文件系统修改时间精度较低）
+LIBRARY_INDEX_MTIME_SLACK = 3
 # TMDB信息缓存定时保存时间
 METAINFO_SAVE_INTERVAL = 600
+# 内存中保留的TMDB识别缓存条目上限，超出时释放最早加载且已保存的条目
+META_CACHE_MAXSIZE = 5000
+# 内存中记录的存储未命中KEY数上限，超出时丢弃最早的记录
+META_MISS_CACHE_MAXSIZE = 10000
+# TMDB详情缓存条目上限
+TMDB_DETAIL_CACHE_MAXSIZE = 1000
+# TMDB详情缓存有效期（秒）
+TMDB_DETAIL_CACHE_EXPIRE = 12 * 3600
+# SQLite性能模式，数据库连接时执行的PRAGMA，通过 laboratory.db_profile 选择
+DB_SQLITE_PROFILES = {
+    # SQLite默认设置，仅增加锁等待时间
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 30000
+    },
+    # WAL日志，读写互不阻塞，提交时不强制同步磁盘，64M页缓存，256M内存映射
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000
+    }
+}
+# 媒体库同步时每页获取的媒体数
+MEDIASYNC_PAGE_SIZE = 200
+# 媒体库同步时获取的媒体字段
+MEDIASYNC_ITEM_FIELDS = "ProviderIds,OriginalTitle,ProductionYear,Path,ParentId,Etag,DateLastMediaAdded,RecursiveItemCount"
+# 媒体库同步时并行获取媒体库及剧集信息的线程数
+MEDIASYNC_THREADS = 5
+# 媒体库同步时每批写入数据库的媒体数
+MEDIASYNC_BATCH_SIZE = 500
+# 同一站点同时使用的最大连接数，超出时等待其它请求归还连接
+HTTP_POOL_MAXSIZE = 10
+# 等待同一站点空闲连接的超时时间（秒），超时按连接失败处理
+HTTP_POOL_TIMEOUT = 20
+# 保持复用连接的站点会话数上限，超出时关闭最久未使用的会话
+HTTP_SESSION_MAXSIZE = 64
+# 连接失败或服务端临时错误时的重试次数
+HTTP_RETRIES = 2
+# 重试等待的退避系数（秒），第n次重试等待 backoff * 2^(n-1) 秒
+HTTP_RETRY_BACKOFF = 0.5
+# 需要重试的服务端状态码
+HTTP_RETRY_STATUS = [502, 503, 504]
+# 刮削时并行下载图片的线程数
+SCRAPER_IMAGE_THREADS = 5
+# 刮削图片本地缓存的容量上限，超出时清理最久未使用的图片
+SCRAPER_IMAGE_CACHE_SIZE = 1024 * 1024 * 1024
+# 单个消息渠道排队发送的消息数上限，超出时丢弃最早的消息
+MESSAGE_QUEUE_MAXSIZE = 1000
+# 消息发送失败时的重试次数
+MESSAGE_SEND_RETRIES = 3
+# 消息重试等待的退避系数（秒），第n次重试等待 backoff * 2^(n-1) 秒
+MESSAGE_RETRY_BACKOFF = 2
+# 同类消息的合并等待时间（秒），期间到达的同类消息合并为一条发送
+MESSAGE_COALESCE_DELAY = 10
+# 后台识别下载中种子媒体信息的线程数
+DOWNLOADING_IDENTIFY_THREADS = 2
+# 每个下载器缓存的下载中种子媒体信息条目上限
+DOWNLOADING_MEDIA_CACHE_SIZE = 1000
+# 下载中种子媒体信息的缓存有效期（秒）
+DOWNLOADING_MEDIA_CACHE_EXPIRE = 24 * 3600
 # SYNC目录同步聚合转移时间
 SYNC_TRANSFER_INTERVAL = 60
 # RSS队列中处理时间间隔
 RSS_CHECK_INTERVAL = 300
+# RSS订阅并行下载站点RSS的默认线程数
+RSS_FETCH_THREADS = 10
+# RSS订阅下载单个站点RSS的超时时间（秒）
+RSS_FETCH_TIMEOUT = 30
+# 所有搜索共用的索引站点搜索线程数
+INDEXER_SEARCH_THREADS = 20
+# 单个索引站点的搜索时限（秒），超时后不再等待该站点的结果
+INDEXER_SEARCH_TIMEOUT = 60
+# 索引站点搜索结果边解析边过滤，每批检查过滤规则的条数
+INDEXER_FILTER_BATCH_SIZE = 100
 # 刷新订阅TMDB数据的时间间隔（小时）
 RSS_REFRESH_TMDB_INTERVAL = 6
 # 刷流删除的检查时间间隔
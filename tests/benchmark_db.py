@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import RSSTORRENTS
+from app.db.sqlite_profile import set_sqlite_profile
+from config import DB_SQLITE_PROFILES
+
+
+def insert_rows(session, count, batch):
+    """
+    插入RSS记录
+    :param batch: 是否批量提交，否则每条记录提交一次
+    """
+    for i in range(count):
+        session.add(RSSTORRENTS(TORRENT_NAME="Benchmark.S01E%02d.1080p.WEB-DL" % (i % 100),
+                                ENCLOSURE="https://example.com/download.php?id=%s" % i,
+                                TYPE="TV",
+                                TITLE="Benchmark",
+                                YEAR="2023",
+                                SEASON="S01",
+                                EPISODE="E%02d" % (i % 100)))
+        if not batch:
+            session.commit()
+    session.commit()
+
+
+def benchmark_db(count=1000):
+    """
+    数据库写入性能测试，对比SQLite性能模式及逐条提交与批量提交
+    :param count: 插入的记录数
+    :return: {(性能模式, 提交方式): 每秒插入的记录数}
+    """
+    results = {}
+    for profile, pragmas in DB_SQLITE_PROFILES.items():
+        for batch in (False, True):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                engine = create_engine("sqlite:///%s" % os.path.join(tmp_dir, "benchmark.db"))
+                set_sqlite_profile(engine, pragmas)
+                RSSTORRENTS.__table__.create(engine)
+                session = sessionmaker(bind=engine)()
+                begin_time = time.perf_counter()
+                insert_rows(session, count, batch)
+                cost = time.perf_counter() - begin_time
+                session.close()
+                engine.dispose()
+            results[(profile, "批量提交" if batch else "逐条提交")] = count / cost if cost else 0
+    return results
+
+
+if __name__ == '__main__':
+    for (name, mode), speed in benchmark_db().items():
+        print("%s %s：%.0f 条/秒" % (name, mode, speed))
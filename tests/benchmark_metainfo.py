@@ -0,0 +1,50 @@
+import time
+
+from app.media.meta import MetaVideo, ReleaseGroupsMatcher
+from tests.cases.meta_cases import meta_cases
+
+
+def benchmark_metavideo(rounds=200):
+    """
+    名称识别性能测试，直接调用MetaVideo，不经过识别词和识别结果缓存
+    :param rounds: 测试用例重复的轮数
+    :return: 识别的标题数, 耗时（秒）, 每秒识别的标题数
+    """
+    cases = [(info.get("title"), info.get("subtitle")) for info in meta_cases if info.get("title")]
+    # 预热
+    for title, subtitle in cases:
+        MetaVideo(title, subtitle)
+    begin_time = time.perf_counter()
+    for _ in range(rounds):
+        for title, subtitle in cases:
+            MetaVideo(title, subtitle)
+    cost = time.perf_counter() - begin_time
+    count = len(cases) * rounds
+    return count, cost, count / cost if cost else 0
+
+
+def benchmark_release_groups(rounds=200):
+    """
+    制作组/字幕组匹配性能测试
+    :param rounds: 测试用例重复的轮数
+    :return: 匹配的标题数, 耗时（秒）, 每个标题的平均耗时（微秒）
+    """
+    matcher = ReleaseGroupsMatcher()
+    titles = [info.get("title") for info in meta_cases if info.get("title")]
+    # 预热
+    for title in titles:
+        matcher.match(title)
+    begin_time = time.perf_counter()
+    for _ in range(rounds):
+        for title in titles:
+            matcher.match(title)
+    cost = time.perf_counter() - begin_time
+    count = len(titles) * rounds
+    return count, cost, cost / count * 1000000 if count else 0
+
+
+if __name__ == '__main__':
+    total, seconds, speed = benchmark_metavideo()
+    print("识别标题数：%s，耗时：%.3f 秒，速度：%.0f 个/秒" % (total, seconds, speed))
+    total, seconds, per_title = benchmark_release_groups()
+    print("制作组匹配标题数：%s，耗时：%.3f 秒，平均：%.1f 微秒/个" % (total, seconds, per_title))
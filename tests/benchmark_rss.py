@@ -0,0 +1,98 @@
+import time
+import tracemalloc
+import xml.dom.minidom
+from xml.sax.saxutils import escape
+
+from app.helper import RssHelper
+from app.indexer.client._base import _IIndexClient
+from app.utils import DomUtils
+from tests.cases.meta_cases import meta_cases
+
+
+def build_torznab_xml(count=1000):
+    """
+    用识别测试用例的标题生成Jackett格式的torznab xml
+    :param count: 种子数量
+    """
+    titles = [info.get("title") for info in meta_cases if info.get("title")]
+    items = []
+    for i in range(count):
+        title = escape(titles[i % len(titles)])
+        items.append(
+            f'<item><title>{title}</title>'
+            f'<guid>https://example.com/details.php?id={i}</guid>'
+            f'<jackettindexer id="site{i % 30}">Site {i % 30}</jackettindexer>'
+            f'<comments>https://example.com/details.php?id={i}</comments>'
+            f'<pubDate>Mon, 02 Jan 2023 15:04:05 +0800</pubDate>'
+            f'<size>{(i + 1) * 1073741824}</size>'
+            f'<description>{title} 中字</description>'
+            f'<link>https://example.com/download.php?id={i}</link>'
+            f'<enclosure url="https://example.com/download.php?id={i}&amp;passkey=x" '
+            f'length="{(i + 1) * 1073741824}" type="application/x-bittorrent" />'
+            f'<torznab:attr name="seeders" value="{i % 50}" />'
+            f'<torznab:attr name="peers" value="{i % 7}" />'
+            f'<torznab:attr name="imdbid" value="tt{i:07d}" />'
+            f'<torznab:attr name="downloadvolumefactor" value="{i % 2}" />'
+            f'<torznab:attr name="uploadvolumefactor" value="1" /></item>')
+    return '<?xml version="1.0" encoding="UTF-8"?>' \
+           '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" ' \
+           'xmlns:torznab="http://torznab.com/schemas/2015/feed">' \
+           '<channel><title>benchmark</title>%s</channel></rss>' % "".join(items)
+
+
+def parse_torznabxml_dom(xmls):
+    """
+    使用minidom解析torznab xml，作为对比基准
+    """
+    torrents = []
+    root_node = xml.dom.minidom.parseString(xmls).documentElement
+    for item in root_node.getElementsByTagName("item"):
+        title = DomUtils.tag_value(item, "title", default="")
+        enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
+        if not title or not enclosure:
+            continue
+        attrs = {attr.getAttribute('name'): attr.getAttribute('value')
+                 for attr in item.getElementsByTagName("torznab:attr")}
+        torrents.append({'title': title,
+                         'enclosure': enclosure,
+                         'description': DomUtils.tag_value(item, "description", default=""),
+                         'size': DomUtils.tag_value(item, "size", default=0),
+                         'seeders': attrs.get("seeders", 0)})
+    return torrents
+
+
+def measure(func, rounds):
+    """
+    统计解析速度及峰值内存
+    :return: 每秒解析的条目数, 峰值内存（MB）
+    """
+    count = 0
+    begin_time = time.perf_counter()
+    for _ in range(rounds):
+        count = len(list(func()))
+    cost = time.perf_counter() - begin_time
+    tracemalloc.start()
+    list(func())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count * rounds / cost if cost else 0, peak / 1024 / 1024
+
+
+def benchmark_rss(count=1000, rounds=10):
+    """
+    torznab/RSS xml解析性能测试，对比minidom与流式解析
+    :param count: 每个xml中的种子数量
+    :param rounds: 重复解析的轮数
+    :return: {解析方式: (每秒解析的条目数, 峰值内存MB)}
+    """
+    xmls = build_torznab_xml(count)
+    return {
+        "minidom": measure(lambda: parse_torznabxml_dom(xmls), rounds),
+        "torznab": measure(lambda: _IIndexClient.parse_torznabxml(xmls), rounds),
+        "rss": measure(lambda: RssHelper.parse_rssitems(xmls), rounds)
+    }
+
+
+if __name__ == '__main__':
+    for name, (speed, memory) in benchmark_rss().items():
+        print("%s：%.0f 条/秒，峰值内存：%.1f MB" % (name, speed, memory))
@@ -6,6 +6,8 @@ if __name__ == '__main__':
     suite = unittest.TestSuite()
     # 测试名称识别
     suite.addTest(MetaInfoTest('test_metainfo'))
+    # 测试识别结果缓存
+    suite.addTest(MetaInfoTest('test_metainfo_cache'))
 
     # 运行测试
     runner = unittest.TextTestRunner()
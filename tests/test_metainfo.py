@@ -2,7 +2,7 @@
 
 from unittest import TestCase
 
-from app.media.meta import MetaInfo
+from app.media.meta import MetaInfo, get_meta_cache_stat
 from tests.cases.meta_cases import meta_cases
 
 
@@ -32,3 +32,16 @@ class MetaInfoTest(TestCase):
                 "audio_codec": meta_info.audio_encode or ""
             }
             self.assertEqual(target, info.get("target"))
+
+    def test_metainfo_cache(self):
+        title = "Cherry Season S01 2014 2160p WEB-DL H265 AAC-XXX"
+        meta_info = MetaInfo(title=title)
+        hit = get_meta_cache_stat().get("hit")
+        # 修改返回对象不影响缓存的识别结果
+        meta_info.en_name = "Changed"
+        meta_info.ignored_words.append("Changed")
+        cache_info = MetaInfo(title=title)
+        self.assertEqual(get_meta_cache_stat().get("hit"), hit + 1)
+        self.assertEqual(cache_info.en_name, "Cherry Season")
+        self.assertEqual(cache_info.ignored_words, [])
+        self.assertEqual(cache_info.get_season_string(), "S01")
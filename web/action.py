@@ -11,7 +11,7 @@ import sqlite3
 import time
 from math import floor
 from pathlib import Path
-from urllib.parse import unquote
+from urllib.parse import unquote, urlparse
 
 import cn2an
 from flask_login import logout_user, current_user
@@ -25,7 +25,7 @@ from app.filetransfer import FileTransfer
 from app.filter import Filter
 from app.helper import DbHelper, ProgressHelper, ThreadHelper, \
     MetaHelper, DisplayHelper, WordsHelper, IndexerHelper
-from app.helper import RssHelper, PluginHelper
+from app.helper import RssHelper, PluginHelper, TmdbCacheHelper
 from app.indexer import Indexer
 from app.media import Category, Media, Bangumi, DouBan, Scraper
 from app.media.meta import MetaInfo, MetaBase
@@ -1268,7 +1268,7 @@ class WebAction:
                                                 e)
                                 rm_parent_dir = True
                             if rm_parent_dir \
-                                    and not PathUtils.get_dir_files(os.path.dirname(dest_path), exts=RMT_MEDIAEXT):
+                                    and not PathUtils.has_dir_files(os.path.dirname(dest_path), exts=RMT_MEDIAEXT):
                                 # 没有媒体文件时，删除整个目录
                                 try:
                                     shutil.rmtree(os.path.dirname(dest_path))
@@ -1967,8 +1967,13 @@ class WebAction:
         """
         删除tmdb缓存
         """
-        if MetaHelper().delete_meta_data(data.get("cache_key")):
+        meta_info = MetaHelper().delete_meta_data(data.get("cache_key"))
+        if meta_info:
             MetaHelper().save_meta_data()
+            # 同时清除TMDB详情缓存
+            if meta_info.get("id"):
+                TmdbCacheHelper().delete_cache_by_tmdbid(meta_info.get("id"))
+                TmdbCacheHelper().save_cache_data()
         return {"code": 0}
 
     @ staticmethod
@@ -2359,12 +2364,16 @@ class WebAction:
             res = RequestUtils(timeout=5).get_res(target)
         seconds = int((datetime.datetime.now() -
                        start_time).microseconds / 1000)
+        # 该站点连接的复用情况
+        url_info = urlparse(target)
+        stats = RequestUtils.get_connection_stats().get("https://%s:443" % url_info.hostname) or {}
+        reused = "%s / %s" % (stats.get("reused"), stats.get("requests")) if stats else ""
         if not res:
-            return {"res": False, "time": "%s 毫秒" % seconds}
+            return {"res": False, "time": "%s 毫秒" % seconds, "reused": reused}
         elif res.ok:
-            return {"res": True, "time": "%s 毫秒" % seconds}
+            return {"res": True, "time": "%s 毫秒" % seconds, "reused": reused}
         else:
-            return {"res": False, "time": "%s 毫秒" % seconds}
+            return {"res": False, "time": "%s 毫秒" % seconds, "reused": reused}
 
     @ staticmethod
     def __get_site_activity(data):
@@ -2754,7 +2763,8 @@ class WebAction:
         """
         try:
             MetaHelper().clear_meta_data()
-            os.remove(MetaHelper().get_meta_data_path())
+            TmdbCacheHelper().clear_cache()
+            TmdbCacheHelper().save_cache_data(force=True)
         except Exception as e:
             ExceptionUtils.exception_traceback(e)
             return {"code": 0, "msg": str(e)}
@@ -3974,33 +3984,23 @@ class WebAction:
         """
         查询正在下载的任务
         """
-        MediaHander = Media()
         DownloaderHandler = Downloader()
         torrents = DownloaderHandler.get_downloading_progress()
+        # 下载记录及识别结果按种子缓存，只有新增的种子需要查询
+        media_infos = DownloaderHandler.get_torrents_media_info(torrents)
         for torrent in torrents:
-            # 先查询下载记录，没有再识别
             name = torrent.get("name")
-            download_info = DownloaderHandler.get_download_history_by_downloader(
-                downloader=DownloaderHandler.default_downloader_id,
-                download_id=torrent.get("id")
-            )
-            if download_info:
-                name = download_info.TITLE
-                year = download_info.YEAR
-                poster_path = download_info.POSTER
-                se = download_info.SE
-            else:
-                media_info = MediaHander.get_media_info(title=name)
-                if not media_info:
-                    torrent.update({
-                        "title": name,
-                        "image": ""
-                    })
-                    continue
-                year = media_info.year
-                name = media_info.title or media_info.get_name()
-                se = media_info.get_season_episode_string()
-                poster_path = media_info.get_poster_image()
+            media_info = media_infos.get(torrent.get("id"))
+            if not media_info:
+                torrent.update({
+                    "title": name,
+                    "image": ""
+                })
+                continue
+            name = media_info.get("title")
+            year = media_info.get("year")
+            se = media_info.get("se")
+            poster_path = media_info.get("image")
             # 拼装标题
             if year:
                 title = "%s (%s) %s" % (name,